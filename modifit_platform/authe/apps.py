@@ -1,6 +1,21 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core import checks
 
 
 class AutheConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "authe"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        checks.register(check_user_cache, checks.Tags.caches)
+
+
+def check_user_cache(app_configs, **kwargs):
+    from modifit_platform.caches import local_cache_warning
+    return local_cache_warning(
+        getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'default'),
+        "La caché de usuarios de JWT (AUTH_USER_CACHE_ALIAS)",
+        "authe.W001",
+    )
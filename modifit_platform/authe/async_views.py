@@ -0,0 +1,133 @@
+from io import BytesIO
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from .hashing import HashingOverloaded, get_hashing_executor
+from .serializers import LoginSerializer, RegisterSerializer, UserSerializer
+from .tokens import tokens_for_user
+
+
+FORM_CONTENT_TYPES = ('application/x-www-form-urlencoded', 'multipart/form-data')
+
+
+def _json_response(data, status=200, headers=None):
+    """
+    Los mismos bytes que Response(data) de una APIView: JSONRenderer de DRF
+    (UTF-8 sin escapar, separadores compactos) y Content-Type application/json
+    """
+    return HttpResponse(JSONRenderer().render(data), status=status,
+                        content_type=JSONRenderer.media_type, headers=headers)
+
+
+def _exception_response(request, exc, authenticate_header=None):
+    """
+    Respuesta de error de DRF para `exc` (mismo cuerpo, estado y cabeceras
+    que si la lanzara una APIView). Con authenticate_header los fallos de
+    autenticación son 401 con WWW-Authenticate; sin él, 403
+    """
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        if authenticate_header:
+            exc.auth_header = authenticate_header
+        else:
+            exc.status_code = 403
+    response = api_settings.EXCEPTION_HANDLER(exc, {'request': request, 'view': None})
+    headers = {name: value for name, value in response.items() if name.lower() != 'content-type'}
+    return _json_response(response.data, response.status_code, headers=headers)
+
+
+def _parse_data(request):
+    """
+    Cuerpo del request: JSON con el JSONParser de DRF, o formulario.
+    Lanza ParseError / UnsupportedMediaType como una APIView
+    """
+    if request.content_type in FORM_CONTENT_TYPES:
+        return request.POST
+    if not request.body:
+        return {}
+    if request.content_type != JSONParser.media_type:
+        raise exceptions.UnsupportedMediaType(request.content_type)
+    return JSONParser().parse(BytesIO(request.body))
+
+
+def _overloaded():
+    response = _json_response(
+        {'detail': 'Servidor ocupado, intenta de nuevo en unos segundos.'},
+        status=503
+    )
+    response['Retry-After'] = '1'
+    return response
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncRegisterView(View):
+    """
+    POST /api/auth/register/ (ASGI)
+    Igual que RegisterView, pero make_password corre en el pool acotado de
+    hashing y, si está lleno, responde 503 con Retry-After
+    """
+    http_method_names = ['post', 'options']
+
+    async def post(self, request):
+        try:
+            data = _parse_data(request)
+        except exceptions.APIException as e:
+            return _exception_response(request, e)
+
+        serializer = RegisterSerializer(data=data)
+        if not await sync_to_async(serializer.is_valid)():
+            return _json_response(serializer.errors, status=400)
+
+        try:
+            user = await get_hashing_executor().run(serializer.save)
+        except HashingOverloaded:
+            return _overloaded()
+
+        # Lee la versión del usuario de la caché: fuera del event loop
+        refresh = await sync_to_async(tokens_for_user)(user)
+        return _json_response({
+            'user': UserSerializer(user).data,
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+            'message': 'Usuario creado exitosamente'
+        }, status=201)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncLoginView(View):
+    """
+    POST /api/auth/login/ (ASGI)
+    Igual que LoginView, pero authenticate() corre en el pool acotado de
+    hashing y, si está lleno, responde 503 con Retry-After
+    """
+    http_method_names = ['post', 'options']
+
+    async def post(self, request):
+        try:
+            data = _parse_data(request)
+        except exceptions.APIException as e:
+            return _exception_response(request, e)
+
+        serializer = LoginSerializer(data=data)
+        try:
+            valid = await get_hashing_executor().run(serializer.is_valid)
+        except HashingOverloaded:
+            return _overloaded()
+        if not valid:
+            return _json_response(serializer.errors, status=400)
+
+        user = serializer.validated_data['user']
+        refresh = await sync_to_async(tokens_for_user)(user)
+        return _json_response({
+            'user': UserSerializer(user).data,
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+            'message': 'Login exitoso'
+        }, status=200)
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .user_cache import build_user, cache_user, get_cached_user, get_user_version
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que resuelve el usuario sin ir a la base en cada request:
+
+    1. Caché de corta duración, invalidada por versión (ver authe.signals)
+    2. Si el token trae username/email y su user_ver coincide con la versión
+       actual, se arma el usuario a partir de los claims
+    3. Si no, consulta al primario y se guarda en caché
+
+    Los pasos 1 y 2 necesitan una caché compartida entre workers (ver
+    user_cache.cache_enabled); sin ella siempre se consulta la base
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        version = get_user_version(user_id)
+        user = get_cached_user(user_id, version)
+        if user is None:
+            user = self._user_from_claims(validated_token, user_id, version)
+        if user is not None:
+            if not user.is_active:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            return user
+
+        # Siempre del primario: en una réplica atrasada un usuario recién
+        # desactivado seguiría activo
+        user = super().get_user(validated_token)
+        cache_user(user, version)
+        return user
+
+    @staticmethod
+    def _user_from_claims(validated_token, user_id, version):
+        if version is None or not getattr(settings, 'AUTH_JWT_USER_CLAIMS', True):
+            return None
+        if validated_token.get('user_ver') != version:
+            return None
+        username = validated_token.get('username')
+        email = validated_token.get('email')
+        if username is None or email is None:
+            return None
+        # La versión no cambió desde que se emitió el token: el usuario
+        # sigue activo y username/email son los mismos
+        return build_user({'id': user_id, 'username': username, 'email': email, 'is_active': True}, version)
@@ -0,0 +1,74 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+class HashingOverloaded(Exception):
+    """
+    La cola de hashing está llena: el request debe rechazarse (backpressure)
+    """
+
+
+class BoundedHashingExecutor:
+    """
+    Pool acotado de hilos para las operaciones de contraseña (PBKDF2), que
+    son intencionalmente costosas en CPU. Saca el trabajo del event loop y
+    limita cuántas pueden esperar: pasado max_pending se rechaza en vez de
+    acumular latencia sin límite
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hashing")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {"completed": 0, "rejected": 0}
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise HashingOverloaded("Cola de autenticación llena")
+            self._pending += 1
+
+        future = self._executor.submit(self._call, fn, *args)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def _call(fn, *args):
+        try:
+            return fn(*args)
+        finally:
+            close_old_connections()
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+            self._stats["completed"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, pending=self._pending, workers=self.workers, max_pending=self.max_pending)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_hashing_executor() -> BoundedHashingExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = getattr(settings, 'AUTH_HASH_WORKERS', None) or os.cpu_count() or 2
+                _executor = BoundedHashingExecutor(
+                    workers=workers,
+                    max_pending=getattr(settings, 'AUTH_HASH_MAX_PENDING', None) or workers * 8
+                )
+    return _executor
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import User
+from .user_cache import bump_user_version
+from modifit_platform.db_router import pin_primary
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Cualquier cambio del usuario (contraseña, is_active, perfil) invalida la caché
+    """
+    bump_user_version(instance.pk)
+    pin_primary(instance.pk)
@@ -1,3 +1,88 @@
-from django.test import TestCase
+import json
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .async_views import AsyncLoginView, AsyncRegisterView
+from .models import User
+from .tokens import tokens_for_user
+
+
+class UserCacheTests(TestCase):
+    """
+    Corre con modifit_platform.test_settings: `shared` y `shared_b` son dos
+    instancias de la misma caché de archivos (dos workers), `default` es
+    LocMemCache (la de cada proceso)
+    """
+
+    def setUp(self):
+        caches['shared'].clear()
+        caches['default'].clear()
+        self.user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+
+    def _get_profile(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client.get(reverse('authe:profile'))
+
+    def test_bump_in_one_worker_is_seen_by_the_other(self):
+        with override_settings(AUTH_USER_CACHE_ALIAS='shared'):
+            token = str(tokens_for_user(self.user).access_token)
+        with override_settings(AUTH_USER_CACHE_ALIAS='shared_b'):
+            response = self._get_profile(token)
+        self.assertEqual(response.status_code, 200)
+
+        with override_settings(AUTH_USER_CACHE_ALIAS='shared'):
+            self.user.is_active = False
+            self.user.save()
+        with override_settings(AUTH_USER_CACHE_ALIAS='shared_b'):
+            response = self._get_profile(token)
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(AUTH_USER_CACHE_ALIAS='default')
+    def test_local_cache_always_checks_the_database(self):
+        refresh = tokens_for_user(self.user)
+        self.assertNotIn('user_ver', refresh)
+        token = str(refresh.access_token)
+        self.assertEqual(self._get_profile(token).status_code, 200)
+        self.assertEqual(caches['default'].get(f"authe:user_version:{self.user.pk}"), None)
+
+        # Sin señales (como si lo desactivara otro worker): igual se rechaza
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self._get_profile(token).status_code, 401)
+
+
+class AsyncAuthViewTests(TransactionTestCase):
+    """
+    Las vistas async aceptan los mismos cuerpos que LoginView y RegisterView
+    (JSON y formulario). TransactionTestCase: el hashing corre en otro hilo
+    """
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+
+    def _post(self, view, data, content_type):
+        body = urlencode(data) if content_type == 'application/x-www-form-urlencoded' else data
+        request = self.factory.post('/', body, content_type=content_type)
+        return async_to_sync(view.as_view())(request)
+
+    def test_register_and_login_with_form_data(self):
+        response = self._post(AsyncRegisterView, {
+            'username': 'leo', 'email': 'leo@example.com',
+            'password': 'password123', 'password_confirm': 'password123',
+        }, 'application/x-www-form-urlencoded')
+        self.assertEqual(response.status_code, 201)
+
+        response = self._post(AsyncLoginView, {'username': 'leo', 'password': 'password123'},
+                              'application/x-www-form-urlencoded')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', json.loads(response.content))
+
+    def test_login_with_json(self):
+        User.objects.create_user('ana', 'ana@example.com', 'password123')
+        response = self._post(AsyncLoginView, {'username': 'ana', 'password': 'password123'}, 'application/json')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,20 @@
+from django.conf import settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .user_cache import get_user_version
+
+
+def tokens_for_user(user) -> RefreshToken:
+    """
+    RefreshToken del usuario con username, email y versión como claims,
+    para que CachedJWTAuthentication pueda resolverlo sin consultar la base.
+    Sin caché de usuarios compartida no hay versión y el token no la lleva
+    """
+    refresh = RefreshToken.for_user(user)
+    if getattr(settings, 'AUTH_JWT_USER_CLAIMS', True):
+        refresh['username'] = user.username
+        refresh['email'] = user.email
+        version = get_user_version(user.pk)
+        if version is not None:
+            refresh['user_ver'] = version
+    return refresh
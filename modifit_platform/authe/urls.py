@@ -1,12 +1,22 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import LoginView, RegisterView, UserProfileView
+from .async_views import AsyncLoginView, AsyncRegisterView
 
 app_name = 'authe'
 
+# Bajo ASGI (AUTH_ASYNC_VIEWS) login y registro no bloquean el event loop
+if settings.AUTH_ASYNC_VIEWS:
+    login_view = AsyncLoginView.as_view()
+    register_view = AsyncRegisterView.as_view()
+else:
+    login_view = LoginView.as_view()
+    register_view = RegisterView.as_view()
+
 urlpatterns = [
-    path('login/', LoginView.as_view(), name='login'),
-    path('register/', RegisterView.as_view(), name='register'),
+    path('login/', login_view, name='login'),
+    path('register/', register_view, name='register'),
     path('profile/', UserProfileView.as_view(), name='profile'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
@@ -0,0 +1,117 @@
+import uuid
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router
+
+from modifit_platform.caches import is_shared
+from .models import User
+
+# Campos que se guardan en caché (nunca el hash de la contraseña)
+CACHED_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name',
+    'is_active', 'is_staff', 'is_superuser', 'date_joined', 'last_login',
+)
+
+
+def _alias() -> str:
+    return getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'default')
+
+
+def _cache():
+    return caches[_alias()]
+
+
+def cache_enabled() -> bool:
+    """
+    La caché de usuarios solo se usa sobre una caché compartida (Redis o
+    Memcached). Sobre LocMemCache cada worker tendría su propia versión:
+    una desactivación o un cambio de contraseña no se vería en los demás
+    workers hasta que venza el TTL. Sin caché compartida cada request
+    consulta la base
+    """
+    return is_shared(_alias())
+
+
+def _ttl() -> int:
+    return getattr(settings, 'AUTH_USER_CACHE_TTL', 300)
+
+
+def _version_key(user_id) -> str:
+    return f"authe:user_version:{user_id}"
+
+
+def get_user_version(user_id) -> Optional[str]:
+    """
+    Versión actual del usuario. Es un valor aleatorio (no un contador) para
+    que, si la caché la pierde, la nueva nunca coincida con una anterior.
+    None si la caché de usuarios está desactivada
+    """
+    if not cache_enabled():
+        return None
+    cache = _cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = uuid.uuid4().hex[:12]
+        if not cache.add(_version_key(user_id), version, None):
+            version = cache.get(_version_key(user_id)) or version
+    return version
+
+
+def bump_user_version(user_id) -> None:
+    """
+    Invalida las entradas cacheadas del usuario (cambio de contraseña,
+    desactivación o edición del perfil)
+    """
+    if not cache_enabled():
+        return
+    _cache().set(_version_key(user_id), uuid.uuid4().hex[:12], None)
+
+
+def _user_key(user_id, version: str) -> str:
+    return f"authe:user:{user_id}:{version}"
+
+
+def build_user(data: Dict[str, Any], version: Optional[str] = None) -> User:
+    """
+    Arma una instancia de User sin consultar la base. Los campos que no
+    vienen en data quedan diferidos, así que save() no los pisa.
+    Si se accede a un campo diferido se cargan todos los que faltan en una
+    sola consulta y, con version, el usuario completo queda en caché
+    """
+    data = dict(data, id=User._meta.pk.to_python(data['id']))
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname in data]
+    user = User.from_db('default', field_names, [data[name] for name in field_names])
+
+    if len(field_names) < len(CACHED_FIELDS):
+        refresh_from_db = user.refresh_from_db
+
+        def load_deferred(using=None, fields=None, from_queryset=None):
+            if fields is not None:
+                deferred = user.get_deferred_fields()
+                fields = [name for name in CACHED_FIELDS if name in deferred] + [
+                    name for name in fields if name not in CACHED_FIELDS
+                ]
+            # La instancia se armó con db 'default': se deja elegir al router
+            using = using or router.db_for_read(User, instance=user)
+            refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+            if version is not None:
+                cache_user(user, version)
+
+        user.refresh_from_db = load_deferred
+    return user
+
+
+def get_cached_user(user_id, version: Optional[str]) -> Optional[User]:
+    if version is None:
+        return None
+    data = _cache().get(_user_key(user_id, version))
+    return build_user(data) if data is not None else None
+
+
+def cache_user(user: User, version: Optional[str]) -> None:
+    if version is None:
+        return
+    data = {name: getattr(user, name) for name in CACHED_FIELDS}
+    _cache().set(_user_key(user.pk, version), data, _ttl())
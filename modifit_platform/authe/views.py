@@ -2,8 +2,9 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
 from .serializers import LoginSerializer, RegisterSerializer, UserSerializer
+from .tokens import tokens_for_user
+from modifit_platform.db_router import read_from_replica
 
 
 class RegisterView(APIView):
@@ -17,7 +18,7 @@ class RegisterView(APIView):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for_user(user)
 
             return Response({
                 'user': UserSerializer(user).data,
@@ -40,7 +41,7 @@ class LoginView(APIView):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data['user']
-            refresh = RefreshToken.for_user(user)
+            refresh = tokens_for_user(user)
 
             return Response({
                 'user': UserSerializer(user).data,
@@ -55,8 +56,9 @@ class LoginView(APIView):
 class UserProfileView(APIView):
     """
     GET /api/auth/profile/
-    Retorna la información del usuario autenticado
+    Retorna la información del usuario autenticado (lee de una réplica)
     """
+    @read_from_replica
     def get(self, request):
         serializer = UserSerializer(request.user)
         return Response(serializer.data)
@@ -0,0 +1,145 @@
+"""
+Benchmark de compresión de respuestas (modifit_platform.compression)
+
+Arma respuestas JSON realistas (listado de rutinas completo y con fields,
+generate-routine con routine + routines + raw_response) y mide, por codificación y nivel,
+bytes resultantes, ratio y costo de CPU al comprimir y descomprimir.
+
+Uso (desde modifit_platform/):
+    python -m benchmarks.bench_compression --iterations 30 --output compression.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+
+from benchmarks.bench_parser import DAYS, INTRO, OUTRO, _exercise  # noqa: E402
+from modifit_platform.compression import available_codecs, brotli, zstandard  # noqa: E402
+
+LEVELS = {
+    "gzip": [1, 4, 6, 9],
+    "br": [1, 4, 6, 9, 11],
+    "zstd": [1, 3, 9, 19],
+}
+
+
+def _routine(rng, pk, exercises):
+    items = [_exercise(rng) for _ in range(exercises)]
+    for item in items:
+        item["day"] = rng.choice(DAYS)
+    return {
+        "id": pk,
+        "user": 1,
+        "name": f"Routine_1_{pk}",
+        "prompt": "Rutina de hipertrofia de 5 días para ganar masa muscular en piernas y espalda",
+        "exercises": items,
+        "generated_at": "2026-10-18T11:19:57.664096Z",
+        "updated_at": "2026-10-18T11:19:57.664127Z",
+    }
+
+
+def build_payloads(seed=7):
+    rng = random.Random(seed)
+    payloads = {}
+
+    routine = _routine(rng, 1, 12)
+    raw = INTRO + "```json\n" + json.dumps({"exercises": routine["exercises"]}, ensure_ascii=False, indent=2) + "\n```" + OUTRO
+    payloads["generate_routine"] = {
+        "status": "success",
+        "message": "Rutina generada y guardada exitosamente",
+        "routine": routine,
+        "routines": [routine],
+        "raw_response": raw,
+        "cached": False,
+    }
+    payloads["list_page_20"] = {
+        "status": "success",
+        "routines": [_routine(rng, pk, rng.randint(6, 12)) for pk in range(20, 0, -1)],
+        "next_cursor": "MjAyNi0xMC0xOFQxMToxOTo1Ny42NjQwOTYrMDA6MDB8MjA",
+        "has_more": True,
+    }
+    payloads["list_page_20_light"] = {
+        "status": "success",
+        "routines": [{"id": pk, "name": f"Routine_1_{pk}", "generated_at": "2026-10-18T11:19:57Z"} for pk in range(20, 0, -1)],
+        "next_cursor": None,
+        "has_more": False,
+    }
+    payloads["small_error"] = {"status": "error", "message": "Rutina no encontrada"}
+    return {name: json.dumps(data, ensure_ascii=False).encode("utf-8") for name, data in payloads.items()}
+
+
+def _decompressor(encoding):
+    if encoding == "gzip":
+        return lambda data: zlib.decompress(data, 31)
+    if encoding == "br":
+        return brotli.decompress
+    return zstandard.ZstdDecompressor().decompress
+
+
+def _median(fn, data, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(data)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def run(iterations):
+    payloads = build_payloads()
+    encodings = list(available_codecs())
+    report = {"iterations": iterations, "encodings": encodings, "payloads": {}}
+
+    for name, body in payloads.items():
+        results = []
+        for encoding in encodings:
+            decompress = _decompressor(encoding)
+            for level in LEVELS[encoding]:
+                codec = available_codecs({encoding: level})[encoding]
+                compressed = codec.compress(body)
+                compress_s = _median(codec.compress, body, iterations)
+                decompress_s = _median(decompress, compressed, iterations)
+                results.append({
+                    "encoding": encoding,
+                    "level": level,
+                    "bytes": len(compressed),
+                    "ratio": round(len(body) / len(compressed), 2),
+                    "compress_ms": round(compress_s * 1000, 4),
+                    "compress_mb_per_s": round(len(body) / compress_s / 1e6, 1),
+                    "decompress_ms": round(decompress_s * 1000, 4),
+                })
+        report["payloads"][name] = {"bytes": len(body), "results": results}
+    return report
+
+
+def print_table(report):
+    for name, payload in report["payloads"].items():
+        print(f"\n{name} ({payload['bytes']} bytes)")
+        print(f"  {'codec':<6} {'nivel':>5} {'bytes':>8} {'ratio':>6} {'comp ms':>9} {'MB/s':>8} {'desc ms':>9}")
+        for row in payload["results"]:
+            print(f"  {row['encoding']:<6} {row['level']:>5} {row['bytes']:>8} {row['ratio']:>6} "
+                  f"{row['compress_ms']:>9} {row['compress_mb_per_s']:>8} {row['decompress_ms']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--output", help="Archivo donde guardar el reporte JSON")
+    args = parser.parse_args()
+
+    report = run(args.iterations)
+    print_table(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark del parser de respuestas del modelo (fitness.parsing)
+
+Genera un corpus determinista de respuestas grandes y realistas (JSON con
+texto alrededor, bloques ```json, arrays, rutinas por día, respuestas
+truncadas y texto plano) y mide el costo de parseo y la tasa de fallback.
+
+Uso (desde modifit_platform/):
+    python -m benchmarks.bench_parser --iterations 50 --output parser.json
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fitness.parsing import ExerciseStreamParser  # noqa: E402
+
+EXERCISES = [
+    ("Sentadilla con barra", "cuádriceps"), ("Peso muerto rumano", "isquiotibiales"),
+    ("Zancadas búlgaras", "glúteos"), ("Press banca", "pectoral"), ("Remo con barra", "espalda"),
+    ("Dominadas", "dorsales"), ("Press militar", "hombros"), ("Curl de bíceps", "bíceps"),
+    ("Fondos en paralelas", "tríceps"), ("Hip thrust", "glúteos"), ("Plancha", "core"),
+    ("Elevación de talones", "gemelos"), ("Prensa de piernas", "cuádriceps"), ("Face pull", "hombros"),
+]
+DAYS = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado"]
+INTRO = "¡Claro! Aquí tienes una rutina personalizada según tus objetivos. Recuerda calentar 10 minutos antes de empezar.\n\n"
+OUTRO = "\n\nConsejos: mantén una buena técnica, hidrátate y descansa al menos 48 horas entre sesiones del mismo grupo muscular."
+
+
+def _exercise(rng):
+    name, muscle = rng.choice(EXERCISES)
+    return {
+        "name": name,
+        "series": rng.randint(3, 5),
+        "reps": rng.choice([8, 10, 12, "8-12", "6-8"]),
+        "muscle": muscle,
+        "rest_seconds": rng.choice([60, 90, 120]),
+        "description": f"{name}: controla la bajada en 3 segundos y mantén el core activo. " * rng.randint(1, 3),
+    }
+
+
+def _days(rng, per_day):
+    return [{"day": day, "exercises": [_exercise(rng) for _ in range(per_day)]} for day in DAYS]
+
+
+def build_corpus(seed=42):
+    rng = random.Random(seed)
+    corpus = {}
+    corpus["fenced_json"] = INTRO + "```json\n" + json.dumps({"exercises": [_exercise(rng) for _ in range(40)]}, ensure_ascii=False, indent=2) + "\n```" + OUTRO
+    corpus["top_level_array"] = json.dumps([_exercise(rng) for _ in range(40)], ensure_ascii=False)
+    corpus["weekly_plan"] = INTRO + json.dumps({"plan": "Hipertrofia", "days": _days(rng, 8)}, ensure_ascii=False, indent=2) + OUTRO
+    truncated = json.dumps({"exercises": [_exercise(rng) for _ in range(40)]}, ensure_ascii=False)
+    corpus["truncated_json"] = truncated[:int(len(truncated) * 0.8)]
+    lines = []
+    for day in DAYS:
+        lines.append(f"### {day}")
+        for index in range(1, 9):
+            exercise = _exercise(rng)
+            lines.append(f"{index}. {exercise['name']}: {exercise['series']}x{exercise['reps']}")
+            lines.append(f"   {exercise['description']}")
+        lines.append("")
+    corpus["numbered_text"] = INTRO + "\n".join(lines) + OUTRO
+    corpus["prose_only"] = (INTRO + OUTRO) * 20
+    return corpus
+
+
+def run(iterations, chunk_size):
+    corpus = build_corpus()
+    report = {"iterations": iterations, "chunk_size": chunk_size, "cases": {}}
+    methods = Counter()
+
+    for case, text in corpus.items():
+        timings = []
+        method = None
+        count = 0
+        for _ in range(iterations):
+            start = time.perf_counter()
+            parser = ExerciseStreamParser()
+            if chunk_size:
+                for offset in range(0, len(text), chunk_size):
+                    parser.feed(text[offset:offset + chunk_size])
+            else:
+                parser.feed(text)
+            exercises = parser.close()
+            timings.append(time.perf_counter() - start)
+            method = parser.method
+            count = len(exercises)
+
+        methods[method] += 1
+        median = statistics.median(timings)
+        report["cases"][case] = {
+            "bytes": len(text.encode("utf-8")),
+            "method": method,
+            "exercises": count,
+            "median_ms": round(median * 1000, 4),
+            "p95_ms": round(sorted(timings)[int(len(timings) * 0.95) - 1] * 1000, 4),
+            "mb_per_s": round(len(text.encode("utf-8")) / median / 1e6, 2),
+        }
+
+    total = sum(methods.values())
+    report["methods"] = dict(methods)
+    report["fallback_rate"] = (methods["text"] + methods["raw"]) / total if total else 0.0
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--chunk-size", type=int, default=0, help="Simular streaming con fragmentos de este tamaño (0 = respuesta completa)")
+    parser.add_argument("--output", help="Archivo donde guardar el reporte JSON")
+    args = parser.parse_args()
+
+    report = run(args.iterations, args.chunk_size)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Compara dos reportes JSON de benchmarks.load_test
+
+Uso (desde modifit_platform/):
+    python -m benchmarks.compare base.json nuevo.json --threshold 10
+
+Sale con código 1 si el p99 o el throughput de algún escenario empeora
+más que el umbral (en porcentaje).
+"""
+import argparse
+import json
+from pathlib import Path
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regresión máxima tolerada en %%")
+    args = parser.parse_args()
+
+    base = json.loads(Path(args.base).read_text(encoding="utf-8"))
+    candidate = json.loads(Path(args.candidate).read_text(encoding="utf-8"))
+    print(f"base:      {base['meta'].get('commit')}")
+    print(f"candidato: {candidate['meta'].get('commit')}")
+    print(f"{'escenario':<18}{'p50 ms':>18}{'p99 ms':>18}{'req/s':>18}{'errores':>10}")
+
+    regressions = []
+    for name, new in candidate["scenarios"].items():
+        old = base["scenarios"].get(name)
+        if old is None:
+            continue
+        p50 = change(old["latency_ms"]["p50"], new["latency_ms"]["p50"])
+        p99 = change(old["latency_ms"]["p99"], new["latency_ms"]["p99"])
+        rps = change(old["throughput_rps"], new["throughput_rps"])
+
+        def cell(value, delta):
+            return f"{value} ({delta:+.1f}%)" if delta is not None else str(value)
+
+        print(
+            f"{name:<18}{cell(new['latency_ms']['p50'], p50):>18}{cell(new['latency_ms']['p99'], p99):>18}"
+            f"{cell(new['throughput_rps'], rps):>18}{new['errors']:>10}"
+        )
+        if (p99 is not None and p99 > args.threshold) or (rps is not None and rps < -args.threshold):
+            regressions.append(name)
+
+    if regressions:
+        print(f"Regresiones por encima del {args.threshold}%: {', '.join(regressions)}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
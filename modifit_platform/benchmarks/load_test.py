@@ -0,0 +1,295 @@
+"""
+Prueba de carga reproducible de la API contra un modelo simulado
+
+Levanta benchmarks.stub_model como AI_MODEL_URL, arranca la app Django en un
+servidor WSGI local (SQLite por defecto, ver benchmarks/settings.py) o usa
+--base-url para un servidor ya corriendo, y mide register, login,
+generate-routine, user-routines y routine-detail con la concurrencia pedida.
+El reporte JSON se puede comparar entre commits con benchmarks.compare.
+
+Uso (desde modifit_platform/):
+    python -m benchmarks.load_test --concurrency 16 --users 20 --generate 200 \\
+        --reads 1000 --latency lognormal:800:0.4 --output report.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from benchmarks.stub_model import StubModelServer  # noqa: E402
+
+PROMPTS = [
+    "rutina de piernas {n} días para hipertrofia",
+    "rutina full body de {n} días sin equipamiento",
+    "rutina de espalda y bíceps, {n} ejercicios",
+    "rutina de empuje para principiante, {n} días",
+    "rutina de glúteos e isquiotibiales con mancuernas, {n} ejercicios",
+]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class Scenario:
+    """
+    Acumula latencias y códigos de estado de un tipo de request
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.status_codes = Counter()
+        self.errors = 0
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def record(self, latency, status_code, ok):
+        with self.lock:
+            self.latencies.append(latency)
+            self.status_codes[str(status_code)] += 1
+            if not ok:
+                self.errors += 1
+
+    def report(self):
+        duration = (self.finished or 0) - (self.started or 0)
+        millis = [value * 1000 for value in self.latencies]
+        return {
+            "requests": len(millis),
+            "errors": self.errors,
+            "status_codes": dict(self.status_codes),
+            "duration_s": round(duration, 3),
+            "throughput_rps": round(len(millis) / duration, 2) if duration > 0 else None,
+            "latency_ms": {
+                "min": round(min(millis), 2) if millis else None,
+                "mean": round(statistics.fmean(millis), 2) if millis else None,
+                "p50": round(percentile(millis, 0.50), 2) if millis else None,
+                "p90": round(percentile(millis, 0.90), 2) if millis else None,
+                "p99": round(percentile(millis, 0.99), 2) if millis else None,
+                "max": round(max(millis), 2) if millis else None,
+            },
+        }
+
+
+class LoadTest:
+    def __init__(self, base_url, concurrency, seed):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.rng = random.Random(seed)
+        self.local = threading.local()
+        self.scenarios = {}
+
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def call(self, scenario, method, path, expected, token=None, **kwargs):
+        headers = kwargs.pop("headers", {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        start = time.perf_counter()
+        try:
+            response = self.session().request(method, self.base_url + path, headers=headers, timeout=300, **kwargs)
+            status_code = response.status_code
+        except requests.RequestException:
+            response = None
+            status_code = "connection_error"
+        scenario.record(time.perf_counter() - start, status_code, status_code in expected)
+        return response
+
+    def run(self, name, tasks):
+        """
+        Ejecuta las tareas con la concurrencia configurada y retorna sus resultados
+        """
+        scenario = self.scenarios[name] = Scenario(name)
+        scenario.started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            results = list(executor.map(lambda task: task(scenario), tasks))
+        scenario.finished = time.perf_counter()
+        return results
+
+    def execute(self, users, generate, reads, fresh):
+        run_id = f"{int(time.time())}{self.rng.randint(1000, 9999)}"
+        password = "BenchPass123!"
+        accounts = [f"bench_{run_id}_{index}" for index in range(users)]
+
+        def register(username):
+            def task(scenario):
+                return self.call(scenario, "POST", "/api/auth/register/", {201}, json={
+                    "username": username,
+                    "email": f"{username}@bench.local",
+                    "password": password,
+                    "password_confirm": password,
+                })
+            return task
+
+        def login(username):
+            def task(scenario):
+                response = self.call(scenario, "POST", "/api/auth/login/", {200}, json={
+                    "username": username,
+                    "password": password,
+                })
+                return response.json().get("access") if response is not None and response.ok else None
+            return task
+
+        self.run("register", [register(username) for username in accounts])
+        tokens = [token for token in self.run("login", [login(username) for username in accounts]) if token]
+        if not tokens:
+            raise SystemExit("No se pudo autenticar ningún usuario de prueba")
+
+        def generate_routine(token, prompt):
+            def task(scenario):
+                response = self.call(scenario, "POST", "/api/fitness/generate-routine/", {201}, token=token,
+                                     json={"prompt": prompt, "fresh": fresh})
+                if response is not None and response.status_code == 201:
+                    return token, response.json()["routine"]["id"]
+                return None
+            return task
+
+        generate_tasks = [
+            generate_routine(self.rng.choice(tokens), self.rng.choice(PROMPTS).format(n=self.rng.randint(2, 6)))
+            for _ in range(generate)
+        ]
+        created = [item for item in self.run("generate_routine", generate_tasks) if item]
+
+        def list_routines(token):
+            def task(scenario):
+                self.call(scenario, "GET", "/api/fitness/user-routines/", {200}, token=token)
+            return task
+
+        def routine_detail(token, routine_id):
+            def task(scenario):
+                self.call(scenario, "GET", f"/api/fitness/routine/{routine_id}/", {200}, token=token)
+            return task
+
+        self.run("user_routines", [list_routines(self.rng.choice(tokens)) for _ in range(reads)])
+        if created:
+            self.run("routine_detail", [routine_detail(*self.rng.choice(created)) for _ in range(reads)])
+
+        return {name: scenario.report() for name, scenario in self.scenarios.items()}
+
+
+def start_local_app(settings_module, db_path):
+    """
+    Prepara la base y sirve la app Django en un hilo con el servidor WSGI de runserver
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    if db_path:
+        os.environ["BENCH_DB_PATH"] = db_path
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    call_command("migrate", run_syncdb=True, verbosity=0)
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadedWSGIServer(("127.0.0.1", 0), QuietHandler)
+    server.daemon_threads = True
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, name="bench-app", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", help="Usar un servidor ya corriendo en lugar de levantar la app local")
+    parser.add_argument("--settings", default="benchmarks.settings", help="Módulo de settings para la app local")
+    parser.add_argument("--db-path", help="Archivo SQLite (se recrea en cada corrida)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--generate", type=int, default=50, help="Cantidad de generate-routine")
+    parser.add_argument("--reads", type=int, default=200, help="Cantidad de lecturas de listado y de detalle")
+    parser.add_argument("--fresh", action="store_true", help="Enviar fresh=true para saltear la caché de generaciones")
+    parser.add_argument("--latency", default="fixed:200", help="Latencia del modelo simulado (ver benchmarks.stub_model)")
+    parser.add_argument("--exercises", type=int, default=8, help="Ejercicios por respuesta del modelo simulado")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de errores 500 del modelo simulado")
+    parser.add_argument("--stub-port", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="Archivo donde guardar el reporte JSON")
+    args = parser.parse_args()
+
+    stub = StubModelServer(port=args.stub_port, latency=args.latency, exercises=args.exercises,
+                           error_rate=args.error_rate, seed=args.seed).start()
+    os.environ["AI_MODEL_URL"] = stub.url
+    os.environ.setdefault("AI_MODEL_TOKEN", "benchmark")
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server, base_url = start_local_app(args.settings, args.db_path)
+    else:
+        print(f"Stub del modelo en {stub.url} (configurar AI_MODEL_URL del servidor)", file=sys.stderr)
+
+    started = time.perf_counter()
+    scenarios = LoadTest(base_url, args.concurrency, args.seed).execute(
+        args.users, args.generate, args.reads, args.fresh
+    )
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "base_url": base_url if args.base_url else "local",
+            "config": {
+                key: value for key, value in vars(args).items()
+                if key not in ("output", "base_url", "db_path")
+            },
+            "stub": {"requests": stub.requests, "errors": stub.errors},
+            "total_duration_s": round(time.perf_counter() - started, 3),
+        },
+        "scenarios": scenarios,
+    }
+
+    if server is not None:
+        server.shutdown()
+    stub.stop()
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
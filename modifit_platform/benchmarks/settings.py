@@ -0,0 +1,33 @@
+"""
+Settings para correr la app en benchmarks sobre SQLite local
+
+La base se elige con BENCH_DB_PATH. Para medir contra la base configurada
+en modifit_platform.settings basta con no usar este módulo (--settings).
+"""
+import os
+import tempfile
+
+from modifit_platform.settings import *  # noqa: F401,F403
+from modifit_platform.settings import SIMPLE_JWT
+
+SECRET_KEY = os.getenv("SECRET_KEY") or "benchmark-only-secret-key-not-for-production-use"
+SIMPLE_JWT = dict(SIMPLE_JWT, SIGNING_KEY=SECRET_KEY)
+
+DEBUG = False
+ALLOWED_HOSTS = ["127.0.0.1", "localhost"]
+SECURE_SSL_REDIRECT = False
+CSRF_COOKIE_SECURE = False
+SESSION_COOKIE_SECURE = False
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.getenv("BENCH_DB_PATH", os.path.join(tempfile.gettempdir(), "modifit_bench.sqlite3")),
+        "OPTIONS": {"timeout": 30},
+    }
+}
+
+# Las tablas se crean con migrate --run-syncdb
+MIGRATION_MODULES = {
+    app: None for app in ("admin", "auth", "contenttypes", "sessions", "authe", "fitness")
+}
@@ -0,0 +1,189 @@
+"""
+Servidor local que imita a AI_MODEL_URL (chat/completions) para benchmarks
+
+Responde con rutinas realistas en JSON, con latencia, tamaño de respuesta
+y tasa de errores configurables. Soporta "stream": true (SSE).
+
+Uso (desde modifit_platform/):
+    python -m benchmarks.stub_model --port 8089 --latency lognormal:800:0.4 --error-rate 0.02
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EXERCISES = [
+    ("Sentadilla con barra", "cuádriceps"), ("Peso muerto rumano", "isquiotibiales"),
+    ("Zancadas búlgaras", "glúteos"), ("Press banca", "pectoral"), ("Remo con barra", "espalda"),
+    ("Dominadas", "dorsales"), ("Press militar", "hombros"), ("Curl de bíceps", "bíceps"),
+    ("Fondos en paralelas", "tríceps"), ("Hip thrust", "glúteos"), ("Plancha", "core"),
+    ("Elevación de talones", "gemelos"), ("Prensa de piernas", "cuádriceps"), ("Face pull", "hombros"),
+]
+
+
+class LatencyModel:
+    """
+    Distribución de latencia: fixed:<ms>, uniform:<min_ms>:<max_ms> o lognormal:<mediana_ms>:<sigma>
+    """
+
+    def __init__(self, spec: str, rng: random.Random):
+        parts = spec.split(":")
+        self.kind = parts[0]
+        self.params = [float(value) for value in parts[1:]]
+        self.rng = rng
+        self.lock = threading.Lock()
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if self.kind not in expected or len(self.params) != expected[self.kind]:
+            raise ValueError(f"Latencia inválida: {spec}")
+
+    def sample(self) -> float:
+        with self.lock:
+            if self.kind == "fixed":
+                millis = self.params[0]
+            elif self.kind == "uniform":
+                millis = self.rng.uniform(*self.params)
+            else:
+                median, sigma = self.params
+                millis = self.rng.lognormvariate(math.log(median), sigma)
+        return millis / 1000
+
+
+class StubModelServer:
+    """
+    Servidor HTTP en un hilo aparte; url apunta al endpoint chat/completions
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency="fixed:200", exercises=8, error_rate=0.0, seed=1234):
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.exercises = exercises
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v1/chat/completions"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-model", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next_outcome(self):
+        with self._lock:
+            self.requests += 1
+            failed = self.rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            seed = self.rng.random()
+        return failed, seed
+
+    def build_content(self, seed: float) -> str:
+        rng = random.Random(seed)
+        exercises = []
+        for _ in range(self.exercises):
+            name, muscle = rng.choice(EXERCISES)
+            exercises.append({
+                "name": name,
+                "series": rng.randint(3, 5),
+                "reps": rng.choice([8, 10, 12, "8-12"]),
+                "muscle": muscle,
+                "rest_seconds": rng.choice([60, 90, 120]),
+                "description": f"{name}: controla la fase excéntrica y mantén el core activo.",
+            })
+        body = json.dumps({"exercises": exercises}, ensure_ascii=False, indent=2)
+        return f"¡Claro! Esta es tu rutina:\n```json\n{body}\n```\nRecuerda calentar antes de empezar."
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    request = {}
+
+                failed, seed = stub._next_outcome()
+                time.sleep(stub.latency.sample())
+
+                if failed:
+                    self._send(500, "application/json", b'{"error": "stub upstream error"}')
+                    return
+
+                content = stub.build_content(seed)
+                if request.get("stream"):
+                    self._stream(content)
+                    return
+
+                payload = {
+                    "id": "stub",
+                    "object": "chat.completion",
+                    "model": request.get("model", "stub"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": 20, "completion_tokens": len(content) // 4},
+                }
+                self._send(200, "application/json", json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+            def _send(self, code, content_type, body):
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, content):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for offset in range(0, len(content), 16):
+                    chunk = {"choices": [{"index": 0, "delta": {"content": content[offset:offset + 16]}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", default="fixed:200", help="fixed:<ms> | uniform:<min>:<max> | lognormal:<mediana>:<sigma>")
+    parser.add_argument("--exercises", type=int, default=8, help="Ejercicios por respuesta (tamaño del payload)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 500")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    server = StubModelServer(args.host, args.port, args.latency, args.exercises, args.error_rate, args.seed).start()
+    print(f"Stub escuchando en {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,194 +1,468 @@
-import requests
 import json
 import os
+import re
+import copy
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import ExitStack
 from dotenv import load_dotenv
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+from django.core.cache import caches
+from modifit_platform.caches import is_shared
+from modifit_platform.timing import phase
+from .http_client import ModelUnavailableError
+from .model_pool import get_model_pool
+from .single_flight import SingleFlight, AsyncSingleFlight
+from .parsing import ExerciseStreamParser, parse_exercises, parse_text_exercises
+from .prompting import shape_request, token_budget, usage_stats
 
 load_dotenv()
 
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normaliza un prompt para usarlo como clave de caché:
+    ignora mayúsculas, puntuación y espacios repetidos
+    """
+    text = unicodedata.normalize("NFKC", prompt).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+class GenerationCache:
+    """
+    Caché de resultados de generación en dos niveles:
+    un LRU en memoria del proceso (con TTL) y un nivel compartido
+    sobre el framework de caché de Django para que lo usen todos los workers.
+    El nivel compartido solo se usa si el alias es Redis/Memcached: sobre
+    LocMemCache sería una segunda copia local (ver modifit_platform.caches)
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: int = 3600, alias: Optional[str] = "default"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.alias = alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0, "sets": 0}
+
+    @staticmethod
+    def make_key(prompt: str, model_name: str, temperature: float, max_tokens: int, system: str = "") -> str:
+        raw = json.dumps([normalize_prompt(prompt), model_name, temperature, max_tokens, system])
+        return "ai_gen:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _shared(self):
+        if not is_shared(self.alias):
+            return None
+        return caches[self.alias]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        value = self._get_local(key, now)
+        if value is not None:
+            return value
+
+        shared = self._shared()
+        value = None
+        if shared is not None:
+            try:
+                value = shared.get(key)
+            except Exception:
+                value = None
+        return self._after_shared_lookup(key, value, now)
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Igual que get, pero el nivel compartido se consulta sin bloquear el event loop
+        """
+        now = time.monotonic()
+        value = self._get_local(key, now)
+        if value is not None:
+            return value
+
+        shared = self._shared()
+        value = None
+        if shared is not None:
+            try:
+                value = await shared.aget(key)
+            except Exception:
+                value = None
+        return self._after_shared_lookup(key, value, now)
+
+    def _get_local(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+        return None
+
+    def _after_shared_lookup(self, key: str, value: Optional[Dict[str, Any]], now: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["shared_hits"] += 1
+            self._store_local(key, value, now)
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        self._set_local(key, value)
+
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set(key, value, self.ttl)
+            except Exception:
+                pass
+
+    async def aset(self, key: str, value: Dict[str, Any]) -> None:
+        self._set_local(key, value)
+
+        shared = self._shared()
+        if shared is not None:
+            try:
+                await shared.aset(key, value, self.ttl)
+            except Exception:
+                pass
+
+    def _set_local(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._store_local(key, value, time.monotonic())
+            self._stats["sets"] += 1
+
+    def _store_local(self, key: str, value: Dict[str, Any], now: float) -> None:
+        # Se llama con el lock tomado
+        self._entries[key] = (now + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        stats["max_entries"] = self.max_entries
+        stats["ttl"] = self.ttl
+        stats["shared"] = is_shared(self.alias)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+generation_cache = GenerationCache(
+    max_entries=int(os.getenv("AI_CACHE_MAX_ENTRIES", "256")),
+    ttl=int(os.getenv("AI_CACHE_TTL", "3600")),
+    alias=os.getenv("AI_CACHE_ALIAS", "default") or None,
+)
+
+generation_flights = SingleFlight(
+    distributed=os.getenv("AI_SINGLE_FLIGHT_DISTRIBUTED", "false").lower() in ("1", "true", "yes"),
+    alias=os.getenv("AI_CACHE_ALIAS", "default") or "default",
+    lock_timeout=int(os.getenv("AI_SINGLE_FLIGHT_LOCK_TIMEOUT", "120")),
+)
+
+async_generation_flights = AsyncSingleFlight()
+
+
 class AIFitnessService:
     """
     Servicio para generar rutinas de ejercicios usando un modelo de IA
     """
 
     def __init__(self):
-        self.token = os.getenv("AI_MODEL_TOKEN", "qlEE6b6b8fVXuRWYxAA8mxVDvfolkalv")
-        self.model_url = os.getenv("AI_MODEL_URL", "https://mwjt5t5qmp2bhooiw2s7ioul.agents.do-ai.run/api/v1/chat/completions")
-        self.model_name = os.getenv("AI_MODEL_NAME", "modifit-agent")
+        # URL, modelo y token de cada backend los maneja el pool (ver model_pool.py)
+        self.pool = get_model_pool()
+        self.model_name = self.pool.model_names
+        self.temperature = 0.7
+        self.max_tokens = token_budget.maximum
+        # Presupuesto de tokens e instrucción de sistema según el pedido (ver prompting.py)
+        self.shaping = os.getenv("AI_PROMPT_SHAPING", "true").lower() in ("1", "true", "yes")
+        self.cache = generation_cache
+        self.flights = generation_flights
 
-    def generate_exercises(self, user_prompt: str) -> Dict[str, Any]:
+    def generate_exercises(self, user_prompt: str, use_cache: bool = True,
+                           size: Optional[int] = None) -> Dict[str, Any]:
         """
         Genera ejercicios basados en el prompt del usuario
 
         Args:
             user_prompt: El prompt del usuario describiendo sus necesidades de entrenamiento
+            use_cache: Si es False se ignora la caché y se pide una rutina nueva al modelo
+            size: Cantidad de ejercicios esperada; si no se indica se deduce del prompt
 
         Returns:
             Dict con los ejercicios generados y metadatos
         """
-        try:
-            # Preparar los datos para enviar al modelo de IA
-            data = {
-                "model": self.model_name,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ],
-                "temperature": 0.7,
-                "max_tokens": 5000
-            }
+        shape = self.shape(user_prompt, size)
+        cache_key = self._cache_key(user_prompt, shape)
+        if use_cache:
+            with phase("cache"):
+                cached = self.cache.get(cache_key)
+            if cached is not None:
+                return dict(cached, cached=True)
 
-            # Configurar headers con Authorization Bearer
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.token}"
-            }
+        # Las solicitudes concurrentes con el mismo prompt normalizado
+        # comparten una única llamada al modelo. Con use_cache=False no se toma
+        # de la caché lo que dejó el líder de otro proceso: se genera de nuevo
+        result, coalesced = self.flights.do(
+            cache_key,
+            lambda: self._generate_and_store(cache_key, shape),
+            lookup=(lambda: self.cache.get(cache_key)) if use_cache else None
+        )
+        return dict(result, cached=False, coalesced=coalesced)
 
-            # Realizar la solicitud al modelo de IA
-            response = requests.post(self.model_url, json=data, headers=headers)
+    def _generate_and_store(self, cache_key: str, shape: Dict[str, Any]) -> Dict[str, Any]:
+        result = self._generate_exercises(shape)
 
-            if response.status_code == 200:
-                result = response.json()
+        # Solo se guardan en caché las generaciones exitosas
+        if result["status"] == "success":
+            self.cache.set(cache_key, result)
+        return result
 
-                # Extraer el contenido de la respuesta
-                if "choices" in result and len(result["choices"]) > 0:
-                    ai_response = result["choices"][0]["message"]["content"]
+    def shape(self, user_prompt: str, size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Mensajes y max_tokens para el pedido (ver prompting.shape_request)
+        """
+        return shape_request(user_prompt, size, enabled=self.shaping)
 
-                    # Parsear la respuesta para extraer los ejercicios
-                    exercises = self._parse_exercises_from_response(ai_response)
+    def _cache_key(self, user_prompt: str, shape: Dict[str, Any]) -> str:
+        return self.cache.make_key(user_prompt, self.model_name, self.temperature, shape["max_tokens"], shape["system"])
 
-                    return {
-                        "status": "success",
-                        "raw_response": ai_response,
-                        "exercises": exercises,
-                        "message": "Rutina generada exitosamente"
-                    }
-                else:
-                    return {
+    def _build_payload(self, shape: Dict[str, Any], stream: bool = False) -> Dict[str, Any]:
+        """
+        Prepara los datos para enviar al modelo de IA
+        (el pool reemplaza `model` por el del backend elegido)
+        """
+        data = {
+            "model": self.model_name,
+            "messages": shape["messages"],
+            "temperature": self.temperature,
+            "max_tokens": shape["max_tokens"]
+        }
+        if stream:
+            data["stream"] = True
+        return data
+
+    def stream_exercises(self, user_prompt: str, use_cache: bool = True,
+                         size: Optional[int] = None) -> Iterator[Tuple[str, Any]]:
+        """
+        Genera ejercicios pidiendo al modelo la respuesta en streaming
+
+        Produce tuplas (evento, datos):
+            ("token", str): fragmento de texto recibido del modelo
+            ("exercise", dict): ejercicio completo en cuanto el parser lo cierra
+            ("done", dict): resultado final con el mismo formato que generate_exercises
+        """
+        shape = self.shape(user_prompt, size)
+        cache_key = self._cache_key(user_prompt, shape)
+        if use_cache:
+            with phase("cache"):
+                cached = self.cache.get(cache_key)
+            if cached is not None:
+                for exercise in cached["exercises"]:
+                    yield "exercise", exercise
+                yield "done", dict(cached, cached=True)
+                return
+
+        parser = ExerciseStreamParser()
+        try:
+            # El backend queda reservado hasta terminar de leer la respuesta
+            with ExitStack() as stack:
+                with phase("model"):
+                    response = stack.enter_context(self.pool.stream(self._build_payload(shape, stream=True)))
+                if response.status_code != 200:
+                    yield "done", {
                         "status": "error",
-                        "message": "Respuesta inválida del modelo",
-                        "raw_response": result
+                        "message": f"Error {response.status_code}: {response.text}",
+                        "error_code": response.status_code
                     }
-            else:
-                return {
-                    "status": "error",
-                    "message": f"Error {response.status_code}: {response.text}",
-                    "error_code": response.status_code
-                }
+                    return
 
+                for token in self._iter_stream_tokens(response):
+                    yield "token", token
+                    for exercise in parser.feed(token):
+                        yield "exercise", exercise
+        except ModelUnavailableError as e:
+            yield "done", self._unavailable_result(e)
+            return
         except Exception as e:
-            return {
+            yield "done", {
                 "status": "error",
                 "message": f"Error al generar ejercicios: {str(e)}",
                 "error_details": str(e)
             }
+            return
 
-    def _parse_exercises_from_response(self, ai_response: str) -> List[Dict[str, Any]]:
+        # El parser ya recorrió el texto completo mientras llegaba
+        exercises = parser.close()
+        result = {
+            "status": "success",
+            "raw_response": parser.text,
+            "exercises": exercises,
+            "message": "Rutina generada exitosamente"
+        }
+        self.cache.set(cache_key, result)
+        yield "done", dict(result, cached=False)
+
+    @staticmethod
+    def _iter_stream_tokens(response) -> Iterator[str]:
         """
-        Parsea la respuesta del modelo de IA para extraer los ejercicios
+        Extrae el texto de los eventos 'data:' de una respuesta en streaming
+        con formato chat/completions
+        """
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == "[DONE]":
+                break
+            try:
+                chunk = json.loads(payload)
+            except json.JSONDecodeError:
+                continue
+            for choice in chunk.get("choices") or []:
+                content = (choice.get("delta") or {}).get("content")
+                if content:
+                    yield content
 
-        Args:
-            ai_response: La respuesta de texto del modelo de IA
+    def _generate_exercises(self, shape: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Llama al modelo de IA sin pasar por la caché
+        """
+        try:
+            data = self._build_payload(shape)
 
-        Returns:
-            Lista de ejercicios parseados
+            # Realizar la solicitud al modelo de IA (backend elegido por el pool)
+            with phase("model"):
+                response = self.pool.post(data)
+            return self._result_from_response(response, shape)
+
+        except ModelUnavailableError as e:
+            return self._unavailable_result(e)
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Error al generar ejercicios: {str(e)}",
+                "error_details": str(e)
+            }
+
+    async def agenerate_exercises(self, user_prompt: str, use_cache: bool = True,
+                                  size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Versión async de generate_exercises para las vistas bajo ASGI:
+        la llamada al modelo no bloquea el event loop
         """
-        exercises = []
+        shape = self.shape(user_prompt, size)
+        cache_key = self._cache_key(user_prompt, shape)
+        if use_cache:
+            with phase("cache"):
+                cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                return dict(cached, cached=True)
 
+        result, coalesced = await async_generation_flights.do(
+            cache_key,
+            lambda: self._agenerate_and_store(cache_key, shape)
+        )
+        return dict(result, cached=False, coalesced=coalesced)
+
+    async def _agenerate_and_store(self, cache_key: str, shape: Dict[str, Any]) -> Dict[str, Any]:
+        result = await self._agenerate_exercises(shape)
+        if result["status"] == "success":
+            await self.cache.aset(cache_key, result)
+        return result
+
+    async def _agenerate_exercises(self, shape: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            # Intentar parsear como JSON si la respuesta contiene JSON
-            if "{" in ai_response and "}" in ai_response:
-                # Encontrar el JSON en la respuesta
-                json_start = ai_response.find("{")
-                json_end = ai_response.rfind("}") + 1
-
-                if json_start != -1 and json_end != 0:
-                    json_str = ai_response[json_start:json_end]
-                    try:
-                        parsed = json.loads(json_str)
-
-                        # Si es una lista de ejercicios
-                        if isinstance(parsed, list):
-                            exercises = parsed
-                        # Si es un dict con ejercicios
-                        elif isinstance(parsed, dict):
-                            if "exercises" in parsed:
-                                exercises = parsed["exercises"]
-                            elif "routines" in parsed:
-                                exercises = parsed["routines"]
-                            else:
-                                exercises = [parsed]
-                    except json.JSONDecodeError:
-                        # Si no es JSON válido, lo tratamos como texto plano
-                        exercises = self._parse_text_exercises(ai_response)
-            else:
-                # Parsear como texto plano
-                exercises = self._parse_text_exercises(ai_response)
+            with phase("model"):
+                response = await self.pool.apost(self._build_payload(shape))
+            return self._result_from_response(response, shape)
 
+        except ModelUnavailableError as e:
+            return self._unavailable_result(e)
         except Exception as e:
-            # Si algo falla, retornar la respuesta como un único ejercicio
-            exercises = [{
-                "name": "Rutina generada",
-                "description": ai_response,
-                "is_text_response": True
-            }]
+            return {
+                "status": "error",
+                "message": f"Error al generar ejercicios: {str(e)}",
+                "error_details": str(e)
+            }
 
-        return exercises
+    def _result_from_response(self, response, shape: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Arma el resultado a partir de la respuesta del modelo
+        (sirve tanto para requests como para httpx)
+        """
+        if response.status_code != 200:
+            return {
+                "status": "error",
+                "message": f"Error {response.status_code}: {response.text}",
+                "error_code": response.status_code
+            }
 
-    def _parse_text_exercises(self, text: str) -> List[Dict[str, Any]]:
+        with phase("parse"):
+            result = response.json()
+
+        # Extraer el contenido de la respuesta
+        if "choices" in result and len(result["choices"]) > 0:
+            ai_response = result["choices"][0]["message"]["content"]
+
+            # Parsear la respuesta para extraer los ejercicios
+            with phase("parse"):
+                exercises = self._parse_exercises_from_response(ai_response)
+            usage_stats.record(
+                shape["max_tokens"],
+                result.get("usage"),
+                result["choices"][0].get("finish_reason"),
+                len(exercises)
+            )
+
+            return {
+                "status": "success",
+                "raw_response": ai_response,
+                "exercises": exercises,
+                "message": "Rutina generada exitosamente"
+            }
+        return {
+            "status": "error",
+            "message": "Respuesta inválida del modelo",
+            "raw_response": result
+        }
+
+    @staticmethod
+    def _unavailable_result(error: ModelUnavailableError) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "message": str(error),
+            "error_code": 503
+        }
+
+    def _parse_exercises_from_response(self, ai_response: str) -> List[Dict[str, Any]]:
         """
-        Parsea ejercicios desde texto plano
-        Busca líneas que comiencen con números o guiones
+        Parsea la respuesta del modelo de IA para extraer los ejercicios
 
         Args:
-            text: Texto con los ejercicios
+            ai_response: La respuesta de texto del modelo de IA
 
         Returns:
             Lista de ejercicios parseados
         """
-        exercises = []
-        lines = text.split('\n')
-
-        current_exercise = None
-        for line in lines:
-            line = line.strip()
+        return parse_exercises(ai_response)
 
-            # Saltar líneas vacías
-            if not line:
-                if current_exercise:
-                    exercises.append(current_exercise)
-                    current_exercise = None
-                continue
-
-            # Detectar nueva línea de ejercicio (comienza con número o guión)
-            if line and (line[0].isdigit() or line.startswith('-') or line.startswith('•')):
-                if current_exercise:
-                    exercises.append(current_exercise)
-
-                # Crear nuevo ejercicio
-                exercise_name = line.lstrip('0123456789.-• ').split(':')[0].split(',')[0]
-                current_exercise = {
-                    "name": exercise_name,
-                    "description": line,
-                    "series": 3,
-                    "reps": 10
-                }
-            elif current_exercise:
-                # Agregar información adicional al ejercicio actual
-                current_exercise["description"] = f"{current_exercise['description']} {line}"
-
-        # Agregar el último ejercicio
-        if current_exercise:
-            exercises.append(current_exercise)
-
-        # Si no hay ejercicios parseados, retornar el texto completo como un ejercicio
-        if not exercises:
-            exercises = [{
-                "name": "Rutina personalizada",
-                "description": text,
-                "is_text_response": True
-            }]
-
-        return exercises
+    def _parse_text_exercises(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Parsea ejercicios desde texto plano
+        """
+        return parse_text_exercises(text)
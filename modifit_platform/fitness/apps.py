@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class FitnessConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "fitness"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from modifit_platform.db_router import check_pin_cache
+        checks.register(check_generation_cache, checks.Tags.caches)
+        checks.register(check_pin_cache, checks.Tags.caches, checks.Tags.database)
+
+
+def check_generation_cache(app_configs, **kwargs):
+    from modifit_platform.caches import local_cache_warning
+    from .ai_service import generation_cache
+    return local_cache_warning(generation_cache.alias, "La caché de generaciones (AI_CACHE_ALIAS)", "fitness.W001")
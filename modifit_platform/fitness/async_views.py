@@ -0,0 +1,331 @@
+from asgiref.sync import sync_to_async
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+
+from authe.async_views import _exception_response, _json_response, _parse_data
+from authe.authentication import CachedJWTAuthentication
+from .models import AIGeneratedRoutine, RoutineGenerationJob
+from .serializers import (
+    AIGeneratedRoutineSerializer,
+    GenerateRoutineRequestSerializer,
+    GenerateBatchRequestSerializer,
+    ListRoutinesQuerySerializer,
+    RoutineGenerationJobSerializer,
+)
+from .ai_service import AIFitnessService
+from .jobs import job_pool
+from .batch import agenerate_batch, persist_batch_results
+from .fallback import (
+    afinish_in_background,
+    arace_model,
+    deadline_seconds,
+    fallback_payload,
+    fallback_reason,
+    fallback_stats,
+    generate_fallback,
+)
+from .pagination import InvalidCursor, akeyset_page
+from .conditional import aroutine_list_validators, routine_validators
+from .views import ai_error_status, filter_by_exercises
+from modifit_platform.db_router import read_from_replica
+from modifit_platform.timing import phase
+
+
+class AsyncAuthenticatedView(View):
+    """
+    Base de las vistas async de fitness: autentica el JWT igual que DRF
+    (CachedJWTAuthentication) y, si no hay usuario válido, responde el mismo
+    401 que una APIView
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        authenticator = CachedJWTAuthentication()
+        try:
+            result = await sync_to_async(authenticator.authenticate)(request)
+            if result is None:
+                raise exceptions.NotAuthenticated()
+        except (exceptions.AuthenticationFailed, exceptions.NotAuthenticated) as e:
+            return _exception_response(request, e, authenticator.authenticate_header(request))
+        request.user, request.auth = result
+        return await super().dispatch(request, *args, **kwargs)
+
+
+async def adefault_routine_name(user):
+    count = await AIGeneratedRoutine.objects.filter(user=user).acount()
+    return f"Routine_{user.id}_{count + 1}"
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncGenerateAIRoutineView(AsyncAuthenticatedView):
+    """
+    POST /api/fitness/generate-routine/ (ASGI)
+    Igual que GenerateAIRoutineView, pero mientras espera al modelo de IA
+    no ocupa un hilo: la llamada va por httpx.AsyncClient
+    """
+    http_method_names = ['post', 'options']
+
+    async def post(self, request):
+        try:
+            data = _parse_data(request)
+        except exceptions.APIException as e:
+            return _exception_response(request, e)
+
+        serializer = GenerateRoutineRequestSerializer(data=data)
+        with phase("validate"):
+            valid = serializer.is_valid()
+        if not valid:
+            return _json_response(serializer.errors, status=400)
+
+        prompt = serializer.validated_data['prompt']
+        routine_name = serializer.validated_data.get('routine_name') or await adefault_routine_name(request.user)
+        use_cache = not serializer.validated_data['fresh']
+
+        if serializer.validated_data['async_mode']:
+            job = await RoutineGenerationJob.objects.acreate(
+                user=request.user,
+                prompt=prompt,
+                routine_name=routine_name,
+                use_cache=use_cache,
+                size=serializer.validated_data.get('size')
+            )
+            await sync_to_async(job_pool.notify)()
+            return _json_response(
+                {
+                    'status': 'queued',
+                    'message': 'Generación encolada',
+                    'job': RoutineGenerationJobSerializer(job).data,
+                    'status_url': reverse('fitness:generation-job-detail', args=[job.id])
+                },
+                status=202
+            )
+
+        ai_service = AIFitnessService()
+        size = serializer.validated_data.get('size')
+        deadline = deadline_seconds(serializer.validated_data.get('deadline_ms'))
+        if deadline is not None:
+            ai_result, pending = await arace_model(ai_service, prompt, use_cache, size, deadline)
+            if ai_result is None or ai_result['status'] != 'success':
+                return await self._fallback_response(
+                    request.user, prompt, routine_name, size, fallback_reason(ai_result, pending), pending,
+                    serializer.validated_data['replace_fallback']
+                )
+        else:
+            ai_result = await ai_service.agenerate_exercises(prompt, use_cache=use_cache, size=size)
+
+        if ai_result['status'] != 'success':
+            return _json_response(ai_result, status=ai_error_status(ai_result))
+
+        try:
+            with phase("save"):
+                routine = await AIGeneratedRoutine.objects.acreate(
+                    user=request.user,
+                    name=routine_name,
+                    prompt=prompt,
+                    exercises=ai_result['exercises']
+                )
+
+            routine_data = AIGeneratedRoutineSerializer(routine).data
+            return _json_response(
+                {
+                    'status': 'success',
+                    'message': 'Rutina generada y guardada exitosamente',
+                    'routine': routine_data,
+                    'routines': [routine_data],
+                    'raw_response': ai_result.get('raw_response', ''),
+                    'cached': ai_result.get('cached', False),
+                    'fallback': False
+                },
+                status=201
+            )
+        except Exception as e:
+            return _json_response(
+                {
+                    'status': 'error',
+                    'message': f'Error al guardar la rutina: {str(e)}'
+                },
+                status=500
+            )
+
+    @staticmethod
+    async def _fallback_response(user, prompt, routine_name, size, reason, pending, replace):
+        try:
+            with phase("fallback"):
+                result = await sync_to_async(generate_fallback)(prompt, size)
+            with phase("save"):
+                routine = await AIGeneratedRoutine.objects.acreate(
+                    user=user,
+                    name=routine_name,
+                    prompt=prompt,
+                    exercises=result['exercises'],
+                    fallback=True
+                )
+        except Exception as e:
+            return _json_response(
+                {
+                    'status': 'error',
+                    'message': f'Error al generar la rutina local: {str(e)}'
+                },
+                status=500
+            )
+
+        fallback_stats.record('served')
+        fallback_stats.record(reason)
+        replacement = None
+        if pending is not None:
+            replacement = await afinish_in_background(pending, routine.id if replace else None)
+        if replacement == 'replaced':
+            await routine.arefresh_from_db()
+        return _json_response(fallback_payload(AIGeneratedRoutineSerializer(routine).data, reason, replacement), status=201)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncGenerateBatchRoutinesView(AsyncAuthenticatedView):
+    """
+    POST /api/fitness/generate-routine/batch/ (ASGI)
+    Igual que GenerateBatchRoutinesView, con las llamadas al modelo como
+    corrutinas acotadas por un semáforo
+    """
+    http_method_names = ['post', 'options']
+
+    async def post(self, request):
+        try:
+            data = _parse_data(request)
+        except exceptions.APIException as e:
+            return _exception_response(request, e)
+
+        serializer = GenerateBatchRequestSerializer(data=data)
+        if not serializer.is_valid():
+            return _json_response(serializer.errors, status=400)
+
+        items = serializer.validated_data['items']
+        results = await agenerate_batch(
+            [item['prompt'] for item in items],
+            use_cache=not serializer.validated_data['fresh'],
+            size=serializer.validated_data.get('size')
+        )
+
+        try:
+            payload, http_status = await sync_to_async(persist_batch_results)(
+                request.user,
+                items,
+                results,
+                name_prefix=serializer.validated_data.get('name_prefix')
+            )
+        except Exception as e:
+            return _json_response(
+                {
+                    'status': 'error',
+                    'message': f'Error al guardar las rutinas: {str(e)}'
+                },
+                status=500
+            )
+        return _json_response(payload, status=http_status)
+
+
+class AsyncListUserRoutinesView(AsyncAuthenticatedView):
+    """
+    GET /api/fitness/user-routines/ (ASGI)
+    Igual que ListUserRoutinesView (mismos parámetros, cursor y 304) con el ORM async
+    """
+    http_method_names = ['get', 'options']
+
+    @read_from_replica
+    async def get(self, request):
+        query = ListRoutinesQuerySerializer(data=request.GET)
+        if not query.is_valid():
+            return _json_response(query.errors, status=400)
+        params = query.validated_data
+
+        try:
+            routines = AIGeneratedRoutine.objects.filter(user=request.user)
+
+            validators = await aroutine_list_validators(routines, request.META.get('QUERY_STRING', ''))
+            not_modified = validators.not_modified(request)
+            if not_modified is not None:
+                return not_modified
+
+            routines = filter_by_exercises(routines, request.user, params)
+            total = await routines.acount() if params['count'] else None
+
+            fields = params.get('fields')
+            if fields:
+                routines = routines.only(*set(fields) | {'id', 'generated_at'})
+
+            page, next_cursor = await akeyset_page(routines, params.get('cursor'), params['limit'])
+            routines_data = AIGeneratedRoutineSerializer(page, many=True, fields=fields).data
+        except InvalidCursor as e:
+            return _json_response(
+                {
+                    'status': 'error',
+                    'message': str(e)
+                },
+                status=400
+            )
+        except Exception as e:
+            return _json_response(
+                {
+                    'status': 'error',
+                    'message': f'Error al obtener rutinas: {str(e)}'
+                },
+                status=500
+            )
+
+        data = {
+            'status': 'success',
+            'routines': routines_data,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        }
+        if total is not None:
+            data['count'] = total
+        return validators.apply(_json_response(data, status=200))
+
+
+class AsyncRoutineDetailView(AsyncAuthenticatedView):
+    """
+    GET /api/fitness/routine/<id>/ (ASGI)
+    Igual que RoutineDetailView con el ORM async
+    """
+    http_method_names = ['get', 'options']
+
+    @read_from_replica
+    async def get(self, request, routine_id):
+        try:
+            updated_at = await AIGeneratedRoutine.objects.filter(
+                id=routine_id,
+                user=request.user
+            ).values_list('updated_at', flat=True).afirst()
+            if updated_at is None:
+                raise AIGeneratedRoutine.DoesNotExist
+            not_modified = routine_validators(routine_id, updated_at).not_modified(request)
+            if not_modified is not None:
+                return not_modified
+
+            routine = await AIGeneratedRoutine.objects.aget(id=routine_id, user=request.user)
+            response = _json_response(
+                {
+                    'status': 'success',
+                    'routine': AIGeneratedRoutineSerializer(routine).data
+                },
+                status=200
+            )
+            return routine_validators(routine.id, routine.updated_at).apply(response)
+        except AIGeneratedRoutine.DoesNotExist:
+            return _json_response(
+                {
+                    'status': 'error',
+                    'message': 'Rutina no encontrada'
+                },
+                status=404
+            )
+        except Exception as e:
+            return _json_response(
+                {
+                    'status': 'error',
+                    'message': f'Error: {str(e)}'
+                },
+                status=500
+            )
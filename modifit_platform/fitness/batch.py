@@ -0,0 +1,156 @@
+import os
+import asyncio
+import contextvars
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import connection, transaction
+from rest_framework import status
+
+from .models import AIGeneratedRoutine
+from .serializers import AIGeneratedRoutineSerializer
+from .ai_service import AIFitnessService
+from .exercise_index import sync_routine_exercises
+from .search_index import sync_routine_terms
+from .stats import apply_contribution, compute_user_stats
+from modifit_platform.db_router import pin_primary
+
+BATCH_CONCURRENCY = int(os.getenv("AI_BATCH_CONCURRENCY", "4"))
+
+
+def _error_result(error: Exception) -> Dict[str, Any]:
+    return {
+        "status": "error",
+        "message": f"Error al generar ejercicios: {str(error)}",
+        "error_details": str(error)
+    }
+
+
+def generate_batch(prompts: List[str], use_cache: bool = True, concurrency: int = None,
+                   size: int = None) -> List[Dict[str, Any]]:
+    """
+    Llama al modelo para todos los prompts en paralelo, con a lo sumo
+    `concurrency` llamadas a la vez. Retorna los resultados en el mismo orden
+    """
+    service = AIFitnessService()
+
+    def generate(prompt):
+        try:
+            return service.generate_exercises(prompt, use_cache=use_cache, size=size)
+        except Exception as e:
+            return _error_result(e)
+        finally:
+            # La caché compartida puede haber abierto una conexión en este hilo
+            connection.close()
+
+    workers = max(1, min(concurrency or BATCH_CONCURRENCY, len(prompts)))
+    # Cada hilo corre con una copia del contexto del request (tiempos por fase)
+    contexts = [contextvars.copy_context() for _ in prompts]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-batch") as executor:
+        return list(executor.map(lambda context, prompt: context.run(generate, prompt), contexts, prompts))
+
+
+async def agenerate_batch(prompts: List[str], use_cache: bool = True, concurrency: int = None,
+                          size: int = None) -> List[Dict[str, Any]]:
+    """
+    Versión async de generate_batch: limita la concurrencia con un semáforo
+    """
+    service = AIFitnessService()
+    semaphore = asyncio.Semaphore(max(1, concurrency or BATCH_CONCURRENCY))
+
+    async def generate(prompt):
+        async with semaphore:
+            return await service.agenerate_exercises(prompt, use_cache=use_cache, size=size)
+
+    results = await asyncio.gather(*(generate(prompt) for prompt in prompts), return_exceptions=True)
+    return [_error_result(result) if isinstance(result, Exception) else result for result in results]
+
+
+def save_batch(user_id: int, routines: List[AIGeneratedRoutine],
+               generated_at: Optional[List[Optional[datetime]]] = None) -> List[AIGeneratedRoutine]:
+    """
+    Guarda las rutinas de un usuario con un único INSERT. bulk_create no
+    dispara post_save, así que acá se indexan los ejercicios y se actualizan
+    los acumulados. `generated_at` permite conservar fechas originales (importación)
+    """
+    with transaction.atomic():
+        created = AIGeneratedRoutine.objects.bulk_create(routines)
+        if any(routine.pk is None for routine in created):
+            _load_ids(user_id, created)
+        if generated_at:
+            # auto_now_add pisa la fecha en el INSERT: se restaura con un UPDATE por lote
+            dated = []
+            for routine, moment in zip(created, generated_at):
+                if moment is not None:
+                    routine.generated_at = moment
+                    dated.append(routine)
+            if dated:
+                AIGeneratedRoutine.objects.bulk_update(dated, ['generated_at'], batch_size=500)
+        sync_routine_exercises(created)
+        sync_routine_terms(created)
+        apply_contribution(user_id, compute_user_stats(created), 1)
+    pin_primary(user_id)
+    return created
+
+
+def _load_ids(user_id: int, routines: List[AIGeneratedRoutine]) -> None:
+    # MySQL no devuelve los ids de un INSERT múltiple: se recuperan por
+    # (generated_at, name), que bulk_create ya dejó en cada instancia
+    moments = [routine.generated_at for routine in routines]
+    ids = defaultdict(list)
+    rows = AIGeneratedRoutine.objects.filter(
+        user_id=user_id,
+        generated_at__gte=min(moments),
+        generated_at__lte=max(moments)
+    ).order_by('id').values_list('id', 'generated_at', 'name')
+    for pk, generated_at, name in rows:
+        ids[(generated_at, name)].append(pk)
+    for routine in routines:
+        routine.pk = ids[(routine.generated_at, routine.name)].pop(0)
+
+
+def persist_batch_results(user, items: List[Dict[str, str]], results: List[Dict[str, Any]],
+                          name_prefix: str = None) -> Tuple[Dict[str, Any], int]:
+    """
+    Guarda las generaciones exitosas y arma la respuesta del endpoint batch.
+    Si fallaron algunas se devuelven igual las que salieron bien (status 'partial')
+    """
+    existing = AIGeneratedRoutine.objects.filter(user=user).count()
+    routines = []
+    errors = []
+    for index, (item, result) in enumerate(zip(items, results)):
+        if result['status'] != 'success':
+            errors.append({
+                'index': index,
+                'prompt': item['prompt'],
+                'message': result.get('message', 'Error al generar ejercicios'),
+                'error_code': result.get('error_code')
+            })
+            continue
+        if name_prefix:
+            name = f"{name_prefix} - {item.get('day') or index + 1}"
+        else:
+            name = f"Routine_{user.id}_{existing + len(routines) + 1}"
+        routines.append(AIGeneratedRoutine(
+            user=user,
+            name=name[:255],
+            prompt=item['prompt'],
+            exercises=result['exercises']
+        ))
+
+    if not routines:
+        codes = {error['error_code'] for error in errors}
+        return {
+            'status': 'error',
+            'message': 'No se pudo generar ninguna rutina',
+            'errors': errors
+        }, (status.HTTP_503_SERVICE_UNAVAILABLE if codes == {503} else status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    return {
+        'status': 'partial' if errors else 'success',
+        'message': f'{len(routines)} de {len(items)} rutinas generadas y guardadas',
+        'routines': AIGeneratedRoutineSerializer(save_batch(user.id, routines), many=True).data,
+        'errors': errors
+    }, status.HTTP_201_CREATED
@@ -0,0 +1,62 @@
+import hashlib
+from typing import Optional
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class Validators:
+    """
+    ETag fuerte y Last-Modified de una respuesta, calculados sin serializar
+    """
+
+    def __init__(self, etag: str, last_modified=None):
+        self.etag = quote_etag(etag)
+        self.last_modified = int(last_modified.timestamp()) if last_modified else None
+
+    def not_modified(self, request):
+        """
+        Retorna la respuesta 304 si If-None-Match / If-Modified-Since coinciden, o None
+        """
+        return get_conditional_response(
+            request,
+            etag=self.etag,
+            last_modified=self.last_modified
+        )
+
+    def apply(self, response):
+        response['ETag'] = self.etag
+        if self.last_modified is not None:
+            response['Last-Modified'] = http_date(self.last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+def routine_validators(routine_id: int, updated_at) -> Validators:
+    return Validators(f"routine-{routine_id}-{updated_at.timestamp():.6f}", updated_at)
+
+
+def routine_list_validators(user_routines, query_string: str) -> Validators:
+    """
+    Huella del listado: max(updated_at) y cantidad de rutinas del usuario,
+    más los parámetros de la consulta (cursor, fields, filtros).
+
+    Solo ETag: max(updated_at) no cambia al borrar una rutina que no es la
+    más reciente, así que un Last-Modified haría que un cliente que solo
+    manda If-Modified-Since reciba un 304 con un listado viejo
+    """
+    fingerprint = user_routines.order_by().aggregate(last=Max('updated_at'), total=Count('id'))
+    return _list_validators(fingerprint, query_string)
+
+
+async def aroutine_list_validators(user_routines, query_string: str) -> Validators:
+    fingerprint = await user_routines.order_by().aaggregate(last=Max('updated_at'), total=Count('id'))
+    return _list_validators(fingerprint, query_string)
+
+
+def _list_validators(fingerprint, query_string: str) -> Validators:
+    last = fingerprint['last']
+    raw = f"{last.timestamp() if last else 0:.6f}|{fingerprint['total']}|{query_string}"
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return Validators(f"routines-{digest}")
@@ -0,0 +1,81 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db import transaction
+
+from .models import AIGeneratedRoutine, RoutineExercise
+from .parsing import NAME_KEYS, SERIES_KEYS, REPS_KEYS, DAY_KEYS
+from .text import fold_text
+
+MUSCLE_KEYS = ("muscle", "muscle_group", "musculo", "músculo", "grupo_muscular", "muscle_to_trainer", "target")
+
+
+def _first(item: Dict[str, Any], keys) -> Any:
+    for key in keys:
+        value = item.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _clip(value: Any, length: int) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        value = ", ".join(str(part) for part in value)
+    return str(value).strip()[:length]
+
+
+def exercise_fields(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Campos indexables de un ejercicio del JSON, o None si no tiene nombre
+    """
+    if not isinstance(item, dict):
+        return None
+    name = _clip(_first(item, NAME_KEYS), 255)
+    if not name:
+        return None
+    series = _first(item, SERIES_KEYS)
+    return {
+        "name": name,
+        "name_normalized": fold_text(name)[:255],
+        "muscle": fold_text(_clip(_first(item, MUSCLE_KEYS), 255))[:255],
+        "series": series if isinstance(series, int) and not isinstance(series, bool) else None,
+        "reps": _clip(_first(item, REPS_KEYS), 50),
+        "day": _clip(_first(item, DAY_KEYS), 100),
+    }
+
+
+def build_exercise_rows(routine: AIGeneratedRoutine) -> List[RoutineExercise]:
+    """
+    Construye (sin guardar) las filas indexadas de los ejercicios de una rutina
+    """
+    rows = []
+    exercises = routine.exercises if isinstance(routine.exercises, list) else []
+    for position, item in enumerate(exercises):
+        fields = exercise_fields(item)
+        if fields is None:
+            continue
+        rows.append(RoutineExercise(
+            routine_id=routine.id,
+            user_id=routine.user_id,
+            position=position,
+            **fields
+        ))
+    return rows
+
+
+def sync_routine_exercises(routines: Iterable[AIGeneratedRoutine]) -> int:
+    """
+    Reemplaza las filas indexadas de las rutinas dadas. Retorna cuántas filas se crearon
+    """
+    routines = list(routines)
+    if not routines:
+        return 0
+    rows = []
+    for routine in routines:
+        rows.extend(build_exercise_rows(routine))
+
+    with transaction.atomic():
+        RoutineExercise.objects.filter(routine_id__in=[routine.id for routine in routines]).delete()
+        RoutineExercise.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
@@ -0,0 +1,83 @@
+import os
+from typing import AsyncIterator, Iterator, List
+
+from django.db.models import Q
+
+from modifit_platform.compression import GzipCodec
+from .serializers import AIGeneratedRoutineSerializer
+from .renderers import format_ndjson
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+EXPORT_FIELDS = AIGeneratedRoutineSerializer.Meta.fields
+
+
+def _export_queryset(routines):
+    return routines.order_by('-generated_at', '-id').values(*EXPORT_FIELDS)
+
+
+def _after(queryset, last):
+    if last is None:
+        return queryset
+    return queryset.filter(
+        Q(generated_at__lt=last['generated_at']) | Q(generated_at=last['generated_at'], id__lt=last['id'])
+    )
+
+
+def iter_routine_batches(routines, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[dict]]:
+    """
+    Recorre las rutinas por keyset (generated_at, id) en lotes de batch_size.
+    Cada lote es una consulta corta: no se mantiene un cursor abierto durante
+    toda la descarga y MySQL (que no hace streaming de resultados con
+    .iterator()) no carga la tabla entera en memoria
+    """
+    queryset = _export_queryset(routines)
+    last = None
+    while True:
+        rows = list(_after(queryset, last)[:batch_size])
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        last = rows[-1]
+
+
+async def aiter_routine_batches(routines, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[dict]]:
+    queryset = _export_queryset(routines)
+    last = None
+    while True:
+        rows = [row async for row in _after(queryset, last)[:batch_size]]
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        last = rows[-1]
+
+
+def ndjson_lines(routines, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Una línea NDJSON por rutina; se entrega un bloque por lote
+    """
+    for rows in iter_routine_batches(routines, batch_size):
+        yield b''.join(format_ndjson(row) for row in rows)
+
+
+async def andjson_lines(routines, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    async for rows in aiter_routine_batches(routines, batch_size):
+        yield b''.join(format_ndjson(row) for row in rows)
+
+
+def gzip_lines(lines: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Comprime el export como archivo .ndjson.gz (para descargas sin Accept-Encoding)
+    """
+    stream = GzipCodec(level).stream()
+    for chunk in lines:
+        yield stream.chunk(chunk)
+    yield stream.finish()
+
+
+async def agzip_lines(lines: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    stream = GzipCodec(level).stream()
+    async for chunk in lines:
+        yield stream.chunk(chunk)
+    yield stream.finish()
@@ -0,0 +1,505 @@
+"""
+Generador local de rutinas y modo deadline
+
+Cuando el modelo de IA está lento o caído se arma una rutina por reglas a
+partir del catálogo de ejercicios (modelo Exercise, ver
+`manage.py seed_exercise_catalog`): se detectan los músculos, el objetivo y
+los días del prompt y se eligen ejercicios del catálogo. Responde en
+milisegundos y sin red.
+
+En modo deadline la llamada al modelo corre en segundo plano y se espera a
+lo sumo deadline_ms: si no llega a tiempo (o falla) se guarda la rutina
+local marcada con fallback=True. Con replace_fallback la respuesta del
+modelo, cuando llega, reemplaza los ejercicios de esa rutina.
+
+Las llamadas corren en AI_DEADLINE_WORKERS hilos. Si el modelo se cuelga esos
+hilos quedan ocupados y lo nuevo espera en la cola sin llegar a llamarlo: a
+lo sumo AI_DEADLINE_QUEUE llamadas esperan, el resto recibe la rutina local
+enseguida. fallback_stats cuenta aparte las que no llegaron a arrancar
+(not_started) de las que el modelo no respondió a tiempo (deadline)
+"""
+import asyncio
+import contextvars
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+
+from .models import AIGeneratedRoutine, Exercise
+from .prompting import estimate_days, estimate_exercises
+from .text import fold_text, tokenize
+
+AI_DEADLINE_MS = int(os.getenv("AI_DEADLINE_MS", "0"))
+AI_DEADLINE_WORKERS = int(os.getenv("AI_DEADLINE_WORKERS", "8"))
+AI_DEADLINE_QUEUE = int(os.getenv("AI_DEADLINE_QUEUE", str(AI_DEADLINE_WORKERS)))
+CATALOG_TTL = 300
+
+# (nombre, músculo, series, repeticiones, descripción)
+CATALOG = [
+    ("Sentadilla con barra", "cuadriceps", 4, 8, "Baja con la espalda recta hasta que los muslos queden paralelos al suelo."),
+    ("Prensa de piernas", "cuadriceps", 4, 10, "Empuja la plataforma sin bloquear las rodillas."),
+    ("Zancadas con mancuernas", "cuadriceps", 3, 12, "Da un paso largo y baja hasta que la rodilla trasera casi toque el suelo."),
+    ("Sentadilla búlgara", "cuadriceps", 3, 10, "Con el pie trasero apoyado en un banco, baja controlando la rodilla delantera."),
+    ("Extensión de cuádriceps", "cuadriceps", 3, 12, "Extiende las piernas en la máquina y baja despacio."),
+    ("Peso muerto rumano", "isquiotibiales", 4, 8, "Baja la barra pegada a las piernas con las rodillas apenas flexionadas."),
+    ("Curl femoral tumbado", "isquiotibiales", 3, 12, "Lleva los talones hacia los glúteos sin despegar la cadera."),
+    ("Buenos días con barra", "isquiotibiales", 3, 10, "Inclina el torso desde la cadera con la espalda neutra."),
+    ("Hip thrust con barra", "gluteos", 4, 10, "Empuja la cadera hacia arriba y aprieta los glúteos arriba."),
+    ("Patada de glúteo en polea", "gluteos", 3, 12, "Lleva la pierna hacia atrás sin arquear la zona lumbar."),
+    ("Puente de glúteos", "gluteos", 3, 15, "Eleva la cadera desde el suelo y sostén un segundo arriba."),
+    ("Elevación de talones de pie", "gemelos", 4, 15, "Sube en puntas de pie y baja hasta estirar el gemelo."),
+    ("Elevación de talones sentado", "gemelos", 3, 15, "Sube los talones con la carga sobre las rodillas."),
+    ("Press de banca", "pecho", 4, 8, "Baja la barra al pecho y empuja con los omóplatos retraídos."),
+    ("Press inclinado con mancuernas", "pecho", 3, 10, "En banco inclinado, empuja las mancuernas hasta juntarlas arriba."),
+    ("Aperturas con mancuernas", "pecho", 3, 12, "Abre los brazos con los codos semiflexionados hasta sentir el estiramiento."),
+    ("Flexiones de brazos", "pecho", 3, 15, "Mantén el cuerpo alineado y baja el pecho cerca del suelo."),
+    ("Fondos en paralelas", "pecho", 3, 10, "Inclina el torso hacia adelante y baja hasta 90 grados de codo."),
+    ("Dominadas", "espalda", 4, 8, "Sube hasta pasar el mentón por encima de la barra."),
+    ("Remo con barra", "espalda", 4, 10, "Con el torso inclinado, lleva la barra hacia el ombligo."),
+    ("Jalón al pecho", "espalda", 3, 12, "Tira de la barra hacia la parte alta del pecho."),
+    ("Remo con mancuerna a una mano", "espalda", 3, 10, "Apoya una mano en el banco y lleva la mancuerna hacia la cadera."),
+    ("Remo en polea baja", "espalda", 3, 12, "Tira del agarre hacia el abdomen sin balancear el torso."),
+    ("Press militar con barra", "hombros", 4, 8, "Empuja la barra por encima de la cabeza sin arquear la espalda."),
+    ("Elevaciones laterales", "hombros", 3, 15, "Sube las mancuernas hasta la altura de los hombros."),
+    ("Press Arnold", "hombros", 3, 10, "Rota las muñecas mientras empujas las mancuernas hacia arriba."),
+    ("Pájaros con mancuernas", "hombros", 3, 12, "Inclinado hacia adelante, abre los brazos para trabajar el deltoide posterior."),
+    ("Curl de bíceps con barra", "biceps", 3, 10, "Flexiona los codos sin mover los hombros."),
+    ("Curl martillo", "biceps", 3, 12, "Con agarre neutro, sube las mancuernas alternando."),
+    ("Curl concentrado", "biceps", 3, 12, "Apoya el codo en el muslo y sube la mancuerna despacio."),
+    ("Press francés", "triceps", 3, 10, "Baja la barra hacia la frente moviendo solo los codos."),
+    ("Extensión de tríceps en polea", "triceps", 3, 12, "Extiende los codos hacia abajo con los brazos pegados al cuerpo."),
+    ("Fondos entre bancos", "triceps", 3, 12, "Baja el cuerpo flexionando los codos detrás de la espalda."),
+    ("Plancha abdominal", "abdomen", 3, 45, "Sostén la posición con el cuerpo recto (segundos)."),
+    ("Crunch abdominal", "abdomen", 3, 20, "Eleva los hombros del suelo contrayendo el abdomen."),
+    ("Elevación de piernas colgado", "abdomen", 3, 12, "Colgado de la barra, sube las piernas sin balancearte."),
+    ("Rueda abdominal", "abdomen", 3, 10, "Rueda hacia adelante con el abdomen firme y vuelve despacio."),
+    ("Burpees", "cardio", 4, 12, "Baja, extiende las piernas, vuelve y salta."),
+    ("Saltos a la comba", "cardio", 4, 60, "Salta de forma continua a ritmo constante (segundos)."),
+    ("Mountain climbers", "cardio", 3, 30, "En posición de plancha, lleva las rodillas al pecho alternando (segundos)."),
+    ("Sprints en cinta", "cardio", 6, 30, "Corre a máxima intensidad y descansa el doble (segundos)."),
+]
+
+LOWER_BODY = ["cuadriceps", "isquiotibiales", "gluteos", "gemelos"]
+UPPER_BODY = ["pecho", "espalda", "hombros"]
+ALL_MUSCLES = LOWER_BODY + UPPER_BODY + ["biceps", "triceps", "abdomen"]
+# Palabra del prompt (sin acentos, en singular; ver _matches) -> músculos del catálogo
+MUSCLE_KEYWORDS = {
+    "pierna": LOWER_BODY, "leg": LOWER_BODY, "tren inferior": LOWER_BODY,
+    "cuadricep": ["cuadriceps"], "quad": ["cuadriceps"],
+    "isquio": ["isquiotibiales"], "femoral": ["isquiotibiales"], "hamstring": ["isquiotibiales"],
+    "gluteo": ["gluteos"], "glute": ["gluteos"],
+    "gemelo": ["gemelos"], "pantorrilla": ["gemelos"], "calf": ["gemelos"],
+    "pecho": ["pecho"], "pectoral": ["pecho"], "chest": ["pecho"],
+    "espalda": ["espalda"], "dorsal": ["espalda"], "back": ["espalda"],
+    "hombro": ["hombros"], "deltoide": ["hombros"], "shoulder": ["hombros"],
+    "bicep": ["biceps"], "tricep": ["triceps"], "brazo": ["biceps", "triceps"], "arm": ["biceps", "triceps"],
+    "abdomen": ["abdomen"], "abdominal": ["abdomen"], "abs": ["abdomen"], "core": ["abdomen"],
+    "torso": UPPER_BODY, "tren superior": UPPER_BODY,
+    "cardio": ["cardio"], "quemar": ["cardio"], "grasa": ["cardio"],
+    "full body": ALL_MUSCLES, "cuerpo completo": ALL_MUSCLES,
+}
+# División por días cuando el prompt no nombra músculos
+SPLIT = [
+    ["pecho", "hombros", "triceps"],
+    ["espalda", "biceps"],
+    LOWER_BODY,
+    UPPER_BODY,
+    ["gluteos", "isquiotibiales", "abdomen"],
+]
+# Objetivo -> (series, repeticiones); sin objetivo se usan las del catálogo
+GOALS = [
+    (("fuerza", "strength", "potencia"), 5, "5"),
+    (("hipertrofia", "masa", "volumen", "muscul", "muscle"), 4, "8-12"),
+    (("resistencia", "definicion", "tonificar", "quemar", "grasa", "adelgazar"), 3, "15-20"),
+]
+TIMED_MUSCLES = {"cardio"}
+MUSCLE_LABELS = {
+    "cuadriceps": "Cuádriceps", "isquiotibiales": "Isquiotibiales", "gluteos": "Glúteos",
+    "gemelos": "Gemelos", "pecho": "Pecho", "espalda": "Espalda", "hombros": "Hombros",
+    "biceps": "Bíceps", "triceps": "Tríceps", "abdomen": "Abdomen", "cardio": "Cardio",
+}
+
+
+def _matches(word: str, keyword: str) -> bool:
+    # Las palabras cortas ("arm", "abs") solo exactas: "arm" no debe matchear "armar"
+    return word == keyword or (len(keyword) >= 5 and word.startswith(keyword))
+
+
+class FallbackStats:
+    """
+    Rutinas locales servidas y reemplazos por la respuesta del modelo
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {
+            "served": 0, "deadline": 0, "not_started": 0, "error": 0, "replaced": 0, "replace_failed": 0,
+        }
+
+    def record(self, key: str) -> None:
+        with self._lock:
+            self._totals[key] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._totals)
+
+
+fallback_stats = FallbackStats()
+
+_catalog: Optional[List[Dict[str, Any]]] = None
+_catalog_loaded_at = 0.0
+_catalog_lock = threading.Lock()
+
+
+def _builtin_catalog() -> List[Dict[str, Any]]:
+    return [
+        {"name": name, "muscle": muscle, "label": MUSCLE_LABELS[muscle], "series": series, "reps": reps,
+         "description": description}
+        for name, muscle, series, reps, description in CATALOG
+    ]
+
+
+def load_catalog() -> List[Dict[str, Any]]:
+    """
+    Catálogo de la tabla Exercise (cacheado CATALOG_TTL segundos en el
+    proceso). Si la tabla está vacía se usa el catálogo incorporado
+    """
+    global _catalog, _catalog_loaded_at
+    now = time.monotonic()
+    if _catalog is not None and now - _catalog_loaded_at < CATALOG_TTL:
+        return _catalog
+    with _catalog_lock:
+        if _catalog is None or now - _catalog_loaded_at >= CATALOG_TTL:
+            descriptions = {fold_text(name): description for name, _, _, _, description in CATALOG}
+            rows = [
+                {
+                    "name": row["exercise"],
+                    "muscle": fold_text(row["muscle_to_trainer"]),
+                    "label": row["muscle_to_trainer"],
+                    "series": row["count_series"],
+                    "reps": row["count_repeat"],
+                    "description": descriptions.get(fold_text(row["exercise"]), ""),
+                }
+                for row in Exercise.objects.order_by("id").values(
+                    "exercise", "muscle_to_trainer", "count_series", "count_repeat"
+                )
+            ]
+            _catalog = rows or _builtin_catalog()
+            _catalog_loaded_at = now
+    return _catalog
+
+
+def _muscles(prompt: str) -> List[str]:
+    text = " ".join(tokenize(prompt))
+    words = text.split()
+    found: List[str] = []
+    for keyword, muscles in MUSCLE_KEYWORDS.items():
+        matched = keyword in text if " " in keyword else any(_matches(word, keyword) for word in words)
+        if matched:
+            found.extend(muscle for muscle in muscles if muscle not in found)
+    return found
+
+
+def _scheme(prompt: str) -> Optional[Tuple[int, str]]:
+    words = tokenize(prompt)
+    for keywords, series, reps in GOALS:
+        if any(_matches(word, keyword) for word in words for keyword in keywords):
+            return series, reps
+    return None
+
+
+def generate_fallback(prompt: str, size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Arma una rutina por reglas con el mismo formato que una respuesta del
+    modelo. Es determinista: el mismo prompt da la misma rutina
+    """
+    catalog = load_catalog()
+    by_muscle: Dict[str, List[Dict[str, Any]]] = {}
+    for item in catalog:
+        by_muscle.setdefault(item["muscle"], []).append(item)
+
+    days = estimate_days(prompt)
+    total = estimate_exercises(prompt, size)
+    per_day = max(1, math.ceil(total / days))
+    requested = [muscle for muscle in _muscles(prompt) if muscle in by_muscle]
+    scheme = _scheme(prompt)
+
+    exercises = []
+    for day in range(days):
+        targets = requested or [muscle for muscle in SPLIT[day % len(SPLIT)] if muscle in by_muscle]
+        targets = targets or list(by_muscle)
+        chosen: List[Dict[str, Any]] = []
+        # Round-robin entre los músculos del día, rotando el arranque por día
+        for round_index in range(per_day * len(targets)):
+            if len(chosen) >= per_day or len(exercises) + len(chosen) >= total:
+                break
+            muscle = targets[round_index % len(targets)]
+            options = by_muscle[muscle]
+            item = options[(day + round_index // len(targets)) % len(options)]
+            if item not in chosen:
+                chosen.append(item)
+
+        for item in chosen:
+            series, reps = item["series"], item["reps"]
+            if scheme is not None and item["muscle"] not in TIMED_MUSCLES:
+                series, reps = scheme
+            exercise = {
+                "name": item["name"],
+                "series": series,
+                "reps": reps,
+                "muscle": item["label"],
+                "description": item["description"],
+            }
+            if days > 1:
+                exercise["day"] = f"Día {day + 1}"
+            exercises.append(exercise)
+
+    return {
+        "status": "success",
+        "exercises": exercises,
+        "raw_response": "",
+        "cached": False,
+        "fallback": True,
+    }
+
+
+def deadline_seconds(deadline_ms: Optional[int]) -> Optional[float]:
+    """
+    deadline del request o AI_DEADLINE_MS; None si el modo deadline está apagado
+    """
+    deadline_ms = deadline_ms or AI_DEADLINE_MS
+    return deadline_ms / 1000.0 if deadline_ms > 0 else None
+
+
+def _error_result(error: Exception) -> Dict[str, Any]:
+    return {
+        "status": "error",
+        "message": f"Error al generar ejercicios: {str(error)}",
+        "error_details": str(error),
+    }
+
+
+class DeadlineExecutor:
+    """
+    Hilos de las llamadas al modelo en modo deadline con la cola acotada:
+    submit() devuelve None en vez de encolar detrás de max_queue llamadas
+    que esperan un hilo libre
+    """
+
+    def __init__(self, workers: int = AI_DEADLINE_WORKERS, max_queue: int = AI_DEADLINE_QUEUE):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ai-deadline")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._rejected = 0
+
+    def submit(self, fn, *args) -> Optional[Future]:
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self._rejected += 1
+                return None
+            self._pending += 1
+
+        def run():
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        future = self._executor.submit(run)
+        # También corre si se cancela antes de arrancar
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "rejected": self._rejected,
+            }
+
+
+deadline_executor = DeadlineExecutor()
+
+
+def race_model(service, prompt: str, use_cache: bool, size: Optional[int],
+               deadline: float) -> Tuple[Optional[Dict[str, Any]], Optional[Future]]:
+    """
+    Llama al modelo en un hilo y espera a lo sumo `deadline` segundos.
+    Retorna (resultado, None) si llegó a tiempo, (None, future) si no y
+    (None, None) si la cola de deadline_executor estaba llena y no se llamó
+    """
+    def call():
+        try:
+            return service.generate_exercises(prompt, use_cache=use_cache, size=size)
+        except Exception as e:
+            return _error_result(e)
+        finally:
+            connection.close()
+
+    future = deadline_executor.submit(contextvars.copy_context().run, call)
+    if future is None:
+        return None, None
+    try:
+        return future.result(timeout=deadline), None
+    except FutureTimeoutError:
+        return None, future
+
+
+def _replace_exercises(routine_id: int, ai_result: Dict[str, Any]) -> bool:
+    if ai_result.get("status") != "success":
+        fallback_stats.record("replace_failed")
+        return False
+    routine = AIGeneratedRoutine.objects.filter(id=routine_id, fallback=True).first()
+    if routine is None:
+        return False
+    routine.exercises = ai_result["exercises"]
+    routine.fallback = False
+    routine.save(update_fields=["exercises", "fallback", "updated_at"])
+    fallback_stats.record("replaced")
+    return True
+
+
+def fallback_reason(ai_result: Optional[Dict[str, Any]], pending) -> str:
+    """
+    Por qué se sirve la rutina local, a partir de lo que devolvió race_model
+    o arace_model: "deadline" si el modelo no respondió a tiempo,
+    "not_started" si la llamada ni siquiera arrancó (cola llena o esperando
+    un hilo todo el deadline) y "error" si el modelo respondió con error
+    """
+    if pending is None:
+        return "error" if ai_result is not None else "not_started"
+    if isinstance(pending, Future) and not (pending.running() or pending.done()):
+        return "not_started"
+    return "deadline"
+
+
+def finish_in_background(future: Future, routine_id: Optional[int]) -> Optional[str]:
+    """
+    Con routine_id deja terminar la llamada al modelo (aunque siga en la
+    cola) y reemplaza los ejercicios de la rutina local. Sin routine_id la
+    llamada se cancela si todavía no arrancó, para no ocupar un hilo; si ya
+    arrancó termina y su respuesta queda en la caché de generaciones.
+
+    Retorna el estado del reemplazo para la respuesta (ver fallback_payload):
+    None sin routine_id, "replaced" o "failed" si la llamada ya había
+    terminado (se reemplaza acá mismo) y "pending" si no
+    """
+    if routine_id is None:
+        future.cancel()
+        return None
+    if future.done():
+        return _replace_now(routine_id, future.result())
+
+    caller = threading.get_ident()
+
+    def replace(done: Future) -> None:
+        try:
+            if not done.cancelled():
+                _replace_exercises(routine_id, done.result())
+        except Exception:
+            fallback_stats.record("replace_failed")
+        finally:
+            # Si terminó justo antes de registrar el callback, esto corre en el
+            # hilo del request: su conexión no es nuestra para cerrarla
+            if threading.get_ident() != caller:
+                connection.close()
+
+    future.add_done_callback(replace)
+    return "pending"
+
+
+def _replace_now(routine_id: int, ai_result: Dict[str, Any]) -> str:
+    try:
+        return "replaced" if _replace_exercises(routine_id, ai_result) else "failed"
+    except Exception:
+        fallback_stats.record("replace_failed")
+        return "failed"
+
+
+_background_tasks = set()
+
+
+async def arace_model(service, prompt: str, use_cache: bool, size: Optional[int],
+                      deadline: float) -> Tuple[Optional[Dict[str, Any]], Optional[asyncio.Task]]:
+    """
+    Versión async de race_model: la llamada es una tarea del event loop que
+    sigue corriendo si se vence el deadline
+    """
+    async def call():
+        try:
+            return await service.agenerate_exercises(prompt, use_cache=use_cache, size=size)
+        except Exception as e:
+            return _error_result(e)
+
+    task = asyncio.ensure_future(call())
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), deadline), None
+    except asyncio.TimeoutError:
+        return None, task
+
+
+async def afinish_in_background(task: asyncio.Task, routine_id: Optional[int]) -> Optional[str]:
+    """
+    Versión async de finish_in_background (la tarea no se cancela: no ocupa
+    un hilo mientras espera al modelo)
+    """
+    if routine_id is not None and task.done():
+        return await sync_to_async(_replace_now)(routine_id, task.result())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    if routine_id is None:
+        return None
+
+    async def replace():
+        try:
+            await sync_to_async(_replace_exercises)(routine_id, await task)
+        except Exception:
+            fallback_stats.record("replace_failed")
+
+    replacement = asyncio.ensure_future(replace())
+    _background_tasks.add(replacement)
+    replacement.add_done_callback(_background_tasks.discard)
+    return "pending"
+
+
+def fallback_payload(routine_data: Dict[str, Any], reason: str, replacement: Optional[str]) -> Dict[str, Any]:
+    """
+    Respuesta de generate-routine cuando se sirvió la rutina local.
+    replacement: None, "pending", "replaced" o "failed" (finish_in_background)
+    """
+    if reason == "deadline":
+        message = "El modelo de IA no respondió a tiempo: rutina generada localmente"
+    elif reason == "not_started":
+        message = "El modelo de IA está saturado: rutina generada localmente"
+    else:
+        message = "El modelo de IA no está disponible: rutina generada localmente"
+    return {
+        "status": "success",
+        "message": message,
+        "routine": routine_data,
+        "routines": [routine_data],
+        "raw_response": "",
+        "cached": False,
+        "fallback": True,
+        "fallback_reason": reason,
+        "replacement": replacement,
+    }
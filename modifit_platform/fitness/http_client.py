@@ -0,0 +1,226 @@
+import time
+import threading
+from typing import Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ModelUnavailableError(Exception):
+    """
+    El backend del modelo no puede atender la llamada ahora; no se intentó
+    (las vistas responden 503)
+    """
+
+
+class CircuitOpenError(ModelUnavailableError):
+    """
+    Se lanza cuando el circuit breaker está abierto y no se intenta la llamada
+    """
+
+
+class PoolTimeoutError(ModelUnavailableError):
+    """
+    No se liberó una conexión del pool dentro de pool_timeout segundos
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker simple: tras `failure_threshold` errores seguidos se abre
+    y falla rápido durante `reset_timeout` segundos. Después deja pasar una
+    llamada de prueba (half-open) y se cierra si sale bien
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def before_call(self) -> None:
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN:
+                raise CircuitOpenError("Servicio de IA no disponible temporalmente")
+            if state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    raise CircuitOpenError("Servicio de IA no disponible temporalmente")
+                self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """
+        La llamada no llegó a hacerse: no cuenta ni como éxito ni como fallo
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+            }
+
+
+class ModelHTTPClient:
+    """
+    Cliente HTTP compartido por proceso para el backend del modelo de IA:
+    reutiliza conexiones (keep-alive), limita el tamaño del pool y aplica
+    timeouts de conexión y lectura a todas las llamadas.
+
+    Las llamadas simultáneas se limitan a pool_size con un semáforo: esperar
+    una conexión libre dura a lo sumo pool_timeout segundos y después se lanza
+    PoolTimeoutError (urllib3 con pool_block=True esperaría sin límite)
+    """
+
+    def __init__(self, connect_timeout: float = 5.0, read_timeout: float = 120.0,
+                 pool_size: int = 10, breaker: Optional[CircuitBreaker] = None,
+                 pool_timeout: float = 10.0):
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_timeout = pool_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            pool_block=False,
+            max_retries=0
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """
+        POST con timeout por defecto y circuit breaker. Los errores de red y
+        las respuestas 5xx cuentan como fallo del upstream; quedarse sin
+        conexiones libres no (es carga propia, no del backend).
+        Con stream=True la conexión se libera al cerrar la respuesta
+        """
+        self.breaker.before_call()
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            self.breaker.release_probe()
+            raise PoolTimeoutError("Servicio de IA saturado, intenta de nuevo en unos segundos")
+        release = _once(self._slots.release)
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            response = self.session.post(url, **kwargs)
+        except requests.RequestException:
+            release()
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            release()
+            raise
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+        if kwargs.get("stream"):
+            close = response.close
+
+            def close_and_release():
+                try:
+                    close()
+                finally:
+                    release()
+
+            response.close = close_and_release
+        else:
+            release()
+        return response
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncModelHTTPClient:
+    """
+    Versión no bloqueante de ModelHTTPClient sobre httpx.AsyncClient, para
+    las vistas async bajo ASGI. Comparte el circuit breaker con el cliente
+    síncrono del mismo backend (ver model_pool.py)
+    """
+
+    def __init__(self, connect_timeout: float = 5.0, read_timeout: float = 120.0,
+                 pool_size: int = 100, breaker: Optional[CircuitBreaker] = None,
+                 pool_timeout: float = 10.0):
+        self.breaker = breaker or CircuitBreaker()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout, pool=pool_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        self.breaker.before_call()
+        try:
+            response = await self.client.post(url, **kwargs)
+        except httpx.PoolTimeout:
+            # No llegó a salir la solicitud: no es un fallo del backend.
+            # Se libera la prueba del half-open si era esta llamada
+            self.breaker.release_probe()
+            raise PoolTimeoutError("Servicio de IA saturado, intenta de nuevo en unos segundos")
+        except httpx.HTTPError:
+            self.breaker.record_failure()
+            raise
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+def _once(fn):
+    """
+    Envuelve fn para que solo se ejecute la primera vez
+    """
+    lock = threading.Lock()
+    called = False
+
+    def wrapper():
+        nonlocal called
+        with lock:
+            if called:
+                return
+            called = True
+        fn()
+    return wrapper
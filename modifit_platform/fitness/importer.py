@@ -0,0 +1,183 @@
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from django.db import DatabaseError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from authe.models import User
+from .models import AIGeneratedRoutine
+from .batch import save_batch
+from .parsing import has_name, normalize_exercise
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+NAME_MAX_LENGTH = AIGeneratedRoutine._meta.get_field('name').max_length
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def validate_record(data: Any, require_user: bool = False) -> Dict[str, Any]:
+    """
+    Chequeo liviano de una línea del import. Retorna los campos listos para
+    crear la rutina o lanza InvalidRecord con el motivo
+    """
+    if not isinstance(data, dict):
+        raise InvalidRecord("Se esperaba un objeto JSON")
+
+    name = data.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise InvalidRecord("name es obligatorio")
+    if len(name) > NAME_MAX_LENGTH:
+        raise InvalidRecord(f"name supera {NAME_MAX_LENGTH} caracteres")
+
+    prompt = data.get('prompt') or ""
+    if not isinstance(prompt, str):
+        raise InvalidRecord("prompt debe ser texto")
+
+    exercises = data.get('exercises')
+    if not isinstance(exercises, list):
+        raise InvalidRecord("exercises debe ser una lista")
+    normalized = []
+    for position, item in enumerate(exercises):
+        if isinstance(item, str) and item.strip():
+            item = {"name": item}
+        if not has_name(item):
+            raise InvalidRecord(f"exercises[{position}] no tiene nombre")
+        normalized.append(normalize_exercise(item))
+
+    generated_at = data.get('generated_at')
+    if generated_at is not None:
+        try:
+            moment = parse_datetime(generated_at) if isinstance(generated_at, str) else None
+        except ValueError:
+            moment = None
+        if moment is None:
+            raise InvalidRecord("generated_at no es una fecha ISO 8601 válida")
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        generated_at = moment
+
+    user_id = data.get('user')
+    if require_user and (not isinstance(user_id, int) or isinstance(user_id, bool)):
+        raise InvalidRecord("user (id) es obligatorio")
+
+    return {
+        'user_id': user_id,
+        'name': name.strip(),
+        'prompt': prompt,
+        'exercises': normalized,
+        'generated_at': generated_at,
+    }
+
+
+class ImportReport:
+    """
+    Resultado de un import: líneas leídas, rutinas creadas y líneas rechazadas
+    con su motivo. Los errores se acotan a max_errors para no crecer sin límite
+    """
+
+    def __init__(self, max_errors: int = IMPORT_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.lines = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def reject(self, line: int, message: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'message': message})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'lines': self.lines,
+            'imported': self.imported,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'errors_truncated': self.rejected > len(self.errors),
+        }
+
+
+def import_routines(lines: Iterable[Union[bytes, str]], user: Optional[User] = None,
+                    batch_size: int = IMPORT_BATCH_SIZE,
+                    max_errors: int = IMPORT_MAX_ERRORS) -> Dict[str, Any]:
+    """
+    Importa rutinas desde un stream NDJSON (una rutina por línea).
+
+    Las líneas válidas se insertan con bulk_create en lotes de batch_size,
+    cada lote en su propia transacción: un lote que falla en la base se
+    reporta línea por línea y el import sigue con el siguiente.
+    Si se pasa `user` todas las rutinas son suyas; si no, cada línea indica
+    su `user` (id)
+    """
+    report = ImportReport(max_errors)
+    pending: List[Tuple[int, Dict[str, Any]]] = []
+
+    for number, raw in enumerate(lines, start=1):
+        report.lines = number
+        if isinstance(raw, bytes):
+            try:
+                raw = raw.decode('utf-8')
+            except UnicodeDecodeError:
+                report.reject(number, "La línea no es UTF-8 válido")
+                continue
+        if not raw.strip():
+            continue
+        try:
+            record = validate_record(json.loads(raw), require_user=user is None)
+        except json.JSONDecodeError as e:
+            report.reject(number, f"JSON inválido: {e.msg}")
+            continue
+        except InvalidRecord as e:
+            report.reject(number, str(e))
+            continue
+        if user is not None:
+            record['user_id'] = user.id
+        pending.append((number, record))
+        if len(pending) >= batch_size:
+            _flush(pending, report)
+            pending = []
+
+    if pending:
+        _flush(pending, report)
+    return report.as_dict()
+
+
+def _flush(pending: List[Tuple[int, Dict[str, Any]]], report: ImportReport) -> None:
+    by_user = defaultdict(list)
+    for number, record in pending:
+        by_user[record['user_id']].append((number, record))
+
+    existing = set(User.objects.filter(id__in=list(by_user)).values_list('id', flat=True))
+    for user_id, records in by_user.items():
+        if user_id not in existing:
+            for number, _ in records:
+                report.reject(number, f"El usuario {user_id} no existe")
+            continue
+        try:
+            _save_records(user_id, records)
+        except DatabaseError as e:
+            for number, _ in records:
+                report.reject(number, f"Error al guardar el lote: {str(e)}")
+            continue
+        report.imported += len(records)
+
+
+def _save_records(user_id: int, records: List[Tuple[int, Dict[str, Any]]]) -> None:
+    routines = []
+    moments: List[Optional[datetime]] = []
+    for _, record in records:
+        routines.append(AIGeneratedRoutine(
+            user_id=user_id,
+            name=record['name'],
+            prompt=record['prompt'],
+            exercises=record['exercises'],
+        ))
+        moments.append(record['generated_at'])
+    save_batch(user_id, routines, generated_at=moments)
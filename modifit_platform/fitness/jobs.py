@@ -0,0 +1,199 @@
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from typing import Optional
+
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AIGeneratedRoutine, RoutineGenerationJob
+from .ai_service import AIFitnessService
+
+
+class GenerationJobPool:
+    """
+    Pool local de workers que procesa los trabajos de generación en cola.
+    No necesita broker externo: los workers toman los trabajos de la tabla
+    RoutineGenerationJob y se despiertan cuando se encola uno nuevo
+    """
+
+    def __init__(self, workers: int = 2, poll_interval: float = 5.0, stale_after: int = 600,
+                 max_attempts: int = 3):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._pid = None
+        self._last_recovery = 0.0
+        self._wakeup = threading.Condition()
+        self._pending = 0
+        self._threads = []
+        self._started = False
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Arranca los hilos (una sola vez por proceso) y recupera los trabajos
+        que quedaron a medias por un reinicio. Lo llaman wsgi.py/asgi.py al
+        cargar la aplicación. Si el proceso se forkeó después de arrancar
+        (gunicorn --preload) los hilos no pasan al hijo y se arrancan de nuevo
+        """
+        with self._lock:
+            if self.workers <= 0 or (self._started and self._pid == os.getpid()):
+                return
+            self._started = True
+            self._stopping = False
+            self._pid = os.getpid()
+            self._threads = []
+            self.worker_id = f"{socket.gethostname()}:{self._pid}"
+            self.recover_stale_jobs()
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run,
+                    name=f"generation-job-worker-{index}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self) -> None:
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=self.poll_interval)
+        self._threads = []
+        self._started = False
+
+    def notify(self) -> None:
+        """
+        Avisa a los workers de que hay un trabajo nuevo en la cola
+        """
+        self.start()
+        with self._wakeup:
+            self._pending += 1
+            self._wakeup.notify()
+
+    def recover_stale_jobs(self) -> int:
+        """
+        Devuelve a la cola los trabajos que siguen en 'running' después de
+        stale_after segundos (el worker que los tenía murió). Los que ya
+        usaron max_attempts intentos se marcan fallidos: un trabajo que tira
+        abajo a su worker no se reintenta para siempre.
+        Retorna cuántos se reencolaron
+        """
+        now = timezone.now()
+        self._last_recovery = time.monotonic()
+        stale = RoutineGenerationJob.objects.filter(
+            status=RoutineGenerationJob.STATUS_RUNNING,
+            started_at__lt=now - timedelta(seconds=self.stale_after)
+        )
+        stale.filter(attempts__gte=self.max_attempts).update(
+            status=RoutineGenerationJob.STATUS_FAILED,
+            error=f"El trabajo se interrumpió {self.max_attempts} veces sin terminar",
+            finished_at=now,
+            worker=""
+        )
+        return stale.filter(attempts__lt=self.max_attempts).update(
+            status=RoutineGenerationJob.STATUS_QUEUED, worker=""
+        )
+
+    def recover_if_due(self) -> int:
+        """
+        recover_stale_jobs a lo sumo una vez cada stale_after segundos
+        """
+        if time.monotonic() - self._last_recovery < self.stale_after:
+            return 0
+        return self.recover_stale_jobs()
+
+    def claim_next(self) -> Optional[RoutineGenerationJob]:
+        """
+        Toma el trabajo en cola más antiguo. El update condicional garantiza
+        que dos workers (aunque sean de procesos distintos) no tomen el mismo
+        """
+        while True:
+            job_id = RoutineGenerationJob.objects.filter(
+                status=RoutineGenerationJob.STATUS_QUEUED
+            ).order_by('created_at', 'id').values_list('id', flat=True).first()
+            if job_id is None:
+                return None
+
+            with transaction.atomic():
+                claimed = RoutineGenerationJob.objects.filter(
+                    id=job_id,
+                    status=RoutineGenerationJob.STATUS_QUEUED
+                ).update(
+                    status=RoutineGenerationJob.STATUS_RUNNING,
+                    started_at=timezone.now(),
+                    worker=self.worker_id,
+                    attempts=F('attempts') + 1
+                )
+            if claimed:
+                return RoutineGenerationJob.objects.select_related('user').get(id=job_id)
+
+    def run_next(self) -> bool:
+        """
+        Procesa un trabajo de la cola. Retorna False si no había ninguno
+        """
+        job = self.claim_next()
+        if job is None:
+            return False
+        run_job(job)
+        return True
+
+    def _run(self) -> None:
+        while not self._stopping:
+            try:
+                close_old_connections()
+                self.recover_if_due()
+                while not self._stopping and self.run_next():
+                    pass
+            finally:
+                close_old_connections()
+
+            with self._wakeup:
+                if self._pending == 0 and not self._stopping:
+                    self._wakeup.wait(self.poll_interval)
+                self._pending = max(self._pending - 1, 0)
+
+
+def run_job(job: RoutineGenerationJob) -> RoutineGenerationJob:
+    """
+    Ejecuta un trabajo ya reclamado: llama al modelo y guarda la rutina
+    """
+    try:
+        ai_service = AIFitnessService()
+        ai_result = ai_service.generate_exercises(job.prompt, use_cache=job.use_cache, size=job.size)
+
+        if ai_result['status'] != 'success':
+            job.status = RoutineGenerationJob.STATUS_FAILED
+            job.error = ai_result.get('message', 'Error al generar ejercicios')
+        else:
+            job.routine = AIGeneratedRoutine.objects.create(
+                user=job.user,
+                name=job.routine_name,
+                prompt=job.prompt,
+                exercises=ai_result['exercises']
+            )
+            job.status = RoutineGenerationJob.STATUS_DONE
+            job.error = ""
+    except Exception as e:
+        job.status = RoutineGenerationJob.STATUS_FAILED
+        job.error = f"Error al procesar el trabajo: {str(e)}"
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'routine', 'error', 'finished_at'])
+    return job
+
+
+job_pool = GenerationJobPool(
+    workers=int(os.getenv("AI_JOB_WORKERS", "2")),
+    poll_interval=float(os.getenv("AI_JOB_POLL_INTERVAL", "5")),
+    stale_after=int(os.getenv("AI_JOB_STALE_SECONDS", "600")),
+    max_attempts=int(os.getenv("AI_JOB_MAX_ATTEMPTS", "3")),
+)
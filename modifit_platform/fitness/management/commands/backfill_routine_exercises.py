@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from fitness.models import AIGeneratedRoutine
+from fitness.exercise_index import sync_routine_exercises
+
+
+class Command(BaseCommand):
+    help = "Reconstruye la tabla indexada de ejercicios (RoutineExercise) desde AIGeneratedRoutine.exercises"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help="Rutinas por transacción")
+        parser.add_argument('--user', type=int, help="Procesar solo las rutinas de este usuario (id)")
+
+    def handle(self, *args, **options):
+        routines = AIGeneratedRoutine.objects.only('id', 'user_id', 'exercises').order_by('id')
+        if options['user']:
+            routines = routines.filter(user_id=options['user'])
+
+        batch_size = options['batch_size']
+        batch = []
+        total_routines = 0
+        total_rows = 0
+        for routine in routines.iterator(chunk_size=batch_size):
+            batch.append(routine)
+            if len(batch) >= batch_size:
+                total_rows += sync_routine_exercises(batch)
+                total_routines += len(batch)
+                batch = []
+        if batch:
+            total_rows += sync_routine_exercises(batch)
+            total_routines += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total_routines} rutinas procesadas, {total_rows} ejercicios indexados"
+        ))
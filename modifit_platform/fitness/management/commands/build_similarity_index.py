@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from fitness.similarity import SIMILAR_INDEX_DIM, SIMILAR_INDEX_PATH, build_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de rutinas parecidas y lo guarda en disco (los workers lo cargan con mmap)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=SIMILAR_INDEX_PATH, help="Directorio destino (por defecto SIMILAR_INDEX_PATH)")
+        parser.add_argument('--dim', type=int, default=SIMILAR_INDEX_DIM, help="Dimensión de los vectores hasheados")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rutinas leídas por consulta")
+
+    def handle(self, *args, **options):
+        if not options['path']:
+            raise CommandError("Indicá --path o configurá SIMILAR_INDEX_PATH")
+        index = build_index(dim=options['dim'], batch_size=options['batch_size'])
+        index.save(options['path'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(index)} rutinas indexadas en {options['path']} (dim {index.dim})"
+        ))
@@ -0,0 +1,50 @@
+import gzip
+import sys
+import zlib
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authe.models import User
+from fitness.importer import IMPORT_BATCH_SIZE, import_routines
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa rutinas desde un archivo NDJSON (una rutina por línea; .gz se "
+        "descomprime). Sin --user cada línea debe indicar su user (id)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Archivo NDJSON o '-' para leer de stdin")
+        parser.add_argument('--user', help="Asignar todas las rutinas a este usuario (id o username)")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help="Rutinas por transacción")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            value = options['user']
+            lookup = {'id': int(value)} if value.isdigit() else {'username': value}
+            user = User.objects.filter(**lookup).first()
+            if user is None:
+                raise CommandError(f"El usuario {value} no existe")
+
+        path = options['path']
+        try:
+            if path == '-':
+                report = import_routines(sys.stdin.buffer, user=user, batch_size=options['batch_size'])
+            else:
+                opener = gzip.open if path.endswith('.gz') else open
+                with opener(path, 'rb') as lines:
+                    report = import_routines(lines, user=user, batch_size=options['batch_size'])
+        except (OSError, EOFError, zlib.error) as e:
+            raise CommandError(f"No se pudo leer {path}: {str(e)}")
+
+        for error in report['errors']:
+            self.stderr.write(f"línea {error['line']}: {error['message']}")
+        if report['errors_truncated']:
+            self.stderr.write(f"... y {report['rejected'] - len(report['errors'])} errores más")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['imported']} rutinas importadas, {report['rejected']} líneas rechazadas "
+            f"({report['lines']} líneas leídas)"
+        ))
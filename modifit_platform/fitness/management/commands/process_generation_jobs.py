@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from fitness.jobs import GenerationJobPool
+
+
+class Command(BaseCommand):
+    help = "Procesa los trabajos de generación de rutinas en cola (worker dedicado, sin broker)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Vaciar la cola y terminar")
+        parser.add_argument('--poll-interval', type=float, default=5.0, help="Segundos entre consultas a la cola")
+        parser.add_argument('--stale-after', type=int, default=600, help="Segundos tras los que un trabajo 'running' se reencola")
+        parser.add_argument('--max-attempts', type=int, default=3, help="Intentos tras los que un trabajo interrumpido se marca fallido")
+
+    def handle(self, *args, **options):
+        pool = GenerationJobPool(
+            workers=0,
+            poll_interval=options['poll_interval'],
+            stale_after=options['stale_after'],
+            max_attempts=options['max_attempts']
+        )
+        recovered = pool.recover_stale_jobs()
+        if recovered:
+            self.stdout.write(f"{recovered} trabajos reencolados")
+
+        processed = 0
+        while True:
+            recovered = pool.recover_if_due()
+            if recovered:
+                self.stdout.write(f"{recovered} trabajos reencolados")
+            while pool.run_next():
+                processed += 1
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"{processed} trabajos procesados"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from fitness.models import AIGeneratedRoutine, TrainingStat
+from fitness.stats import rebuild_user_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero los acumulados de entrenamiento (TrainingStat) y verifica su consistencia"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Procesar solo este usuario (id)")
+        parser.add_argument('--verify-only', action='store_true', help="Solo informar diferencias, sin reescribir")
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user_ids = [options['user']]
+        else:
+            # También los usuarios con acumulados pero sin rutinas (filas huérfanas)
+            user_ids = sorted(
+                set(AIGeneratedRoutine.objects.values_list('user_id', flat=True).distinct())
+                | set(TrainingStat.objects.values_list('user_id', flat=True).distinct())
+            )
+
+        users = 0
+        inconsistent = 0
+        for user_id in user_ids:
+            result = rebuild_user_stats(user_id, verify_only=options['verify_only'])
+            users += 1
+            if result['mismatches']:
+                inconsistent += 1
+                self.stdout.write(f"Usuario {user_id}: {result['mismatches']} filas distintas")
+
+        action = "verificados" if options['verify_only'] else "recalculados"
+        self.stdout.write(self.style.SUCCESS(
+            f"{users} usuarios {action}, {inconsistent} con diferencias"
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from fitness.models import Exercise
+from fitness.fallback import CATALOG, MUSCLE_LABELS
+
+
+class Command(BaseCommand):
+    help = "Carga el catálogo de ejercicios (modelo Exercise) que usa el generador local de rutinas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--update', action='store_true', help="Actualizar series, repeticiones y músculo de los ejercicios existentes")
+
+    def handle(self, *args, **options):
+        existing = {exercise.exercise: exercise for exercise in Exercise.objects.all()}
+        created = []
+        updated = []
+        for name, muscle, series, reps, _ in CATALOG:
+            exercise = existing.get(name)
+            if exercise is None:
+                created.append(Exercise(
+                    exercise=name,
+                    count_series=series,
+                    count_repeat=reps,
+                    muscle_to_trainer=MUSCLE_LABELS[muscle]
+                ))
+            elif options['update']:
+                exercise.count_series = series
+                exercise.count_repeat = reps
+                exercise.muscle_to_trainer = MUSCLE_LABELS[muscle]
+                updated.append(exercise)
+
+        Exercise.objects.bulk_create(created)
+        if updated:
+            Exercise.objects.bulk_update(updated, ['count_series', 'count_repeat', 'muscle_to_trainer'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(created)} ejercicios creados, {len(updated)} actualizados ({len(CATALOG)} en el catálogo)"
+        ))
@@ -0,0 +1,554 @@
+"""
+Pool de backends del modelo de IA
+
+AI_MODEL_BACKENDS es una lista JSON de despliegues del agente:
+
+    [{"url": "https://a/api/v1/chat/completions", "model": "modifit-agent",
+      "token": "...", "weight": 2, "max_concurrency": 16,
+      "async_max_concurrency": 200, "name": "a"}, ...]
+
+Solo `url` es obligatorio; el resto toma AI_MODEL_NAME, AI_MODEL_TOKEN, peso 1,
+AI_MODEL_POOL_SIZE y AI_MODEL_ASYNC_POOL_SIZE. max_concurrency limita las
+llamadas desde hilos (cada una ocupa uno); async_max_concurrency las del event
+loop (ASGI), que no ocupan hilos y pueden ser cientos. Sin AI_MODEL_BACKENDS el pool tiene un único backend
+armado con AI_MODEL_URL, como antes.
+
+Las llamadas se reparten por round-robin ponderado suave con peso efectivo
+peso / (solicitudes en curso + 1): sin carga cada backend recibe tráfico en
+proporción a su peso y el que acumula solicitudes pendientes (least outstanding
+requests) va quedando relegado. Cada backend tiene su circuit breaker: el
+que acumula fallos queda expulsado hasta que una llamada de prueba sale bien.
+Con AI_MODEL_HEDGE_PERCENTILE, si la respuesta tarda más que ese percentil de
+latencia del backend elegido se manda una segunda solicitud a otro backend y
+se usa la que llegue primero
+"""
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import httpx
+import requests
+
+from .http_client import (
+    AsyncModelHTTPClient, CircuitBreaker, CircuitOpenError, ModelHTTPClient, ModelUnavailableError,
+)
+
+AI_MODEL_QUEUE_TIMEOUT = float(os.getenv("AI_MODEL_QUEUE_TIMEOUT", "30"))
+AI_MODEL_HEDGE_PERCENTILE = float(os.getenv("AI_MODEL_HEDGE_PERCENTILE", "0"))
+AI_MODEL_HEDGE_MIN_SAMPLES = int(os.getenv("AI_MODEL_HEDGE_MIN_SAMPLES", "20"))
+AI_MODEL_HEDGE_WORKERS = int(os.getenv("AI_MODEL_HEDGE_WORKERS", "32"))
+AI_MODEL_LATENCY_WINDOW = int(os.getenv("AI_MODEL_LATENCY_WINDOW", "200"))
+
+
+class PoolSaturatedError(ModelUnavailableError):
+    """
+    Todos los backends disponibles están en su límite de concurrencia
+    (no es un circuito abierto: los backends están sanos pero ocupados)
+    """
+
+
+class ModelBackend:
+    """
+    Un despliegue del modelo: su cliente HTTP (con circuit breaker propio),
+    el límite de solicitudes simultáneas y las latencias recientes
+    """
+
+    def __init__(self, url: str, model: str, token: str, weight: float = 1.0,
+                 max_concurrency: int = 10, name: Optional[str] = None,
+                 async_max_concurrency: int = 100,
+                 connect_timeout: float = 5.0, read_timeout: float = 120.0,
+                 pool_timeout: float = 10.0, breaker: Optional[CircuitBreaker] = None,
+                 latency_window: int = AI_MODEL_LATENCY_WINDOW):
+        if weight <= 0 or max_concurrency < 1 or async_max_concurrency < 1:
+            raise ValueError(f"Backend {url}: weight debe ser > 0 y max_concurrency y async_max_concurrency >= 1")
+        self.url = url
+        self.model = model
+        self.token = token
+        self.weight = float(weight)
+        self.max_concurrency = max_concurrency
+        self.async_max_concurrency = async_max_concurrency
+        self.name = name or urlparse(url).netloc or url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_timeout = pool_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.client = ModelHTTPClient(connect_timeout, read_timeout, max_concurrency, self.breaker, pool_timeout)
+        self._async_clients = weakref.WeakKeyDictionary()
+        # outstanding (hilos), async_outstanding (event loop) y el crédito del
+        # round-robin los maneja el pool bajo su lock
+        self.outstanding = 0
+        self.async_outstanding = 0
+        self.credit = 0.0
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self._requests = 0
+        self._errors = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.token}"
+        }
+
+    def async_client(self) -> AsyncModelHTTPClient:
+        """
+        Cliente async del event loop actual (httpx.AsyncClient no puede usarse
+        desde otro loop); comparte el circuit breaker con el cliente síncrono
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncModelHTTPClient(self.connect_timeout, self.read_timeout,
+                                          self.async_max_concurrency, self.breaker, self.pool_timeout)
+            self._async_clients[loop] = client
+        return client
+
+    def available(self) -> bool:
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def record(self, latency: Optional[float], ok: bool, hedge: bool = False) -> None:
+        with self._lock:
+            self._requests += 1
+            if hedge:
+                self._hedges += 1
+            if not ok:
+                self._errors += 1
+            elif latency is not None:
+                self._latencies.append(latency)
+
+    def record_hedge_win(self) -> None:
+        with self._lock:
+            self._hedge_wins += 1
+
+    def percentile(self, percent: float, min_samples: int = 1) -> Optional[float]:
+        """
+        Percentil de las latencias recientes exitosas (segundos), o None si
+        todavía no hay suficientes muestras
+        """
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples or len(samples) < min_samples:
+            return None
+        return _percentile(samples, percent)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._latencies)
+            requests_count, errors = self._requests, self._errors
+            hedges, hedge_wins = self._hedges, self._hedge_wins
+
+        def at(percent):
+            return round(_percentile(samples, percent) * 1000, 1) if samples else None
+
+        return {
+            "name": self.name,
+            "url": self.url,
+            "model": self.model,
+            "weight": self.weight,
+            "max_concurrency": self.max_concurrency,
+            "async_max_concurrency": self.async_max_concurrency,
+            "outstanding": self.outstanding,
+            "async_outstanding": self.async_outstanding,
+            "requests": requests_count,
+            "errors": errors,
+            "error_rate": round(errors / requests_count, 4) if requests_count else 0.0,
+            "hedges": hedges,
+            "hedge_wins": hedge_wins,
+            "latency_ms": {
+                "samples": len(samples),
+                "mean": round(sum(samples) / len(samples) * 1000, 1) if samples else None,
+                "p50": at(50),
+                "p95": at(95),
+                "p99": at(99),
+            },
+            "breaker": self.breaker.stats(),
+        }
+
+
+def _percentile(samples: List[float], percent: float) -> float:
+    # Nearest-rank sobre una lista ya ordenada
+    position = min(len(samples) - 1, max(0, int(round(percent / 100 * len(samples))) - 1))
+    return samples[position]
+
+
+def _failed(response) -> bool:
+    return response is None or response.status_code >= 500
+
+
+def _succeeded(future) -> bool:
+    return future.exception() is None and not _failed(future.result())
+
+
+class ModelBackendPool:
+    """
+    Reparte las llamadas al modelo entre los backends. post() y apost()
+    devuelven la respuesta HTTP igual que los clientes de http_client
+    """
+
+    def __init__(self, backends: List[ModelBackend], queue_timeout: float = AI_MODEL_QUEUE_TIMEOUT,
+                 hedge_percentile: float = AI_MODEL_HEDGE_PERCENTILE,
+                 hedge_min_samples: int = AI_MODEL_HEDGE_MIN_SAMPLES,
+                 hedge_workers: int = AI_MODEL_HEDGE_WORKERS):
+        if not backends:
+            raise ValueError("El pool necesita al menos un backend")
+        self.backends = backends
+        self.queue_timeout = queue_timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._hedge_workers = hedge_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.Condition()
+
+    @property
+    def model_names(self) -> str:
+        """
+        Identifica al pool en las claves de la caché de generaciones
+        """
+        return ",".join(sorted({backend.model for backend in self.backends}))
+
+    # Selección
+
+    def _try_acquire(self, exclude: Iterable[ModelBackend] = (),
+                     asynchronous: bool = False) -> Optional[ModelBackend]:
+        """
+        Reserva un lugar en un backend con capacidad libre (round-robin
+        ponderado suave sobre peso / (en curso + 1)). None si no hay lugar.
+        Con asynchronous el límite es async_max_concurrency; la carga que
+        pondera la elección suma las dos. Lanza CircuitOpenError si todos
+        los candidatos están expulsados
+        """
+        excluded = set(map(id, exclude))
+        candidates = [backend for backend in self.backends if id(backend) not in excluded]
+        healthy = [backend for backend in candidates if backend.available()]
+        if candidates and not healthy:
+            raise CircuitOpenError("Servicio de IA no disponible temporalmente")
+
+        with self._slots:
+            if asynchronous:
+                free = [backend for backend in healthy if backend.async_outstanding < backend.async_max_concurrency]
+            else:
+                free = [backend for backend in healthy if backend.outstanding < backend.max_concurrency]
+            if not free:
+                return None
+            total = 0.0
+            for backend in free:
+                effective = backend.weight / (backend.outstanding + backend.async_outstanding + 1)
+                backend.credit += effective
+                total += effective
+            best = max(free, key=lambda backend: backend.credit)
+            best.credit -= total
+            if asynchronous:
+                best.async_outstanding += 1
+            else:
+                best.outstanding += 1
+            return best
+
+    def _release(self, backend: ModelBackend, asynchronous: bool = False) -> None:
+        with self._slots:
+            if asynchronous:
+                backend.async_outstanding -= 1
+            else:
+                backend.outstanding -= 1
+                self._slots.notify()
+
+    def acquire(self, exclude: Iterable[ModelBackend] = ()) -> ModelBackend:
+        """
+        Como _try_acquire pero espera hasta queue_timeout a que se libere un lugar
+        """
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            backend = self._try_acquire(exclude)
+            if backend is not None:
+                return backend
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise PoolSaturatedError("Servicio de IA saturado, intenta de nuevo en unos segundos")
+            with self._slots:
+                # Se vuelve a mirar al menos cada segundo: un backend expulsado
+                # puede volver sin que nadie libere un lugar
+                self._slots.wait(min(remaining, 1.0))
+
+    async def aacquire(self, exclude: Iterable[ModelBackend] = ()) -> ModelBackend:
+        """
+        Versión async de acquire: espera sin bloquear el event loop
+        """
+        deadline = time.monotonic() + self.queue_timeout
+        delay = 0.005
+        while True:
+            backend = self._try_acquire(exclude, asynchronous=True)
+            if backend is not None:
+                return backend
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise PoolSaturatedError("Servicio de IA saturado, intenta de nuevo en unos segundos")
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 0.1)
+
+    def _hedge_delay(self, backend: ModelBackend) -> Optional[float]:
+        if self.hedge_percentile <= 0 or len(self.backends) < 2:
+            return None
+        return backend.percentile(self.hedge_percentile, self.hedge_min_samples)
+
+    # Llamadas
+
+    @staticmethod
+    def _payload(backend: ModelBackend, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(payload, model=backend.model)
+
+    def _call(self, backend: ModelBackend, payload: Dict[str, Any], hedge: bool = False):
+        """
+        Una solicitud a un backend ya reservado; libera el lugar al terminar
+        """
+        started = time.monotonic()
+        response = None
+        try:
+            response = backend.client.post(backend.url, json=self._payload(backend, payload),
+                                           headers=backend.headers())
+            return response
+        except CircuitOpenError:
+            # Otra solicitud ya está probando el backend (half-open): no cuenta
+            response = False
+            raise
+        finally:
+            if response is not False:
+                backend.record(time.monotonic() - started, not _failed(response), hedge)
+            self._release(backend)
+
+    def post(self, payload: Dict[str, Any]) -> requests.Response:
+        """
+        POST del payload de chat/completions a un backend del pool
+        (con `model` y token del backend elegido)
+        """
+        tried: List[ModelBackend] = []
+        while True:
+            backend = self.acquire(tried)
+            delay = self._hedge_delay(backend)
+            try:
+                if delay is None:
+                    return self._call(backend, payload)
+                return self._hedged(backend, payload, delay)
+            except CircuitOpenError:
+                if len(tried) + 1 >= len(self.backends):
+                    raise
+                tried.append(backend)
+
+    def _hedged(self, primary: ModelBackend, payload: Dict[str, Any], delay: float):
+        if self._executor is None:
+            with self._slots:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._hedge_workers,
+                                                        thread_name_prefix="ai-hedge")
+        executor = self._executor
+        first = executor.submit(contextvars.copy_context().run, self._call, primary, payload)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        secondary = self._try_acquire_quietly([primary])
+        if secondary is None:
+            return first.result()
+        second = executor.submit(contextvars.copy_context().run, self._call, secondary, payload, True)
+
+        pending = {first, second}
+        failures = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Las dos pueden terminar en la misma vuelta: se busca un éxito
+            # entre todas antes de quedarse con un fallo
+            done = [future for future in (first, second) if future in done]
+            winner = next((future for future in done if _succeeded(future)), None)
+            if winner is not None:
+                if winner is second:
+                    secondary.record_hedge_win()
+                for future in failures + done:
+                    if future is not winner:
+                        _close_response(future)
+                for loser in pending:
+                    loser.add_done_callback(_close_response)
+                return winner.result()
+            failures.extend(done)
+        # Ninguna salió bien: el último fallo (respuesta 5xx o excepción)
+        for future in failures[:-1]:
+            _close_response(future)
+        return failures[-1].result()
+
+    def _try_acquire_quietly(self, exclude: List[ModelBackend],
+                             asynchronous: bool = False) -> Optional[ModelBackend]:
+        try:
+            return self._try_acquire(exclude, asynchronous)
+        except CircuitOpenError:
+            return None
+
+    @contextmanager
+    def stream(self, payload: Dict[str, Any]):
+        """
+        POST en streaming: el lugar en el backend queda reservado hasta cerrar
+        el bloque. Sin hedging y sin registrar latencia (depende del largo de
+        la respuesta, no del backend)
+        """
+        tried: List[ModelBackend] = []
+        while True:
+            backend = self.acquire(tried)
+            try:
+                response = backend.client.post(backend.url, json=self._payload(backend, payload),
+                                               headers=backend.headers(), stream=True)
+                break
+            except CircuitOpenError:
+                self._release(backend)
+                if len(tried) + 1 >= len(self.backends):
+                    raise
+                tried.append(backend)
+            except Exception:
+                backend.record(None, False)
+                self._release(backend)
+                raise
+        try:
+            yield response
+        finally:
+            backend.record(None, not _failed(response))
+            response.close()
+            self._release(backend)
+
+    async def _acall(self, backend: ModelBackend, payload: Dict[str, Any], hedge: bool = False):
+        started = time.monotonic()
+        response = None
+        try:
+            response = await backend.async_client().post(backend.url, json=self._payload(backend, payload),
+                                                         headers=backend.headers())
+            return response
+        except CircuitOpenError:
+            response = False
+            raise
+        except asyncio.CancelledError:
+            # Perdió la carrera del hedging: no es un error del backend
+            response = False
+            raise
+        finally:
+            if response is not False:
+                backend.record(time.monotonic() - started, not _failed(response), hedge)
+            self._release(backend, asynchronous=True)
+
+    async def apost(self, payload: Dict[str, Any]) -> httpx.Response:
+        """
+        Versión async de post; la solicitud perdedora del hedging se cancela
+        """
+        tried: List[ModelBackend] = []
+        while True:
+            backend = await self.aacquire(tried)
+            delay = self._hedge_delay(backend)
+            try:
+                if delay is None:
+                    return await self._acall(backend, payload)
+                return await self._ahedged(backend, payload, delay)
+            except CircuitOpenError:
+                if len(tried) + 1 >= len(self.backends):
+                    raise
+                tried.append(backend)
+
+    async def _ahedged(self, primary: ModelBackend, payload: Dict[str, Any], delay: float):
+        first = asyncio.ensure_future(self._acall(primary, payload))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        secondary = self._try_acquire_quietly([primary], asynchronous=True)
+        if secondary is None:
+            return await first
+        second = asyncio.ensure_future(self._acall(secondary, payload, True))
+
+        pending = {first, second}
+        failures = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                done = [task for task in (first, second) if task in done]
+                winner = next((task for task in done if _succeeded(task)), None)
+                if winner is not None:
+                    if winner is second:
+                        secondary.record_hedge_win()
+                    return winner.result()
+                failures.extend(done)
+            return failures[-1].result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hedge_percentile": self.hedge_percentile or None,
+            "backends": [backend.stats() for backend in self.backends],
+        }
+
+
+def _close_response(future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def backends_from_env() -> List[ModelBackend]:
+    """
+    Backends de AI_MODEL_BACKENDS, o el único de AI_MODEL_URL si no está
+    """
+    model = os.getenv("AI_MODEL_NAME", "modifit-agent")
+    token = os.getenv("AI_MODEL_TOKEN", "qlEE6b6b8fVXuRWYxAA8mxVDvfolkalv")
+    common = {
+        "connect_timeout": float(os.getenv("AI_MODEL_CONNECT_TIMEOUT", "5")),
+        "read_timeout": float(os.getenv("AI_MODEL_READ_TIMEOUT", "120")),
+        "pool_timeout": float(os.getenv("AI_MODEL_POOL_TIMEOUT", "10")),
+    }
+    pool_size = int(os.getenv("AI_MODEL_POOL_SIZE", "10"))
+    async_pool_size = int(os.getenv("AI_MODEL_ASYNC_POOL_SIZE", "100"))
+    threshold = int(os.getenv("AI_MODEL_BREAKER_THRESHOLD", "5"))
+    reset = float(os.getenv("AI_MODEL_BREAKER_RESET", "30"))
+
+    raw = os.getenv("AI_MODEL_BACKENDS", "").strip()
+    if not raw:
+        entries = [{"url": os.getenv("AI_MODEL_URL", "https://mwjt5t5qmp2bhooiw2s7ioul.agents.do-ai.run/api/v1/chat/completions")}]
+    else:
+        entries = json.loads(raw)
+        if not isinstance(entries, list) or not entries:
+            raise ValueError("AI_MODEL_BACKENDS debe ser una lista JSON no vacía")
+
+    backends = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get("url"):
+            raise ValueError(f"AI_MODEL_BACKENDS: cada backend necesita url ({entry!r})")
+        backends.append(ModelBackend(
+            url=entry["url"],
+            model=entry.get("model") or model,
+            token=entry.get("token") or token,
+            weight=float(entry.get("weight", 1)),
+            max_concurrency=int(entry.get("max_concurrency", pool_size)),
+            async_max_concurrency=int(entry.get("async_max_concurrency", async_pool_size)),
+            name=entry.get("name"),
+            breaker=CircuitBreaker(threshold, reset),
+            **common
+        ))
+    return backends
+
+
+_pool: Optional[ModelBackendPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_model_pool() -> ModelBackendPool:
+    """
+    Pool compartido del proceso, armado la primera vez desde el entorno
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ModelBackendPool(backends_from_env())
+    return _pool
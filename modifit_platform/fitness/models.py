@@ -28,11 +28,139 @@ class AIGeneratedRoutine(models.Model):
     name = models.CharField(max_length=255)
     prompt = models.TextField()  # El prompt del usuario que generó la rutina
     exercises = models.JSONField(default=list)  # Lista de ejercicios generados
+    fallback = models.BooleanField(default=False)  # Generada localmente porque el modelo no respondió a tiempo
     generated_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-generated_at']
+        indexes = [
+            models.Index(fields=['user', 'generated_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.user.username}"
+
+
+class RoutineExercise(models.Model):
+    """
+    Proyección indexada de los ejercicios de AIGeneratedRoutine.exercises.
+    Permite filtrar rutinas por ejercicio o músculo sin recorrer el JSON
+    """
+    routine = models.ForeignKey(AIGeneratedRoutine, on_delete=models.CASCADE, related_name='exercise_rows')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    position = models.PositiveIntegerField()
+    name = models.CharField(max_length=255)
+    name_normalized = models.CharField(max_length=255)
+    muscle = models.CharField(max_length=255, blank=True, default="")
+    series = models.IntegerField(null=True, blank=True)
+    reps = models.CharField(max_length=50, blank=True, default="")
+    day = models.CharField(max_length=100, blank=True, default="")
+
+    class Meta:
+        ordering = ['routine', 'position']
+        indexes = [
+            models.Index(fields=['user', 'name_normalized']),
+            models.Index(fields=['user', 'muscle']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.routine_id})"
+
+
+class RoutineSearchTerm(models.Model):
+    """
+    Índice invertido de búsqueda: un término (sin acentos, en singular) por
+    rutina con su peso según dónde aparece (nombre, ejercicios, prompt)
+    """
+    routine = models.ForeignKey(AIGeneratedRoutine, on_delete=models.CASCADE, related_name='search_terms')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'term']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['routine', 'term'], name='unique_routine_search_term'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} ({self.routine_id})"
+
+
+class TrainingStat(models.Model):
+    """
+    Acumulados semanales de entrenamiento por usuario, mantenidos de forma
+    incremental al crear, editar o borrar rutinas.
+    kind='total' lleva los totales de la semana (key vacío), kind='muscle'
+    uno por grupo muscular y kind='exercise' uno por ejercicio
+    """
+    KIND_TOTAL = 'total'
+    KIND_MUSCLE = 'muscle'
+    KIND_EXERCISE = 'exercise'
+    KIND_CHOICES = [
+        (KIND_TOTAL, 'Total'),
+        (KIND_MUSCLE, 'Grupo muscular'),
+        (KIND_EXERCISE, 'Ejercicio'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='training_stats')
+    week = models.DateField()  # Lunes de la semana
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    key = models.CharField(max_length=255, blank=True, default="")
+    label = models.CharField(max_length=255, blank=True, default="")
+    routines = models.IntegerField(default=0)
+    exercises = models.IntegerField(default=0)
+    sets = models.IntegerField(default=0)
+    reps = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['-week', 'kind', 'key']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'week', 'kind', 'key'], name='unique_training_stat'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.week} {self.kind}:{self.key}"
+
+
+class RoutineGenerationJob(models.Model):
+    """
+    Trabajo de generación de rutina en segundo plano.
+    La cola vive en la base de datos para que los trabajos sobrevivan a un reinicio
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'En cola'),
+        (STATUS_RUNNING, 'En ejecución'),
+        (STATUS_DONE, 'Terminado'),
+        (STATUS_FAILED, 'Fallido'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generation_jobs')
+    prompt = models.TextField()
+    routine_name = models.CharField(max_length=255)
+    use_cache = models.BooleanField(default=True)
+    size = models.PositiveSmallIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    routine = models.ForeignKey(AIGeneratedRoutine, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error = models.TextField(blank=True, default="")
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=255, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} ({self.status}) - {self.user.username}"
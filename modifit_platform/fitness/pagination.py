@@ -0,0 +1,64 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(generated_at: datetime, pk: int) -> str:
+    raw = f"{generated_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        generated_at, pk = raw.rsplit("|", 1)
+        return datetime.fromisoformat(generated_at), int(pk)
+    except (ValueError, UnicodeError):
+        raise InvalidCursor("Cursor inválido")
+
+
+def keyset_queryset(queryset, cursor: Optional[str]):
+    """
+    Ordena por (generated_at, id) descendente y aplica el cursor
+    """
+    queryset = queryset.order_by('-generated_at', '-id')
+    if cursor:
+        generated_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(generated_at__lt=generated_at) | Q(generated_at=generated_at, id__lt=pk)
+        )
+    return queryset
+
+
+def _finish_page(items: list, limit: int):
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(last.generated_at, last.id)
+    return items, next_cursor
+
+
+def keyset_page(queryset, cursor: Optional[str], limit: int):
+    """
+    Paginación por keyset sobre (generated_at, id) en orden descendente.
+    Retorna (items, next_cursor); next_cursor es None en la última página
+    """
+    # Se pide un elemento extra para saber si hay otra página
+    items = list(keyset_queryset(queryset, cursor)[:limit + 1])
+    return _finish_page(items, limit)
+
+
+async def akeyset_page(queryset, cursor: Optional[str], limit: int):
+    """
+    Versión async de keyset_page
+    """
+    items = [item async for item in keyset_queryset(queryset, cursor)[:limit + 1]]
+    return _finish_page(items, limit)
@@ -0,0 +1,375 @@
+import re
+import json
+import threading
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+NAME_KEYS = ("name", "nombre", "exercise", "ejercicio", "exercise_name")
+SERIES_KEYS = ("series", "sets", "count_series", "num_series")
+REPS_KEYS = ("reps", "repetitions", "repeticiones", "repeats", "count_repeat")
+CONTAINER_KEYS = ("exercises", "ejercicios", "routines", "rutinas", "routine", "rutina", "days", "dias", "días", "workout", "plan")
+DAY_KEYS = ("day", "dia", "día")
+
+_ALIAS_KEYS = frozenset(NAME_KEYS + SERIES_KEYS + REPS_KEYS)
+_NAME_KEY_SET = frozenset(NAME_KEYS)
+_NAME_KEY_MAX = max(map(len, NAME_KEYS))
+_SPECIAL = re.compile(r'[\\"{}\[\]`]')
+_SETS_REPS = re.compile(
+    r"(\d+)\s*(?:x|×|series\s+de|series\s+x|sets?\s+of|sets?\s+x)\s*(\d+(?:\s*-\s*\d+)?)",
+    re.IGNORECASE
+)
+_BULLET = re.compile(r"^(?:\d+[.)-]?|[-•*])\s*")
+
+
+class ParseStats:
+    """
+    Contadores del parser: cuántas respuestas se resolvieron por cada vía.
+    Permite medir la tasa de fallback a texto plano
+    """
+
+    METHODS = ("json", "json_object", "partial_json", "text", "raw")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.METHODS, 0)
+        self._bytes = 0
+
+    def record(self, method: str, size: int) -> None:
+        with self._lock:
+            self._counts[method] += 1
+            self._bytes += size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            parsed_bytes = self._bytes
+        total = sum(counts.values())
+        fallbacks = counts["text"] + counts["raw"]
+        return {
+            "responses": total,
+            "by_method": counts,
+            "bytes": parsed_bytes,
+            "fallback_rate": fallbacks / total if total else 0.0,
+        }
+
+
+parse_stats = ParseStats()
+
+
+def _to_int(value: Any) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    if isinstance(value, str):
+        match = re.match(r"\s*(\d+)", value)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def _to_reps(value: Any) -> Any:
+    """
+    Las repeticiones pueden ser un número o un rango ("8-12"), que se conserva como texto
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        if value.isdigit():
+            return int(value)
+        return value or None
+    if isinstance(value, float):
+        return int(value)
+    if isinstance(value, bool):
+        return None
+    return value
+
+
+def _first(item: Dict[str, Any], keys) -> Any:
+    for key in keys:
+        if key in item and item[key] not in (None, ""):
+            return item[key]
+    return None
+
+
+def has_name(item: Any) -> bool:
+    return isinstance(item, dict) and any(key in item for key in NAME_KEYS)
+
+
+def normalize_exercise(item: Dict[str, Any], day: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Lleva un ejercicio al esquema estable: name, series, reps y el resto de
+    campos que haya enviado el modelo (description, muscle, rest, ...)
+    """
+    name = _first(item, NAME_KEYS)
+    exercise = {
+        "name": str(name).strip() if name is not None else "",
+        "series": _to_int(_first(item, SERIES_KEYS)),
+        "reps": _to_reps(_first(item, REPS_KEYS)),
+    }
+    for key, value in item.items():
+        if key not in _ALIAS_KEYS:
+            exercise.setdefault(key, value)
+    if day and "day" not in exercise:
+        exercise["day"] = day
+    return exercise
+
+
+def extract_exercises(value: Any, day: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Recorre un valor JSON y devuelve sus ejercicios normalizados.
+    Entra en contenedores (exercises, routines, days, ...) conservando el día
+    """
+    if isinstance(value, list):
+        exercises = []
+        for item in value:
+            if isinstance(item, str):
+                exercises.append(normalize_exercise({"name": item}, day))
+            else:
+                exercises.extend(extract_exercises(item, day))
+        return exercises
+
+    if not isinstance(value, dict):
+        return []
+
+    for key in CONTAINER_KEYS:
+        children = value.get(key)
+        if isinstance(children, (list, dict)):
+            label = _first(value, DAY_KEYS)
+            exercises = extract_exercises(children, str(label) if label is not None else day)
+            if exercises:
+                return exercises
+
+    if has_name(value):
+        return [normalize_exercise(value, day)]
+    return []
+
+
+class ExerciseStreamParser:
+    """
+    Parser de una sola pasada para las respuestas del modelo.
+
+    Se alimenta con fragmentos (feed) y localiza en el mismo recorrido los
+    objetos y arrays JSON de primer nivel, ignorando el texto alrededor y
+    los bloques ```json. Cada objeto de ejercicio se emite en cuanto se
+    cierra su llave; close() devuelve la lista final.
+
+    json.loads solo corre sobre los valores de primer nivel y sobre los
+    objetos internos que tienen una clave de nombre y ningún ejercicio
+    adentro, así cada carácter se parsea a lo sumo dos veces sin importar
+    la profundidad
+    """
+
+    def __init__(self):
+        self._segments: List[str] = []
+        self._offsets: List[int] = []
+        self._length = 0
+        # [apertura, inicio, contiene_ejercicio, tiene_clave_de_nombre]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._string_start = 0
+        self._skip_until = 0
+        self._last_tick = -2
+        self._ticks = 0
+        self._in_fence = False
+        self._values: List[Tuple[bool, Any]] = []
+        self._emitted: List[Dict[str, Any]] = []
+        self.method: Optional[str] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Procesa un fragmento y retorna los ejercicios que se completaron en él
+        """
+        if not chunk:
+            return []
+        base = self._length
+        self._segments.append(chunk)
+        self._offsets.append(base)
+        self._length += len(chunk)
+
+        found = []
+        for match in _SPECIAL.finditer(chunk):
+            position = base + match.start()
+            if position < self._skip_until:
+                continue
+            char = match.group()
+
+            if self._in_string:
+                if char == "\\":
+                    self._skip_until = position + 2
+                elif char == '"':
+                    self._in_string = False
+                    self._mark_name_key(position)
+                continue
+
+            if char == "`":
+                self._ticks = self._ticks + 1 if position == self._last_tick + 1 else 1
+                self._last_tick = position
+                if self._ticks == 3:
+                    # Un fence abre o cierra un bloque de código: lo que
+                    # quedara abierto era texto, no JSON
+                    self._in_fence = not self._in_fence
+                    self._stack.clear()
+                continue
+
+            if char == '"':
+                # Las comillas solo importan dentro de un valor JSON
+                if self._stack:
+                    self._in_string = True
+                    self._string_start = position
+            elif char in "{[":
+                self._stack.append([char, position, False, False])
+            elif self._stack:
+                self._close(char, position, found)
+        return found
+
+    def _mark_name_key(self, end: int) -> None:
+        """
+        Marca el objeto abierto si la cadena recién cerrada es una clave de
+        nombre (puede ser un valor: solo habilita el intento de parseo)
+        """
+        top = self._stack[-1]
+        if top[0] != "{" or top[3] or end - self._string_start - 1 > _NAME_KEY_MAX:
+            return
+        if self._slice(self._string_start + 1, end) in _NAME_KEY_SET:
+            top[3] = True
+
+    def _close(self, char: str, position: int, found: List[Dict[str, Any]]) -> None:
+        opening, start, has_child, has_name_key = self._stack.pop()
+        if (opening == "{") != (char == "}"):
+            # Llaves desbalanceadas: era texto
+            self._stack.clear()
+            return
+
+        if not self._stack:
+            value = self._load(start, position)
+            if value is not None:
+                self._values.append((self._in_fence, value))
+            if opening == "{" and not has_child and has_name(value):
+                exercise = normalize_exercise(value)
+                self._emitted.append(exercise)
+                found.append(exercise)
+            return
+
+        if opening == "{" and not has_child and has_name_key:
+            value = self._load(start, position)
+            if has_name(value):
+                exercise = normalize_exercise(value)
+                self._emitted.append(exercise)
+                found.append(exercise)
+                has_child = True
+        if has_child:
+            self._stack[-1][2] = True
+
+    def _load(self, start: int, end: int) -> Any:
+        try:
+            return json.loads(self._slice(start, end + 1))
+        except (json.JSONDecodeError, RecursionError):
+            # RecursionError: anidamiento más profundo de lo que json admite
+            return None
+
+    def _slice(self, start: int, end: int) -> str:
+        first = bisect_right(self._offsets, start) - 1
+        pieces = []
+        index = first
+        while index < len(self._segments) and self._offsets[index] < end:
+            pieces.append(self._segments[index])
+            index += 1
+        base = self._offsets[first]
+        return "".join(pieces)[start - base:end - base]
+
+    @property
+    def text(self) -> str:
+        return "".join(self._segments)
+
+    def close(self) -> List[Dict[str, Any]]:
+        """
+        Termina el parseo y retorna los ejercicios de la respuesta completa
+        """
+        text = self.text
+        candidates = [value for fenced, value in self._values if fenced]
+        candidates += [value for fenced, value in self._values if not fenced]
+
+        exercises = []
+        for value in candidates:
+            exercises = extract_exercises(value)
+            if exercises:
+                self.method = "json"
+                break
+
+        if not exercises and self._emitted:
+            # JSON truncado (por ejemplo por max_tokens): se usan los
+            # ejercicios que sí llegaron a cerrarse
+            exercises = list(self._emitted)
+            self.method = "partial_json"
+
+        if not exercises and candidates and isinstance(candidates[0], dict):
+            exercises = [normalize_exercise(candidates[0])]
+            self.method = "json_object"
+
+        if not exercises:
+            exercises = parse_text_exercises(text)
+            self.method = "raw" if exercises and exercises[0].get("is_text_response") else "text"
+
+        parse_stats.record(self.method, len(text))
+        return exercises
+
+
+def parse_exercises(text: str) -> List[Dict[str, Any]]:
+    """
+    Parsea una respuesta completa del modelo
+    """
+    parser = ExerciseStreamParser()
+    parser.feed(text)
+    return parser.close()
+
+
+def parse_text_exercises(text: str) -> List[Dict[str, Any]]:
+    """
+    Parsea ejercicios desde texto plano
+    Busca líneas que comiencen con números, guiones o viñetas
+    """
+    exercises = []
+    current = None
+    parts = []
+
+    def finish():
+        description = " ".join(parts)
+        current["description"] = description
+        match = _SETS_REPS.search(description)
+        if match:
+            current["series"] = int(match.group(1))
+            current["reps"] = _to_reps(re.sub(r"\s+", "", match.group(2)))
+        exercises.append(current)
+
+    for line in text.splitlines():
+        line = line.strip()
+
+        if not line:
+            if current:
+                finish()
+                current = None
+            continue
+
+        if line[0].isdigit() or line[0] in "-•*":
+            if current:
+                finish()
+            name = _BULLET.sub("", line).replace("**", "")
+            name = re.split(r"[:,]| - ", name, maxsplit=1)[0].strip()
+            current = {"name": name, "series": 3, "reps": 10}
+            parts = [line]
+        elif current:
+            parts.append(line)
+
+    if current:
+        finish()
+
+    if not exercises:
+        exercises = [{
+            "name": "Rutina personalizada",
+            "description": text,
+            "is_text_response": True
+        }]
+
+    return exercises
@@ -0,0 +1,163 @@
+import os
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from .text import fold_text
+
+SYSTEM_PROMPT = (
+    "Eres un entrenador personal. Responde solo con JSON válido, sin texto "
+    "antes ni después, con este formato: "
+    '{"exercises":[{"name":"...","series":4,"reps":"8-12","muscle":"...","day":"...","description":"..."}]}. '
+    "series es un entero y reps un entero o un rango. Usa \"day\" solo si la "
+    "rutina tiene varios días. Cada description en una sola frase corta."
+)
+
+NUMBER_WORDS = {
+    "un": 1, "una": 1, "uno": 1, "one": 1, "dos": 2, "two": 2, "tres": 3, "three": 3,
+    "cuatro": 4, "four": 4, "cinco": 5, "five": 5, "seis": 6, "six": 6,
+    "siete": 7, "seven": 7, "ocho": 8, "eight": 8, "nueve": 9, "nine": 9, "diez": 10, "ten": 10,
+}
+_NUMBER = r"(\d{1,2}|" + "|".join(NUMBER_WORDS) + r")"
+_EXERCISES = re.compile(_NUMBER + r"\s+(?:\w+\s+)?(?:ejercicios?|exercises?)\b")
+_DAYS = re.compile(_NUMBER + r"\s+(?:\w+\s+)?(?:dias?|days?|sesiones|sessions)\b")
+_WEEK = re.compile(r"\b(?:semana|semanal|week|weekly)\b")
+
+DEFAULT_EXERCISES_PER_DAY = int(os.getenv("AI_DEFAULT_EXERCISES_PER_DAY", "6"))
+MAX_EXERCISES = 60
+
+
+def _number(value: str) -> int:
+    return int(value) if value.isdigit() else NUMBER_WORDS[value]
+
+
+def compact_prompt(prompt: str) -> str:
+    """
+    Quita espacios y saltos de línea repetidos del prompt del usuario
+    """
+    return " ".join(prompt.split())
+
+
+def estimate_exercises(prompt: str, size: Optional[int] = None) -> int:
+    """
+    Cantidad de ejercicios que se espera en la respuesta: `size` si se
+    indicó, o lo que pida el prompt ("3 ejercicios", "4 días", "semanal")
+    """
+    if size:
+        return min(size, MAX_EXERCISES)
+
+    text = fold_text(prompt)
+    exercises = _EXERCISES.search(text)
+    per_day = _number(exercises.group(1)) if exercises else DEFAULT_EXERCISES_PER_DAY
+    return max(1, min(per_day * estimate_days(prompt), MAX_EXERCISES))
+
+
+def estimate_days(prompt: str) -> int:
+    """
+    Días de entrenamiento que pide el prompt ("4 días", "semanal" = 5), o 1
+    """
+    text = fold_text(prompt)
+    days = _DAYS.search(text)
+    if days:
+        return max(1, _number(days.group(1)))
+    if _WEEK.search(text) and not _EXERCISES.search(text):
+        return 5
+    return 1
+
+
+class TokenBudget:
+    """
+    Presupuesto de max_tokens según la cantidad de ejercicios esperada:
+    overhead + per_exercise × ejercicios, acotado entre minimum y maximum
+    """
+
+    def __init__(self, per_exercise: int = 80, overhead: int = 150,
+                 minimum: int = 400, maximum: int = 5000):
+        self.per_exercise = per_exercise
+        self.overhead = overhead
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def for_exercises(self, exercises: int) -> int:
+        return max(self.minimum, min(self.overhead + self.per_exercise * exercises, self.maximum))
+
+
+token_budget = TokenBudget(
+    per_exercise=int(os.getenv("AI_TOKENS_PER_EXERCISE", "80")),
+    overhead=int(os.getenv("AI_TOKENS_OVERHEAD", "150")),
+    minimum=int(os.getenv("AI_MIN_TOKENS", "400")),
+    maximum=int(os.getenv("AI_MAX_TOKENS", "5000")),
+)
+
+
+def shape_request(prompt: str, size: Optional[int] = None, enabled: bool = True) -> Dict[str, Any]:
+    """
+    Arma los mensajes y el max_tokens de una llamada al modelo.
+    Con enabled=False se envía el prompt tal cual con el máximo de tokens
+    """
+    if not enabled:
+        return {
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": token_budget.maximum,
+            "expected_exercises": None,
+            "system": "",
+        }
+
+    expected = estimate_exercises(prompt, size)
+    return {
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": compact_prompt(prompt)},
+        ],
+        "max_tokens": token_budget.for_exercises(expected),
+        "expected_exercises": expected,
+        "system": SYSTEM_PROMPT,
+    }
+
+
+class UsageStats:
+    """
+    Consumo de tokens por llamada al modelo, para ajustar los presupuestos:
+    cuánto del max_tokens se usa, cuántas respuestas se cortan por límite
+    y cuántos tokens ocupa en promedio cada ejercicio
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "budget_tokens": 0,
+            "exercises": 0,
+            "truncated": 0,
+        }
+
+    def record(self, max_tokens: int, usage: Optional[Dict[str, Any]],
+               finish_reason: Optional[str], exercises: int) -> None:
+        usage = usage or {}
+        with self._lock:
+            self._totals["calls"] += 1
+            self._totals["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            self._totals["completion_tokens"] += usage.get("completion_tokens") or 0
+            self._totals["budget_tokens"] += max_tokens
+            self._totals["exercises"] += exercises
+            if finish_reason == "length":
+                self._totals["truncated"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._totals)
+        calls = stats["calls"]
+        stats["avg_completion_tokens"] = stats["completion_tokens"] / calls if calls else 0.0
+        stats["budget_utilization"] = (
+            stats["completion_tokens"] / stats["budget_tokens"] if stats["budget_tokens"] else 0.0
+        )
+        stats["tokens_per_exercise"] = (
+            stats["completion_tokens"] / stats["exercises"] if stats["exercises"] else 0.0
+        )
+        stats["truncated_rate"] = stats["truncated"] / calls if calls else 0.0
+        return stats
+
+
+usage_stats = UsageStats()
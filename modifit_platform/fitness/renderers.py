@@ -0,0 +1,49 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils import encoders
+
+
+def format_sse(event: str, data) -> str:
+    """
+    Formatea un evento Server-Sent Events con datos en JSON
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Permite que las vistas en streaming acepten 'Accept: text/event-stream'.
+    Las respuestas normales (por ejemplo errores de validación) se envían
+    como un único evento 'error'
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return format_sse('error', data).encode(self.charset)
+
+
+def format_ndjson(data) -> bytes:
+    """
+    Una línea NDJSON; fechas y decimales con el mismo formato que la API
+    """
+    return json.dumps(data, ensure_ascii=False, cls=encoders.JSONEncoder).encode('utf-8') + b'\n'
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Permite que las vistas de exportación/importación acepten
+    'Accept: application/x-ndjson'. Las respuestas normales se envían como una línea
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return format_ndjson(data)
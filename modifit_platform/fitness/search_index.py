@@ -0,0 +1,117 @@
+import math
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Tuple
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import AIGeneratedRoutine, RoutineSearchTerm
+from .exercise_index import exercise_fields
+from .text import tokenize
+
+TERM_MAX_LENGTH = RoutineSearchTerm._meta.get_field('term').max_length
+MAX_WEIGHT = 100
+# Peso de cada aparición según el campo
+NAME_WEIGHT = 3
+EXERCISE_WEIGHT = 2
+TEXT_WEIGHT = 1
+DESCRIPTION_KEYS = ("description", "descripcion", "descripción", "notes", "notas")
+# Prefijo mínimo para buscar mientras se escribe ("sentad" -> sentadilla)
+MIN_PREFIX = 3
+# BM25 sin normalización por largo: satura el peso de términos repetidos
+K1 = 1.2
+
+
+def routine_terms(routine: AIGeneratedRoutine) -> Counter:
+    """
+    Términos de una rutina con su peso: nombre, prompt y nombre, músculo y
+    descripción de cada ejercicio
+    """
+    weights: Counter = Counter()
+
+    def add(text: Any, weight: int) -> None:
+        if text:
+            for term in tokenize(str(text)):
+                weights[term[:TERM_MAX_LENGTH]] += weight
+
+    add(routine.name, NAME_WEIGHT)
+    add(routine.prompt, TEXT_WEIGHT)
+    for item in routine.exercises if isinstance(routine.exercises, list) else []:
+        fields = exercise_fields(item if isinstance(item, dict) else {"name": item})
+        if fields is None:
+            continue
+        add(fields["name"], EXERCISE_WEIGHT)
+        add(fields["muscle"], EXERCISE_WEIGHT)
+        for key in DESCRIPTION_KEYS:
+            if isinstance(item, dict) and item.get(key):
+                add(item[key], TEXT_WEIGHT)
+                break
+    return weights
+
+
+def sync_routine_terms(routines: Iterable[AIGeneratedRoutine]) -> int:
+    """
+    Reemplaza los términos indexados de las rutinas dadas. Retorna cuántas filas se crearon
+    """
+    routines = list(routines)
+    if not routines:
+        return 0
+    rows = []
+    for routine in routines:
+        for term, weight in routine_terms(routine).items():
+            rows.append(RoutineSearchTerm(
+                routine_id=routine.id,
+                user_id=routine.user_id,
+                term=term,
+                weight=min(weight, MAX_WEIGHT)
+            ))
+
+    with transaction.atomic():
+        RoutineSearchTerm.objects.filter(routine_id__in=[routine.id for routine in routines]).delete()
+        RoutineSearchTerm.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def search_routines(user, query: str, limit: int = 20) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Busca en las rutinas del usuario. Cada palabra de la consulta se busca
+    exacta; la última también como prefijo (búsqueda mientras se escribe).
+    Primero van las rutinas que contienen más palabras de la consulta y,
+    entre ellas, las de mayor puntaje BM25.
+    Retorna ([{'routine_id', 'score', 'matched'}], total de rutinas encontradas)
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return [], 0
+    prefix = terms[-1] if len(terms[-1]) >= MIN_PREFIX and not query[-1:].isspace() else None
+
+    condition = Q(term__in=terms)
+    if prefix:
+        condition |= Q(term__startswith=prefix)
+    rows = RoutineSearchTerm.objects.filter(user=user).filter(condition).values_list('routine_id', 'term', 'weight')
+
+    # Peso por rutina y por palabra de la consulta (un prefijo puede cubrir varios términos)
+    matches: Dict[int, Dict[str, int]] = defaultdict(dict)
+    for routine_id, term, weight in rows:
+        key = term if term in terms else prefix
+        matches[routine_id][key] = max(matches[routine_id].get(key, 0), weight)
+    if not matches:
+        return [], 0
+
+    total_routines = AIGeneratedRoutine.objects.filter(user=user).count()
+    df = Counter(key for found in matches.values() for key in found)
+    idf = {
+        key: math.log(1 + (total_routines - count + 0.5) / (count + 0.5))
+        for key, count in df.items()
+    }
+
+    results = []
+    for routine_id, found in matches.items():
+        score = sum(idf[key] * weight * (K1 + 1) / (weight + K1) for key, weight in found.items())
+        results.append({
+            'routine_id': routine_id,
+            'score': round(score, 4),
+            'matched': [key for key in terms if key in found],
+        })
+    results.sort(key=lambda result: (len(result['matched']), result['score'], result['routine_id']), reverse=True)
+    return results[:limit], len(results)
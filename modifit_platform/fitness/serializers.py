@@ -1,5 +1,6 @@
+import os
 from rest_framework import serializers
-from .models import Exercise, Rutine, AIGeneratedRoutine
+from .models import Exercise, Rutine, AIGeneratedRoutine, RoutineGenerationJob
 
 
 class ExerciseSerializer(serializers.ModelSerializer):
@@ -17,10 +18,87 @@ class RutineSerializer(serializers.ModelSerializer):
 
 
 class AIGeneratedRoutineSerializer(serializers.ModelSerializer):
+    """
+    Acepta `fields` para serializar solo un subconjunto de campos
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
     class Meta:
         model = AIGeneratedRoutine
-        fields = ['id', 'user', 'name', 'prompt', 'exercises', 'generated_at', 'updated_at']
-        read_only_fields = ['id', 'user', 'generated_at', 'updated_at']
+        fields = ['id', 'user', 'name', 'prompt', 'exercises', 'fallback', 'generated_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'fallback', 'generated_at', 'updated_at']
+
+
+class ListRoutinesQuerySerializer(serializers.Serializer):
+    """
+    Parámetros de consulta del listado de rutinas
+    """
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(required=False, default=20, min_value=1, max_value=100)
+    fields = serializers.CharField(required=False, help_text="Campos separados por coma")
+    count = serializers.BooleanField(required=False, default=False, help_text="Incluir el total exacto")
+    exercise = serializers.CharField(required=False, max_length=255, help_text="Rutinas con un ejercicio que empiece por este nombre")
+    muscle = serializers.CharField(required=False, max_length=255, help_text="Rutinas que trabajen este músculo")
+
+    def validate_fields(self, value):
+        fields = [field.strip() for field in value.split(',') if field.strip()]
+        allowed = AIGeneratedRoutineSerializer.Meta.fields
+        unknown = [field for field in fields if field not in allowed]
+        if unknown:
+            raise serializers.ValidationError(f"Campos desconocidos: {', '.join(unknown)}")
+        return fields
+
+
+class ExportRoutinesQuerySerializer(serializers.Serializer):
+    """
+    Parámetros de la exportación NDJSON
+    """
+    since = serializers.DateTimeField(required=False, help_text="Solo rutinas generadas desde esta fecha")
+    gzip = serializers.BooleanField(required=False, default=False, help_text="Descargar como .ndjson.gz")
+
+
+class TrainingStatsQuerySerializer(serializers.Serializer):
+    """
+    Parámetros de las estadísticas de entrenamiento
+    """
+    weeks = serializers.IntegerField(required=False, default=12, min_value=1, max_value=104, help_text="Semanas recientes a detallar")
+
+
+class SearchRoutinesQuerySerializer(serializers.Serializer):
+    """
+    Parámetros de la búsqueda de texto en las rutinas del usuario
+    """
+    # Sin recortar: un espacio al final indica que la última palabra está completa (no es prefijo)
+    q = serializers.CharField(max_length=255, trim_whitespace=False, help_text="Palabras a buscar (ej. sentadilla bulgara)")
+    limit = serializers.IntegerField(required=False, default=20, min_value=1, max_value=100)
+    fields = serializers.CharField(required=False, help_text="Campos separados por coma")
+
+    validate_fields = ListRoutinesQuerySerializer.validate_fields
+
+    def validate_q(self, value):
+        if not value.strip():
+            raise serializers.ValidationError("Este campo no puede estar en blanco.")
+        return value
+
+
+class SimilarRoutinesQuerySerializer(serializers.Serializer):
+    """
+    Parámetros de la búsqueda de rutinas parecidas: un texto (q) o una rutina existente
+    """
+    q = serializers.CharField(required=False, max_length=2000, help_text="Texto a comparar (por ejemplo el prompt que se va a generar)")
+    routine_id = serializers.IntegerField(required=False, help_text="Buscar rutinas parecidas a esta")
+    limit = serializers.IntegerField(required=False, default=5, min_value=1, max_value=50)
+    min_score = serializers.FloatField(required=False, default=0.1, min_value=0.0, max_value=1.0)
+
+    def validate(self, attrs):
+        if bool(attrs.get('q', '').strip()) == ('routine_id' in attrs):
+            raise serializers.ValidationError("Envía 'q' o 'routine_id' (solo uno de los dos)")
+        return attrs
 
 
 class GenerateRoutineRequestSerializer(serializers.Serializer):
@@ -29,8 +107,78 @@ class GenerateRoutineRequestSerializer(serializers.Serializer):
     """
     prompt = serializers.CharField(max_length=2000, help_text="Descripción del entrenamiento deseado")
     routine_name = serializers.CharField(max_length=255, required=False, help_text="Nombre opcional de la rutina")
+    fresh = serializers.BooleanField(required=False, default=False, help_text="Ignorar la caché y generar una rutina nueva")
+    async_mode = serializers.BooleanField(required=False, default=False, help_text="Encolar la generación y responder 202 con el id del trabajo")
+    size = serializers.IntegerField(required=False, min_value=1, max_value=60, help_text="Cantidad de ejercicios esperada por rutina (ajusta el largo de la respuesta)")
+    deadline_ms = serializers.IntegerField(required=False, min_value=50, max_value=120000, help_text="Tiempo máximo de espera del modelo; pasado ese tiempo se responde una rutina generada localmente")
+    replace_fallback = serializers.BooleanField(required=False, default=False, help_text="Reemplazar la rutina local por la del modelo cuando llegue")
 
     def validate_prompt(self, value):
         if len(value) < 10:
             raise serializers.ValidationError("El prompt debe tener al menos 10 caracteres")
         return value
+
+    def validate(self, attrs):
+        # El trabajo en cola no espera a nadie: no hay deadline ni rutina local que reemplazar
+        if attrs['async_mode'] and ('deadline_ms' in attrs or attrs['replace_fallback']):
+            raise serializers.ValidationError("'deadline_ms' y 'replace_fallback' no se pueden usar con 'async_mode'")
+        return attrs
+
+
+class PlanDaySerializer(serializers.Serializer):
+    day = serializers.CharField(max_length=50, help_text="Día de la semana (ej. Lunes)")
+    focus = serializers.CharField(max_length=500, help_text="Enfoque del día (ej. piernas y glúteos)")
+
+
+class GenerateBatchRequestSerializer(serializers.Serializer):
+    """
+    Serializer para generar varias rutinas de una vez: una lista de prompts
+    o un plan semanal (días × enfoque) con un objetivo común
+    """
+    MAX_ITEMS = int(os.getenv("AI_BATCH_MAX_ITEMS", "7"))
+
+    prompts = serializers.ListField(
+        child=serializers.CharField(max_length=2000), required=False, min_length=1,
+        help_text="Un prompt por rutina"
+    )
+    plan = PlanDaySerializer(many=True, required=False, help_text="Días del plan con su enfoque")
+    goal = serializers.CharField(max_length=1000, required=False, allow_blank=True, help_text="Objetivo común a todo el plan")
+    name_prefix = serializers.CharField(max_length=200, required=False, help_text="Prefijo para los nombres de las rutinas")
+    fresh = serializers.BooleanField(required=False, default=False, help_text="Ignorar la caché y generar rutinas nuevas")
+    size = serializers.IntegerField(required=False, min_value=1, max_value=60, help_text="Cantidad de ejercicios esperada por rutina (ajusta el largo de la respuesta)")
+
+    def validate(self, attrs):
+        prompts = attrs.get('prompts')
+        plan = attrs.get('plan')
+        if bool(prompts) == bool(plan):
+            raise serializers.ValidationError("Envía 'prompts' o 'plan' (solo uno de los dos)")
+
+        if prompts:
+            items = [{'prompt': prompt} for prompt in prompts]
+        else:
+            goal = attrs.get('goal', '').strip().rstrip('.')
+            items = [
+                {
+                    'day': day['day'],
+                    'prompt': f"{goal + '. ' if goal else ''}Rutina para el {day['day']}: {day['focus']}"
+                }
+                for day in plan
+            ]
+
+        if len(items) > self.MAX_ITEMS:
+            raise serializers.ValidationError(f"Máximo {self.MAX_ITEMS} rutinas por solicitud")
+        short = [index for index, item in enumerate(items) if len(item['prompt']) < 10]
+        if short:
+            raise serializers.ValidationError(f"El prompt debe tener al menos 10 caracteres (posiciones {short})")
+        attrs['items'] = items
+        return attrs
+
+
+class RoutineGenerationJobSerializer(serializers.ModelSerializer):
+    routine = AIGeneratedRoutineSerializer(read_only=True)
+
+    class Meta:
+        model = RoutineGenerationJob
+        fields = ['id', 'status', 'prompt', 'routine_name', 'size', 'routine', 'error', 'attempts',
+                  'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
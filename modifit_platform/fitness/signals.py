@@ -0,0 +1,68 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import AIGeneratedRoutine
+from .exercise_index import sync_routine_exercises
+from .search_index import sync_routine_terms
+from .stats import apply_contribution, routine_contribution
+from modifit_platform.db_router import pin_primary
+
+
+@receiver(pre_save, sender=AIGeneratedRoutine)
+def remember_previous_routine(sender, instance, update_fields=None, **kwargs):
+    """
+    Guarda el aporte anterior de la rutina para poder restarlo de los acumulados
+    """
+    instance._previous_contribution = None
+    if instance.pk is None or (update_fields is not None and 'exercises' not in update_fields):
+        return
+    previous = (
+        AIGeneratedRoutine.objects.filter(pk=instance.pk)
+        .values('user_id', 'generated_at', 'exercises')
+        .first()
+    )
+    if previous is not None:
+        instance._previous_contribution = (
+            previous['user_id'],
+            routine_contribution(previous['generated_at'], previous['exercises'])
+        )
+
+
+@receiver(post_save, sender=AIGeneratedRoutine)
+def index_routine_exercises(sender, instance, update_fields=None, **kwargs):
+    """
+    Mantiene RoutineExercise y los acumulados de TrainingStat al crear o editar una rutina
+    """
+    if update_fields is not None and 'exercises' not in update_fields:
+        return
+    sync_routine_exercises([instance])
+
+    previous = getattr(instance, '_previous_contribution', None)
+    if previous is not None:
+        apply_contribution(previous[0], previous[1], -1)
+    apply_contribution(instance.user_id, routine_contribution(instance.generated_at, instance.exercises), 1)
+    instance._previous_contribution = None
+
+
+@receiver(post_save, sender=AIGeneratedRoutine)
+def index_routine_terms(sender, instance, update_fields=None, **kwargs):
+    """
+    Mantiene el índice de búsqueda (RoutineSearchTerm) al crear o editar nombre, prompt o ejercicios
+    """
+    if update_fields is not None and not {'name', 'prompt', 'exercises'} & set(update_fields):
+        return
+    sync_routine_terms([instance])
+
+
+@receiver(post_delete, sender=AIGeneratedRoutine)
+def remove_routine_stats(sender, instance, **kwargs):
+    apply_contribution(instance.user_id, routine_contribution(instance.generated_at, instance.exercises), -1)
+
+
+@receiver(post_save, sender=AIGeneratedRoutine)
+@receiver(post_delete, sender=AIGeneratedRoutine)
+def pin_routine_owner(sender, instance, **kwargs):
+    """
+    Read-your-writes: el dueño lee del primario mientras la réplica se pone al día
+    """
+    pin_primary(instance.user_id)
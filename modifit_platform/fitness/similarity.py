@@ -0,0 +1,304 @@
+"""
+Búsqueda de rutinas parecidas por prompt y ejercicios
+
+Cada rutina se representa con un vector TF-IDF sobre n-gramas hasheados
+(palabras y trigramas de caracteres, sin acentos) de dimensión fija, así el
+vocabulario no hay que mantenerlo y agregar rutinas es O(1). Los vectores
+guardan la frecuencia de términos; el IDF sale de las frecuencias de
+documento globales al momento de consultar y el puntaje es coseno,
+calculado con NumPy sobre todas las filas candidatas a la vez.
+
+El índice vive en memoria en cada worker. Se puede persistir en
+SIMILAR_INDEX_PATH (manage.py build_similarity_index): al cargarlo los
+vectores se abren con mmap y las rutinas nuevas o editadas van a un
+segmento en memoria, que se pone al día por usuario en cada búsqueda
+"""
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .models import AIGeneratedRoutine
+from .exercise_index import exercise_fields
+from .text import STOPWORDS, fold_text
+
+SIMILAR_INDEX_DIM = int(os.getenv("SIMILAR_INDEX_DIM", "1024"))
+SIMILAR_INDEX_PATH = os.getenv("SIMILAR_INDEX_PATH", "")
+FORMAT_VERSION = 1
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Pesos por tipo de rasgo: las palabras pesan más que los trigramas
+WORD_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.3
+
+
+def _features(text: str, weights: Counter) -> None:
+    for word in _WORD.findall(fold_text(text)):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        weights["w:" + word] += WORD_WEIGHT
+        padded = f" {word} "
+        for start in range(len(padded) - 2):
+            weights["c:" + padded[start:start + 3]] += TRIGRAM_WEIGHT
+
+
+def vectorize(text: str, exercises: Optional[Iterable] = None, dim: int = SIMILAR_INDEX_DIM) -> np.ndarray:
+    """
+    Vector de frecuencias (sublineales) de los rasgos hasheados del prompt y
+    de los nombres y músculos de los ejercicios
+    """
+    weights: Counter = Counter()
+    _features(text, weights)
+    for item in exercises or ():
+        fields = exercise_fields(item if isinstance(item, dict) else {"name": item})
+        if fields is not None:
+            _features(f"{fields['name']} {fields['muscle']}", weights)
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, weight in weights.items():
+        # crc32 es estable entre procesos (hash() no): el índice se puede persistir
+        hashed = zlib.crc32(feature.encode("utf-8"))
+        sign = 1.0 if hashed & 0x80000000 else -1.0
+        vector[hashed % dim] += sign * (1.0 + math.log(weight)) if weight >= 1 else sign * weight
+    return vector
+
+
+class SimilarityIndex:
+    """
+    Vectores de las rutinas en dos segmentos: `base` (cargado de disco, solo
+    lectura, puede ser un mmap) y `delta` (en memoria, crece al agregar).
+    Las filas reemplazadas o borradas quedan muertas hasta la próxima
+    reconstrucción
+    """
+
+    def __init__(self, dim: int = SIMILAR_INDEX_DIM):
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._base_vectors = np.zeros((0, dim), dtype=np.float32)
+        self._base_size = 0
+        self._delta_vectors = np.zeros((64, dim), dtype=np.float32)
+        self._delta_size = 0
+        self._df = np.zeros(dim, dtype=np.int64)
+        # id de rutina -> (fila global, versión); usuario -> filas vivas
+        self._rows: Dict[int, Tuple[int, float]] = {}
+        self._row_ids: List[int] = []
+        self._row_users: List[int] = []
+        self._by_user: Dict[int, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _vector(self, row: int) -> np.ndarray:
+        if row < self._base_size:
+            return self._base_vectors[row]
+        return self._delta_vectors[row - self._base_size]
+
+    def _gather(self, rows: List[int]) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        base = rows[rows < self._base_size]
+        delta = rows[rows >= self._base_size] - self._base_size
+        return np.concatenate([self._base_vectors[base], self._delta_vectors[delta]])
+
+    def add(self, routine_id: int, user_id: int, version: float, vector: np.ndarray) -> None:
+        with self._lock:
+            self._discard(routine_id)
+            if self._delta_size == len(self._delta_vectors):
+                grown = np.zeros((len(self._delta_vectors) * 2, self.dim), dtype=np.float32)
+                grown[:self._delta_size] = self._delta_vectors[:self._delta_size]
+                self._delta_vectors = grown
+            self._delta_vectors[self._delta_size] = vector
+            row = self._base_size + self._delta_size
+            self._delta_size += 1
+            self._df += vector != 0
+            self._rows[routine_id] = (row, version)
+            self._row_ids.append(routine_id)
+            self._row_users.append(user_id)
+            self._by_user.setdefault(user_id, set()).add(row)
+
+    def remove(self, routine_id: int) -> None:
+        with self._lock:
+            self._discard(routine_id)
+
+    def _discard(self, routine_id: int) -> None:
+        entry = self._rows.pop(routine_id, None)
+        if entry is None:
+            return
+        row = entry[0]
+        self._df -= self._vector(row) != 0
+        self._by_user.get(self._row_users[row], set()).discard(row)
+
+    def user_versions(self, user_id: int) -> Dict[int, float]:
+        with self._lock:
+            rows = list(self._by_user.get(user_id, ()))
+            return {self._row_ids[row]: self._rows[self._row_ids[row]][1] for row in rows}
+
+    def vector_of(self, routine_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._rows.get(routine_id)
+            return None if entry is None else np.array(self._vector(entry[0]))
+
+    def search(self, vector: np.ndarray, user_id: int, limit: int = 5,
+               exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """
+        Rutinas del usuario ordenadas por similitud coseno TF-IDF con `vector`
+        """
+        with self._lock:
+            rows = sorted(self._by_user.get(user_id, ()))
+            if not rows:
+                return []
+            matrix = self._gather(rows)
+            ids = [self._row_ids[row] for row in rows]
+            n_docs = len(self._rows)
+            df = self._df.copy()
+
+        idf = (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+        query = vector * idf
+        query_norm = float(np.linalg.norm(query))
+        if query_norm == 0.0:
+            return []
+        # ||fila * idf|| sin materializar la matriz ponderada
+        norms = np.sqrt(np.einsum("ij,ij,j->i", matrix, matrix, idf * idf))
+        scores = (matrix @ (query * idf)) / (np.maximum(norms, 1e-12) * query_norm)
+
+        excluded = set(exclude)
+        order = np.argsort(-scores)
+        results = []
+        for position in order:
+            if ids[position] in excluded or scores[position] <= 0:
+                continue
+            results.append((ids[position], float(scores[position])))
+            if len(results) >= limit:
+                break
+        return results
+
+    def save(self, path: str) -> None:
+        """
+        Escribe el índice en `path` (directorio) de forma atómica: se arma en
+        un directorio temporal y se reemplaza el anterior
+        """
+        with self._lock:
+            live = sorted(self._rows.items())
+            vectors = self._gather([row for _, (row, _) in live]) if live else np.zeros((0, self.dim), dtype=np.float32)
+            ids = np.array([routine_id for routine_id, _ in live], dtype=np.int64)
+            users = np.array([self._row_users[row] for _, (row, _) in live], dtype=np.int64)
+            versions = np.array([version for _, (_, version) in live], dtype=np.float64)
+
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".similar-", dir=parent)
+        np.save(os.path.join(staging, "vectors.npy"), vectors)
+        np.save(os.path.join(staging, "ids.npy"), ids)
+        np.save(os.path.join(staging, "users.npy"), users)
+        np.save(os.path.join(staging, "versions.npy"), versions)
+        with open(os.path.join(staging, "meta.json"), "w") as meta:
+            json.dump({"version": FORMAT_VERSION, "dim": self.dim, "size": len(ids)}, meta)
+
+        previous = None
+        if os.path.exists(path):
+            previous = path + ".old"
+            shutil.rmtree(previous, ignore_errors=True)
+            os.replace(path, previous)
+        os.replace(staging, path)
+        if previous:
+            shutil.rmtree(previous, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str) -> "SimilarityIndex":
+        """
+        Carga un índice guardado con save(). Los vectores quedan en un mmap de
+        solo lectura: el worker arranca sin leer el archivo entero
+        """
+        with open(os.path.join(path, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Versión de índice no soportada: {meta.get('version')}")
+
+        index = cls(dim=meta["dim"])
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        ids = np.load(os.path.join(path, "ids.npy"))
+        users = np.load(os.path.join(path, "users.npy"))
+        versions = np.load(os.path.join(path, "versions.npy"))
+
+        index._base_vectors = vectors
+        index._base_size = len(ids)
+        index._row_ids = ids.tolist()
+        index._row_users = users.tolist()
+        for row, (routine_id, user_id, version) in enumerate(zip(index._row_ids, index._row_users, versions.tolist())):
+            index._rows[routine_id] = (row, version)
+            index._by_user.setdefault(user_id, set()).add(row)
+        # df por lotes para no recorrer el mmap fila por fila
+        for start in range(0, index._base_size, 4096):
+            index._df += np.count_nonzero(vectors[start:start + 4096], axis=0)
+        return index
+
+
+def _version(routine_values: Dict) -> float:
+    return routine_values["updated_at"].timestamp()
+
+
+def sync_user(index: SimilarityIndex, user_id: int) -> int:
+    """
+    Pone al día las rutinas del usuario en el índice: agrega las nuevas,
+    revectoriza las editadas y quita las borradas (también las que cambiaron
+    en otro worker). Retorna cuántas filas cambiaron
+    """
+    current = dict(AIGeneratedRoutine.objects.filter(user_id=user_id).values_list("id", "updated_at"))
+    indexed = index.user_versions(user_id)
+
+    stale = [routine_id for routine_id, updated_at in current.items()
+             if indexed.get(routine_id) != updated_at.timestamp()]
+    removed = [routine_id for routine_id in indexed if routine_id not in current]
+    for routine_id in removed:
+        index.remove(routine_id)
+    if stale:
+        for values in AIGeneratedRoutine.objects.filter(id__in=stale).values("id", "prompt", "exercises", "updated_at"):
+            index.add(values["id"], user_id, _version(values),
+                      vectorize(values["prompt"], values["exercises"], index.dim))
+    return len(stale) + len(removed)
+
+
+def build_index(dim: int = SIMILAR_INDEX_DIM, batch_size: int = 1000) -> SimilarityIndex:
+    """
+    Reconstruye el índice completo recorriendo las rutinas por id
+    """
+    index = SimilarityIndex(dim)
+    last_id = 0
+    while True:
+        batch = list(
+            AIGeneratedRoutine.objects.filter(id__gt=last_id).order_by("id")
+            .values("id", "user_id", "prompt", "exercises", "updated_at")[:batch_size]
+        )
+        for values in batch:
+            index.add(values["id"], values["user_id"], _version(values),
+                      vectorize(values["prompt"], values["exercises"], dim))
+        if len(batch) < batch_size:
+            return index
+        last_id = batch[-1]["id"]
+
+
+_index: Optional[SimilarityIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_similarity_index() -> SimilarityIndex:
+    """
+    Índice del proceso: se carga de SIMILAR_INDEX_PATH si existe o arranca
+    vacío (se completa por usuario con sync_user)
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                if SIMILAR_INDEX_PATH and os.path.exists(os.path.join(SIMILAR_INDEX_PATH, "meta.json")):
+                    _index = SimilarityIndex.load(SIMILAR_INDEX_PATH)
+                else:
+                    _index = SimilarityIndex()
+    return _index
@@ -0,0 +1,161 @@
+import copy
+import time
+import asyncio
+import threading
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from django.core.cache import caches
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave: un líder ejecuta la
+    función y el resto espera su resultado.
+
+    Dentro del proceso se coordina con hilos. Con `distributed=True` además
+    toma un lock en la caché de Django para que los líderes de otros
+    procesos esperen; cuando el lock se libera, `lookup` busca el resultado
+    que el líder dejó (por ejemplo en la caché compartida de generaciones)
+    """
+
+    def __init__(self, distributed: bool = False, alias: str = "default",
+                 lock_timeout: int = 120, poll_interval: float = 0.25):
+        self.distributed = distributed
+        self.alias = alias
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "followers": 0, "remote_followers": 0}
+
+    def do(self, key: str, fn: Callable[[], Any],
+           lookup: Optional[Callable[[], Any]] = None) -> Tuple[Any, bool]:
+        """
+        Ejecuta fn una sola vez por clave entre las llamadas concurrentes.
+        Retorna (resultado, compartido) donde compartido indica que el
+        resultado lo produjo otra llamada
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight()
+                self._flights[key] = flight
+                leader = True
+                self._stats["leaders"] += 1
+            else:
+                flight.followers += 1
+                leader = False
+                self._stats["followers"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result), True
+
+        try:
+            flight.result, shared = self._lead(key, fn, lookup)
+            return flight.result, shared
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _lead(self, key: str, fn: Callable[[], Any],
+              lookup: Optional[Callable[[], Any]]) -> Tuple[Any, bool]:
+        cache = self._cache()
+        if cache is None:
+            return fn(), False
+
+        lock_key = f"single_flight:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        while not cache.add(lock_key, token, self.lock_timeout):
+            # Otro proceso es el líder: esperar a que suelte el lock
+            if time.monotonic() >= deadline:
+                return fn(), False
+            time.sleep(self.poll_interval)
+            if cache.get(lock_key) is None and lookup is not None:
+                result = lookup()
+                if result is not None:
+                    with self._lock:
+                        self._stats["remote_followers"] += 1
+                    return result, True
+
+        try:
+            return fn(), False
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    def _cache(self):
+        if not self.distributed:
+            return None
+        try:
+            return caches[self.alias]
+        except Exception:
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._flights)
+        stats["distributed"] = self.distributed
+        return stats
+
+
+class AsyncSingleFlight:
+    """
+    Equivalente de SingleFlight para corrutinas: las llamadas concurrentes
+    con la misma clave en un event loop esperan la tarea del líder en vez
+    de bloquear un hilo. La llamada corre en su propia tarea: si el líder se
+    cancela (el cliente se desconectó) los seguidores siguen esperándola
+    """
+
+    def __init__(self):
+        self._flights: Dict[Tuple[int, str], asyncio.Task] = {}
+        self._stats = {"leaders": 0, "followers": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Ejecuta fn una sola vez por clave entre las corrutinas concurrentes.
+        Retorna (resultado, compartido) como SingleFlight.do
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        task = self._flights.get(flight_key)
+        if task is not None:
+            self._stats["followers"] += 1
+            # shield: cancelar a un seguidor no cancela la llamada compartida
+            result = await asyncio.shield(task)
+            return copy.deepcopy(result), True
+
+        task = loop.create_task(fn())
+        self._flights[flight_key] = task
+        task.add_done_callback(lambda done: self._finish(flight_key, done))
+        self._stats["leaders"] += 1
+        return await asyncio.shield(task), False
+
+    def _finish(self, flight_key: Tuple[int, str], task: asyncio.Task) -> None:
+        if self._flights.get(flight_key) is task:
+            del self._flights[flight_key]
+        # Evita el aviso de "exception was never retrieved" si nadie la esperó
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["in_flight"] = len(self._flights)
+        return stats
@@ -0,0 +1,191 @@
+import re
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Tuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from .models import AIGeneratedRoutine, TrainingStat
+from .exercise_index import exercise_fields
+
+COUNTERS = ("routines", "exercises", "sets", "reps")
+
+StatKey = Tuple[date, str, str]
+
+
+def week_start(moment: datetime) -> date:
+    """
+    Lunes de la semana de la fecha dada
+    """
+    day = timezone.localtime(moment).date() if timezone.is_aware(moment) else moment.date()
+    return day - timedelta(days=day.weekday())
+
+
+def _reps_number(reps: str) -> int:
+    match = re.search(r"\d+", reps or "")
+    return int(match.group()) if match else 0
+
+
+def routine_contribution(generated_at: datetime, exercises: Any) -> Dict[StatKey, Dict[str, Any]]:
+    """
+    Aporte de una rutina a los acumulados: totales de la semana, por músculo y por ejercicio
+    """
+    week = week_start(generated_at)
+    contribution: Dict[StatKey, Dict[str, Any]] = {}
+
+    def add(kind, key, label, exercises_count, sets, reps):
+        entry = contribution.get((week, kind, key))
+        if entry is None:
+            entry = contribution[(week, kind, key)] = {
+                "label": label, "routines": 1, "exercises": 0, "sets": 0, "reps": 0
+            }
+        entry["exercises"] += exercises_count
+        entry["sets"] += sets
+        entry["reps"] += reps
+
+    add(TrainingStat.KIND_TOTAL, "", "", 0, 0, 0)
+    for item in exercises if isinstance(exercises, list) else []:
+        fields = exercise_fields(item)
+        if fields is None:
+            continue
+        sets = fields["series"] or 0
+        reps = sets * _reps_number(fields["reps"])
+        add(TrainingStat.KIND_TOTAL, "", "", 1, sets, reps)
+        add(TrainingStat.KIND_EXERCISE, fields["name_normalized"], fields["name"], 1, sets, reps)
+        if fields["muscle"]:
+            add(TrainingStat.KIND_MUSCLE, fields["muscle"], fields["muscle"], 1, sets, reps)
+    return contribution
+
+
+def apply_contribution(user_id: int, contribution: Dict[StatKey, Dict[str, Any]], sign: int) -> None:
+    """
+    Suma (sign=1) o resta (sign=-1) un aporte a la tabla de acumulados con
+    updates atómicos. Las filas que quedan sin rutinas se eliminan
+    """
+    if not contribution:
+        return
+    with transaction.atomic():
+        for (week, kind, key), values in contribution.items():
+            rows = TrainingStat.objects.filter(user_id=user_id, week=week, kind=kind, key=key)
+            deltas = {field: F(field) + sign * values[field] for field in COUNTERS}
+            if rows.update(**deltas) or sign < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    TrainingStat.objects.create(
+                        user_id=user_id, week=week, kind=kind, key=key, label=values["label"][:255],
+                        **{field: values[field] for field in COUNTERS}
+                    )
+            except IntegrityError:
+                # Otro proceso creó la fila entre el update y el create
+                rows.update(**deltas)
+
+        if sign < 0:
+            weeks = {week for week, _, _ in contribution}
+            TrainingStat.objects.filter(user_id=user_id, week__in=weeks, routines__lte=0).delete()
+
+
+def compute_user_stats(routines: Iterable[AIGeneratedRoutine]) -> Dict[StatKey, Dict[str, Any]]:
+    """
+    Recalcula desde cero los acumulados de un conjunto de rutinas
+    """
+    totals: Dict[StatKey, Dict[str, Any]] = defaultdict(lambda: {"label": "", "routines": 0, "exercises": 0, "sets": 0, "reps": 0})
+    for routine in routines:
+        for stat_key, values in routine_contribution(routine.generated_at, routine.exercises).items():
+            entry = totals[stat_key]
+            entry["label"] = entry["label"] or values["label"]
+            for field in COUNTERS:
+                entry[field] += values[field]
+    return dict(totals)
+
+
+def rebuild_user_stats(user_id: int, verify_only: bool = False) -> Dict[str, int]:
+    """
+    Recalcula los acumulados de un usuario y los compara con los guardados.
+    Si verify_only es False reemplaza las filas guardadas por las recalculadas
+    """
+    routines = AIGeneratedRoutine.objects.filter(user_id=user_id).only('id', 'generated_at', 'exercises')
+    expected = compute_user_stats(routines.iterator(chunk_size=500))
+
+    stored = {
+        (row.week, row.kind, row.key): row
+        for row in TrainingStat.objects.filter(user_id=user_id)
+    }
+    mismatches = sum(
+        1 for stat_key in set(expected) | set(stored)
+        if stat_key not in expected or stat_key not in stored
+        or any(getattr(stored[stat_key], field) != expected[stat_key][field] for field in COUNTERS)
+    )
+
+    if mismatches and not verify_only:
+        with transaction.atomic():
+            TrainingStat.objects.filter(user_id=user_id).delete()
+            TrainingStat.objects.bulk_create([
+                TrainingStat(
+                    user_id=user_id, week=week, kind=kind, key=key, label=values["label"][:255],
+                    **{field: values[field] for field in COUNTERS}
+                )
+                for (week, kind, key), values in expected.items()
+            ], batch_size=500)
+
+    return {"rows": len(expected), "mismatches": mismatches}
+
+
+def user_stats_summary(user, weeks: int = 12, top: int = 10) -> Dict[str, Any]:
+    """
+    Resumen para /api/fitness/stats/ leído solo de la tabla de acumulados
+    """
+    stats = TrainingStat.objects.filter(user=user)
+    sums = {field: Sum(field) for field in COUNTERS}
+
+    totals = stats.filter(kind=TrainingStat.KIND_TOTAL).aggregate(**sums)
+    muscles = (
+        stats.filter(kind=TrainingStat.KIND_MUSCLE)
+        .values('key')
+        .annotate(**sums)
+        .order_by('-sets', 'key')
+    )
+    top_exercises = (
+        stats.filter(kind=TrainingStat.KIND_EXERCISE)
+        .values('key')
+        .annotate(label=Max('label'), **sums)
+        .order_by('-exercises', '-sets', 'key')[:top]
+    )
+
+    recent_weeks = list(
+        stats.filter(kind=TrainingStat.KIND_TOTAL)
+        .order_by('-week')
+        .values_list('week', flat=True)[:weeks]
+    )
+    by_week: Dict[date, Dict[str, Any]] = {
+        week: {"week": week.isoformat(), "muscles": [], "top_exercises": []}
+        for week in recent_weeks
+    }
+    exercise_rows: Dict[date, List[Dict[str, Any]]] = defaultdict(list)
+    for row in stats.filter(week__in=recent_weeks).order_by('-week', '-sets', 'key'):
+        entry = by_week[row.week]
+        values = {field: getattr(row, field) for field in COUNTERS}
+        if row.kind == TrainingStat.KIND_TOTAL:
+            entry.update(values)
+        elif row.kind == TrainingStat.KIND_MUSCLE:
+            entry["muscles"].append(dict(values, muscle=row.key))
+        else:
+            exercise_rows[row.week].append(dict(values, exercise=row.label or row.key))
+    for week, rows in exercise_rows.items():
+        rows.sort(key=lambda row: (-row["exercises"], -row["sets"]))
+        by_week[week]["top_exercises"] = rows[:5]
+
+    return {
+        "totals": {field: totals[field] or 0 for field in COUNTERS},
+        "muscles": [
+            {"muscle": row['key'], **{field: row[field] or 0 for field in COUNTERS}}
+            for row in muscles
+        ],
+        "top_exercises": [
+            {"exercise": row['label'] or row['key'], **{field: row[field] or 0 for field in COUNTERS}}
+            for row in top_exercises
+        ],
+        "weeks": [by_week[week] for week in recent_weeks],
+    }
@@ -1,3 +1,1557 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+from asgiref.sync import async_to_sync
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import DatabaseError, connections, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+
+from authe.models import User
+from authe.tokens import tokens_for_user
+from modifit_platform.compression import CompressionMiddleware, brotli, negotiate, zstandard
+from modifit_platform.db_router import (
+    PrimaryReplicaRouter, areplica_reads, is_pinned, pin_primary, replica_health, replica_reads,
+)
+from . import fallback, model_pool, prompting, similarity
+from .async_views import AsyncGenerateAIRoutineView, AsyncRoutineDetailView
+from .ai_service import AIFitnessService, GenerationCache
+from .batch import save_batch
+from .export import agzip_lines, andjson_lines, gzip_lines, ndjson_lines
+from .http_client import CircuitBreaker, CircuitOpenError, ModelHTTPClient, ModelUnavailableError, PoolTimeoutError
+from .jobs import GenerationJobPool, run_job
+from .model_pool import ModelBackend, ModelBackendPool, PoolSaturatedError
+from .models import AIGeneratedRoutine, RoutineExercise, RoutineGenerationJob, RoutineSearchTerm, TrainingStat
+from .pagination import encode_cursor
+from .parsing import ExerciseStreamParser, parse_exercises
+from .prompting import TokenBudget, shape_request
+from .renderers import format_sse
+from .single_flight import AsyncSingleFlight, SingleFlight
+from .stats import rebuild_user_stats
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Corre con modifit_platform.test_settings: `default` y `replica` son dos
+    bases SQLite distintas, así que cada lectura muestra de cuál salió
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        replica_health.reset()
+        self.user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+        User.objects.db_manager('replica').create_user('ana', 'ana@example.com', 'password123', id=self.user.id)
+        # La réplica "atrasada": tiene una rutina distinta a la del primario
+        AIGeneratedRoutine.objects.using('replica').bulk_create([
+            AIGeneratedRoutine(user_id=self.user.id, name='en réplica', prompt='p', exercises=[])
+        ])
+        AIGeneratedRoutine.objects.bulk_create([
+            AIGeneratedRoutine(user_id=self.user.id, name='en primario', prompt='p', exercises=[])
+        ])
+        # Las altas de arriba fijaron al usuario al primario
+        caches['shared'].clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens_for_user(self.user).access_token}')
+
+    def _listed_names(self):
+        response = self.client.get(reverse('fitness:user-routines'))
+        self.assertEqual(response.status_code, 200)
+        return [routine['name'] for routine in response.json()['routines']]
+
+    def test_list_reads_from_replica(self):
+        self.assertEqual(self._listed_names(), ['en réplica'])
+
+    def test_detail_reads_from_replica(self):
+        routine = AIGeneratedRoutine.objects.using('replica').get()
+        response = self.client.get(reverse('fitness:routine-detail', args=[routine.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['routine']['name'], 'en réplica')
+
+    def test_write_pins_user_to_primary(self):
+        AIGeneratedRoutine.objects.create(user=self.user, name='recién generada', prompt='p', exercises=[])
+        self.assertEqual(sorted(self._listed_names()), ['en primario', 'recién generada'])
+
+    def test_pin_expires(self):
+        with self.settings(DATABASE_REPLICA_PIN_SECONDS=0.01):
+            AIGeneratedRoutine.objects.create(user=self.user, name='recién generada', prompt='p', exercises=[])
+        time.sleep(0.05)
+        self.assertEqual(self._listed_names(), ['en réplica'])
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        with mock.patch.object(replica_health, '_check', return_value=False):
+            self.assertEqual(self._listed_names(), ['en primario'])
+
+    def test_jwt_user_lookup_uses_primary(self):
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        with self.settings(AUTH_JWT_USER_CLAIMS=False):
+            response = self.client.get(reverse('authe:profile'))
+        # Sigue activo en la réplica atrasada, pero el primario manda
+        self.assertEqual(response.status_code, 401)
+
+    def test_pin_is_seen_by_other_workers(self):
+        pin_primary(self.user.id)
+        with self.settings(DATABASE_PIN_CACHE_ALIAS='shared_b'):
+            self.assertTrue(is_pinned(self.user.id))
+            with replica_reads(self.user.id) as alias:
+                self.assertIsNone(alias)
+
+    def test_local_pin_cache_disables_replicas(self):
+        with self.settings(DATABASE_PIN_CACHE_ALIAS='default'):
+            self.assertEqual(self._listed_names(), ['en primario'])
+
+    def test_router(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(AIGeneratedRoutine), 'default')
+        with replica_reads(self.user.id):
+            self.assertEqual(router.db_for_read(AIGeneratedRoutine), 'replica')
+            self.assertEqual(router.db_for_write(AIGeneratedRoutine), 'default')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(AIGeneratedRoutine), 'default')
+        self.assertTrue(connections['replica'].is_usable())
+
+    def test_async_scope(self):
+        async def read_names():
+            async with areplica_reads(self.user.id):
+                return [name async for name in AIGeneratedRoutine.objects.values_list('name', flat=True)]
+
+        self.assertEqual(async_to_sync(read_names)(), ['en réplica'])
+
+
+class GenerationCacheTests(SimpleTestCase):
+    """
+    Cada GenerationCache hace de un worker distinto (su LRU es del proceso)
+    """
+
+    def setUp(self):
+        caches['shared'].clear()
+
+    def test_shared_tier_is_seen_by_other_workers(self):
+        GenerationCache(alias='shared').set('k', {'exercises': [1]})
+        other = GenerationCache(alias='shared_b')
+        self.assertEqual(other.get('k'), {'exercises': [1]})
+        self.assertEqual(other.stats()['shared_hits'], 1)
+        self.assertTrue(other.stats()['shared'])
+
+    def test_local_cache_is_not_used_as_shared_tier(self):
+        GenerationCache(alias='default').set('k', {'exercises': [1]})
+        other = GenerationCache(alias='default')
+        self.assertIsNone(other.get('k'))
+        self.assertFalse(other.stats()['shared'])
+        self.assertIsNone(caches['default'].get('k'))
+
+
+class StaleJobRecoveryTests(TestCase):
+
+    def test_stale_jobs_are_requeued_until_max_attempts(self):
+        user = User.objects.create_user('leo', 'leo@example.com', 'password123')
+        started = timezone.now() - timedelta(hours=1)
+        retry = RoutineGenerationJob.objects.create(
+            user=user, prompt='p', routine_name='retry', status=RoutineGenerationJob.STATUS_RUNNING,
+            attempts=1, started_at=started
+        )
+        exhausted = RoutineGenerationJob.objects.create(
+            user=user, prompt='p', routine_name='exhausted', status=RoutineGenerationJob.STATUS_RUNNING,
+            attempts=3, started_at=started
+        )
+        recent = RoutineGenerationJob.objects.create(
+            user=user, prompt='p', routine_name='recent', status=RoutineGenerationJob.STATUS_RUNNING,
+            attempts=1, started_at=timezone.now()
+        )
+
+        self.assertEqual(GenerationJobPool(workers=0, max_attempts=3).recover_stale_jobs(), 1)
+        for job in (retry, exhausted, recent):
+            job.refresh_from_db()
+        self.assertEqual(retry.status, RoutineGenerationJob.STATUS_QUEUED)
+        self.assertEqual(exhausted.status, RoutineGenerationJob.STATUS_FAILED)
+        self.assertIsNotNone(exhausted.finished_at)
+        self.assertEqual(recent.status, RoutineGenerationJob.STATUS_RUNNING)
+
+
+class GenerationJobRequestTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('leo', 'leo@example.com', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _post(self, **data):
+        return self.client.post(reverse('fitness:generate-routine'), dict(
+            prompt='rutina de piernas para fuerza', async_mode=True, **data
+        ), format='json')
+
+    def test_size_is_kept_on_the_job(self):
+        response = self._post(size=5)
+        self.assertEqual(response.status_code, 202)
+        job = RoutineGenerationJob.objects.get(id=response.json()['job']['id'])
+        self.assertEqual(job.size, 5)
+
+        with mock.patch.object(AIFitnessService, 'generate_exercises', side_effect=_model_result) as generate:
+            run_job(job)
+        generate.assert_called_once_with(job.prompt, use_cache=True, size=5)
+        self.assertEqual(job.status, RoutineGenerationJob.STATUS_DONE)
+
+    def test_deadline_options_are_rejected(self):
+        self.assertEqual(self._post(deadline_ms=500).status_code, 400)
+        self.assertEqual(self._post(replace_fallback=True).status_code, 400)
+        self.assertFalse(RoutineGenerationJob.objects.exists())
+
+
+def _ok_response(*args, **kwargs):
+    response = mock.Mock(status_code=200)
+    response.close = mock.Mock()
+    return response
+
+
+class ModelHTTPClientPoolTests(SimpleTestCase):
+
+    def test_exhausted_pool_times_out_without_tripping_breaker(self):
+        client = ModelHTTPClient(pool_size=1, pool_timeout=0.05, breaker=CircuitBreaker(failure_threshold=1))
+        release = threading.Event()
+
+        def slow_post(*args, **kwargs):
+            release.wait(1)
+            return _ok_response()
+
+        with mock.patch.object(client.session, 'post', side_effect=slow_post):
+            holder = threading.Thread(target=client.post, args=('http://model/',))
+            holder.start()
+            time.sleep(0.02)
+            with self.assertRaises(PoolTimeoutError):
+                client.post('http://model/')
+            release.set()
+            holder.join()
+            self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+            self.assertEqual(client.post('http://model/').status_code, 200)
+
+    def test_stream_holds_connection_until_closed(self):
+        client = ModelHTTPClient(pool_size=1, pool_timeout=0.05)
+        with mock.patch.object(client.session, 'post', side_effect=_ok_response):
+            response = client.post('http://model/', stream=True)
+            with self.assertRaises(PoolTimeoutError):
+                client.post('http://model/')
+            response.close()
+            response.close()
+            client.post('http://model/')
+            client.post('http://model/')
+
+
+def _response(status_code, name=''):
+    response = _ok_response()
+    response.status_code = status_code
+    response.backend = name
+    return response
+
+
+class ModelBackendPoolTests(SimpleTestCase):
+
+    def _pool(self, weights=(2, 1), **kwargs):
+        backends = [
+            ModelBackend(f'http://{name}/', 'modelo', 'token', weight=weight, name=name, max_concurrency=4)
+            for name, weight in zip('ab', weights)
+        ]
+        return ModelBackendPool(backends, **kwargs)
+
+    def _hedging_pool(self, primary_post, hedge_post):
+        """
+        Pool de dos backends con hedging tras ~10 ms; `a` es siempre el primario
+        """
+        pool = self._pool(hedge_percentile=50, hedge_min_samples=1)
+        primary, hedge = pool.backends
+        for backend in pool.backends:
+            backend.record(0.01, True)
+        primary.client.post = mock.Mock(side_effect=primary_post)
+        hedge.client.post = mock.Mock(side_effect=hedge_post)
+        return pool, primary, hedge
+
+    @staticmethod
+    def _failures_first(done):
+        def failed(future):
+            return future.exception() is not None or future.result().status_code >= 500
+        return sorted(done, key=lambda future: not failed(future))
+
+    def _same_round_wait(self):
+        """
+        wait() que deja terminar a todas antes de devolver (las dos solicitudes
+        terminan en la misma vuelta del hedging) y pone primero las fallidas
+        """
+        real_wait = model_pool.wait
+
+        def same_round(futures, timeout=None, return_when=ALL_COMPLETED):
+            if return_when != FIRST_COMPLETED:
+                return real_wait(futures, timeout=timeout, return_when=return_when)
+            done, pending = real_wait(futures)
+            return self._failures_first(done), pending
+        return mock.patch.object(model_pool, 'wait', side_effect=same_round)
+
+    def test_selection_follows_weights(self):
+        pool = self._pool(weights=(3, 1))
+        picks = []
+        for _ in range(400):
+            backend = pool.acquire()
+            picks.append(backend.name)
+            pool._release(backend)
+        self.assertEqual(picks.count('a'), 300)
+        self.assertEqual(picks.count('b'), 100)
+
+    def test_busy_backend_loses_share(self):
+        pool = self._pool(weights=(1, 1))
+        held = pool.acquire()
+        picks = [pool.acquire() for _ in range(3)]
+        self.assertEqual(sum(backend is held for backend in picks), 1)
+
+    def test_saturation_is_not_reported_as_open_circuit(self):
+        pool = self._pool(queue_timeout=0.05)
+        for _ in range(8):
+            pool.acquire()
+        with self.assertRaises(PoolSaturatedError) as raised:
+            pool.acquire()
+        self.assertNotIsInstance(raised.exception, CircuitOpenError)
+        self.assertIsInstance(raised.exception, ModelUnavailableError)
+
+    def test_async_calls_have_their_own_limit(self):
+        backend = ModelBackend('http://a/', 'modelo', 'token', max_concurrency=2, async_max_concurrency=50)
+        pool = ModelBackendPool([backend], queue_timeout=0.05)
+
+        async def acquire_many():
+            return await asyncio.gather(*(pool.aacquire() for _ in range(20)))
+
+        self.assertEqual(len(async_to_sync(acquire_many)()), 20)
+        self.assertEqual((backend.async_outstanding, backend.outstanding), (20, 0))
+        # Los hilos siguen acotados por max_concurrency
+        pool.acquire()
+        pool.acquire()
+        with self.assertRaises(PoolSaturatedError):
+            pool.acquire()
+        pool._release(backend, asynchronous=True)
+        self.assertEqual(backend.async_outstanding, 19)
+
+    def test_open_circuits_are_reported(self):
+        pool = self._pool()
+        for backend in pool.backends:
+            for _ in range(backend.breaker.failure_threshold):
+                backend.breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            pool.acquire()
+
+    def test_hedge_wins_when_primary_is_slow(self):
+        def slow(*args, **kwargs):
+            time.sleep(0.3)
+            return _response(200, 'a')
+
+        pool, primary, hedge = self._hedging_pool(slow, lambda *a, **k: _response(200, 'b'))
+        self.assertEqual(pool.post({}).backend, 'b')
+        self.assertEqual(hedge.stats()['hedge_wins'], 1)
+        self.assertEqual(hedge.stats()['hedges'], 1)
+
+    def test_primary_wins_over_slower_hedge(self):
+        def primary_post(*args, **kwargs):
+            time.sleep(0.05)
+            return _response(200, 'a')
+
+        def hedge_post(*args, **kwargs):
+            time.sleep(0.3)
+            return _response(200, 'b')
+
+        pool, primary, hedge = self._hedging_pool(primary_post, hedge_post)
+        self.assertEqual(pool.post({}).backend, 'a')
+        self.assertEqual(hedge.stats()['hedge_wins'], 0)
+
+    def test_failed_primary_does_not_hide_hedge_finishing_together(self):
+        def primary_post(*args, **kwargs):
+            time.sleep(0.05)
+            return _response(503, 'a')
+
+        pool, primary, hedge = self._hedging_pool(primary_post, lambda *a, **k: _response(200, 'b'))
+        with self._same_round_wait():
+            self.assertEqual(pool.post({}).backend, 'b')
+        self.assertEqual(hedge.stats()['hedge_wins'], 1)
+
+    def test_raising_hedge_does_not_hide_primary_finishing_together(self):
+        def primary_post(*args, **kwargs):
+            time.sleep(0.05)
+            return _response(200, 'a')
+
+        def hedge_post(*args, **kwargs):
+            raise requests.ConnectionError('caído')
+
+        pool, primary, hedge = self._hedging_pool(primary_post, hedge_post)
+        with self._same_round_wait():
+            self.assertEqual(pool.post({}).backend, 'a')
+
+    def test_last_failure_is_returned_when_both_fail(self):
+        def primary_post(*args, **kwargs):
+            time.sleep(0.05)
+            raise requests.ConnectionError('caído')
+
+        pool, primary, hedge = self._hedging_pool(primary_post, lambda *a, **k: _response(502, 'b'))
+        with self._same_round_wait():
+            response = pool.post({})
+        self.assertEqual((response.backend, response.status_code), ('b', 502))
+        self.assertEqual(hedge.stats()['hedge_wins'], 0)
+
+    def test_async_failed_primary_does_not_hide_hedge_finishing_together(self):
+        pool = self._pool(hedge_percentile=50, hedge_min_samples=1)
+        primary, hedge = pool.backends
+        for backend in pool.backends:
+            backend.record(0.01, True)
+        hedge_done = asyncio.Event()
+
+        async def primary_post(*args, **kwargs):
+            await hedge_done.wait()
+            return _response(503, 'a')
+
+        async def hedge_post(*args, **kwargs):
+            hedge_done.set()
+            return _response(200, 'b')
+
+        clients = {primary: mock.Mock(post=primary_post), hedge: mock.Mock(post=hedge_post)}
+        real_wait = asyncio.wait
+
+        async def same_round(tasks, timeout=None, return_when=asyncio.ALL_COMPLETED):
+            if return_when != asyncio.FIRST_COMPLETED:
+                return await real_wait(tasks, timeout=timeout, return_when=return_when)
+            done, pending = await real_wait(tasks)
+            return self._failures_first(done), pending
+
+        with mock.patch.object(ModelBackend, 'async_client', autospec=True, side_effect=lambda backend: clients[backend]), \
+                mock.patch.object(model_pool.asyncio, 'wait', side_effect=same_round):
+            response = async_to_sync(pool.apost)({})
+        self.assertEqual(response.backend, 'b')
+        self.assertEqual(hedge.stats()['hedge_wins'], 1)
+
+
+class DeadlineQueueTests(SimpleTestCase):
+
+    def test_hung_model_does_not_queue_without_limit(self):
+        release = threading.Event()
+        service = mock.Mock()
+        service.generate_exercises.side_effect = lambda *args, **kwargs: release.wait(2) and {'status': 'success'}
+        executor = fallback.DeadlineExecutor(workers=1, max_queue=1)
+        self.addCleanup(release.set)
+
+        with mock.patch.object(fallback, 'deadline_executor', executor):
+            results = [fallback.race_model(service, 'p', True, None, 0.02) for _ in range(3)]
+        reasons = [fallback.fallback_reason(result, pending) for result, pending in results]
+        self.assertEqual(reasons, ['deadline', 'not_started', 'not_started'])
+        self.assertIsNone(results[2][1])
+        self.assertEqual(service.generate_exercises.call_count, 1)
+        self.assertEqual(executor.stats(), {'workers': 1, 'max_queue': 1, 'running': 1, 'queued': 1, 'rejected': 1})
+
+        # Sin rutina que reemplazar la llamada encolada se cancela y libera la cola
+        fallback.finish_in_background(results[1][1], None)
+        self.assertTrue(results[1][1].cancelled())
+        self.assertEqual(executor.stats()['queued'], 0)
+
+    def test_error_is_not_counted_as_not_started(self):
+        self.assertEqual(fallback.fallback_reason({'status': 'error'}, None), 'error')
+
+
+MODEL_EXERCISES = [{'name': 'Sentadilla del modelo', 'series': 4, 'reps': 8}]
+
+
+def _model_result(*args, **kwargs):
+    return {'status': 'success', 'exercises': MODEL_EXERCISES, 'raw_response': '', 'cached': False}
+
+
+class DeadlineFallbackTests(TransactionTestCase):
+    """
+    TransactionTestCase: la llamada al modelo y el reemplazo corren en los
+    hilos de fallback.deadline_executor
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.release = threading.Event()
+        # Un pool propio: al terminar se esperan las llamadas y reemplazos
+        # pendientes antes de vaciar la base
+        executor = fallback.DeadlineExecutor(workers=2, max_queue=2)
+        patcher = mock.patch.object(fallback, 'deadline_executor', executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(executor._executor.shutdown)
+        self.addCleanup(self.release.set)
+
+    def _slow_model(self, *args, **kwargs):
+        self.release.wait(2)
+        return _model_result()
+
+    def _generate(self, model, **data):
+        with mock.patch.object(AIFitnessService, 'generate_exercises', side_effect=model):
+            response = self.client.post(reverse('fitness:generate-routine'), dict(
+                prompt='rutina de piernas para fuerza', deadline_ms=50, **data
+            ), format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def _wait_for(self, condition):
+        deadline = time.monotonic() + 2
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_deadline_serves_local_routine(self):
+        data = self._generate(self._slow_model)
+        self.assertEqual((data['fallback'], data['fallback_reason'], data['replacement']), (True, 'deadline', None))
+        routine = AIGeneratedRoutine.objects.get(id=data['routine']['id'])
+        self.assertTrue(routine.fallback)
+        self.assertTrue(routine.exercises)
+        self.assertNotEqual(routine.exercises, MODEL_EXERCISES)
+
+    def test_late_result_replaces_exercises(self):
+        data = self._generate(self._slow_model, replace_fallback=True)
+        self.assertEqual(data['replacement'], 'pending')
+        self.release.set()
+        routine = AIGeneratedRoutine.objects.filter(id=data['routine']['id'])
+        self.assertTrue(self._wait_for(lambda: not routine.get().fallback))
+        self.assertEqual(routine.get().exercises, MODEL_EXERCISES)
+
+    def test_result_ready_while_saving_fallback_is_applied_inline(self):
+        def model(*args, **kwargs):
+            time.sleep(0.1)
+            return _model_result()
+
+        real_fallback = fallback.generate_fallback
+
+        def slow_fallback(*args, **kwargs):
+            time.sleep(0.3)
+            return real_fallback(*args, **kwargs)
+
+        with mock.patch('fitness.views.generate_fallback', side_effect=slow_fallback), \
+                mock.patch.object(fallback.connection, 'close') as close:
+            data = self._generate(model, replace_fallback=True)
+        self.assertEqual(data['replacement'], 'replaced')
+        self.assertEqual(data['routine']['exercises'], MODEL_EXERCISES)
+        self.assertFalse(AIGeneratedRoutine.objects.get(id=data['routine']['id']).fallback)
+        close.assert_not_called()
+
+    def test_failed_model_call_records_reason(self):
+        errors = fallback.fallback_stats.stats()['error']
+        data = self._generate(lambda *args, **kwargs: {'status': 'error', 'message': 'caído'})
+        self.assertEqual((data['fallback_reason'], data['replacement']), ('error', None))
+        self.assertEqual(fallback.fallback_stats.stats()['error'], errors + 1)
+
+
+class FallbackGeneratorTests(SimpleTestCase):
+
+    def test_routine_follows_prompt(self):
+        with mock.patch.object(fallback, 'load_catalog', side_effect=fallback._builtin_catalog):
+            result = fallback.generate_fallback('rutina de pecho y espalda 3 días para fuerza', size=6)
+        self.assertEqual(result['status'], 'success')
+        self.assertTrue(result['fallback'])
+        self.assertEqual(len(result['exercises']), 6)
+        self.assertEqual({exercise['day'] for exercise in result['exercises']}, {'Día 1', 'Día 2', 'Día 3'})
+        self.assertLessEqual({exercise['muscle'] for exercise in result['exercises']}, {'Pecho', 'Espalda'})
+        self.assertEqual({(exercise['series'], exercise['reps']) for exercise in result['exercises']}, {(5, '5')})
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_fresh_request_does_not_take_remote_leader_result(self):
+        caches['shared'].clear()
+        service = AIFitnessService()
+        service.cache = GenerationCache(alias='shared')
+        service.flights = SingleFlight(distributed=True, alias='shared', poll_interval=0.01)
+        shape = service.shape('rutina de piernas')
+        cache_key = service._cache_key('rutina de piernas', shape)
+
+        # Otro proceso es el líder: deja su resultado en la caché y suelta el lock
+        service.cache.set(cache_key, {'status': 'success', 'exercises': ['vieja']})
+        caches['shared'].add(f'single_flight:{cache_key}', 'otro', 5)
+        threading.Timer(0.05, caches['shared'].delete, args=[f'single_flight:{cache_key}']).start()
+
+        fresh = {'status': 'success', 'exercises': ['nueva']}
+        with mock.patch.object(service, '_generate_exercises', return_value=fresh):
+            result = service.generate_exercises('rutina de piernas', use_cache=False)
+        self.assertEqual(result['exercises'], ['nueva'])
+        self.assertFalse(result['coalesced'])
+
+    def test_cancelled_async_leader_does_not_cancel_followers(self):
+        flights = AsyncSingleFlight()
+
+        async def call():
+            await asyncio.sleep(0.05)
+            return {'exercises': [1]}
+
+        async def scenario():
+            leader = asyncio.ensure_future(flights.do('k', call))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flights.do('k', call))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            result = await follower
+            return leader.cancelled(), result, flights.stats()['in_flight']
+
+        cancelled, result, in_flight = asyncio.run(scenario())
+        self.assertTrue(cancelled)
+        self.assertEqual(result, ({'exercises': [1]}, True))
+        self.assertEqual(in_flight, 0)
+
+
+class ExerciseParserTests(SimpleTestCase):
+
+    def test_prose_around_json(self):
+        parser = ExerciseStreamParser()
+        parser.feed('Claro, aquí tienes tu rutina:\n{"exercises": [{"nombre": "Sentadilla", "sets": "4", "reps": "8-12"}]}\n¡Éxitos!')
+        self.assertEqual(parser.close(), [{'name': 'Sentadilla', 'series': 4, 'reps': '8-12'}])
+        self.assertEqual(parser.method, 'json')
+
+    def test_truncated_json_keeps_closed_exercises(self):
+        parser = ExerciseStreamParser()
+        parser.feed('{"exercises": [{"name": "Remo", "series": 3, "reps": 10}, {"name": "Dominadas", "ser')
+        self.assertEqual(parser.close(), [{'name': 'Remo', 'series': 3, 'reps': 10}])
+        self.assertEqual(parser.method, 'partial_json')
+
+    def test_exercises_are_emitted_as_chunks_arrive(self):
+        parser = ExerciseStreamParser()
+        text = '```json\n{"days": [{"day": "Lunes", "exercises": [{"name": "Press {banca}", "series": 4}, {"name": "Fondos"}]}]}\n```'
+        emitted = []
+        for start in range(0, len(text), 7):
+            emitted += parser.feed(text[start:start + 7])
+        self.assertEqual([exercise['name'] for exercise in emitted], ['Press {banca}', 'Fondos'])
+        self.assertEqual([exercise['day'] for exercise in parser.close()], ['Lunes', 'Lunes'])
+
+    def test_object_without_exercises_is_normalized(self):
+        parser = ExerciseStreamParser()
+        parser.feed('{"plan": {"nivel": "alto"}, "series": "3"}')
+        self.assertEqual(parser.close(), [{'name': '', 'series': 3, 'reps': None, 'plan': {'nivel': 'alto'}}])
+        self.assertEqual(parser.method, 'json_object')
+
+    def test_deep_nesting_is_parsed_once(self):
+        depth = 500
+        text = '{"a": ' * depth + '1' + '}' * depth
+        with mock.patch('fitness.parsing.json.loads', wraps=json.loads) as loads:
+            parse_exercises(text)
+        self.assertEqual(loads.call_count, 1)
+
+    def test_text_fallback(self):
+        exercises = parse_exercises('1. Sentadilla: 4x10\n2. Plancha - 3 series de 30')
+        self.assertEqual([(e['name'], e['series'], e['reps']) for e in exercises],
+                         [('Sentadilla', 4, 10), ('Plancha', 3, 30)])
+
+
+class RoutineListConditionalTests(TestCase):
+
+    def test_delete_is_not_hidden_by_if_modified_since(self):
+        user = User.objects.create_user('eva', 'eva@example.com', 'password123')
+        client = APIClient()
+        client.force_authenticate(user)
+        older = AIGeneratedRoutine.objects.create(user=user, name='vieja', prompt='p', exercises=[])
+        AIGeneratedRoutine.objects.create(user=user, name='nueva', prompt='p', exercises=[])
+
+        first = client.get(reverse('fitness:user-routines'))
+        self.assertNotIn('Last-Modified', first)
+        older.delete()
+
+        response = client.get(reverse('fitness:user-routines'), HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([routine['name'] for routine in response.json()['routines']], ['nueva'])
+        self.assertEqual(client.get(reverse('fitness:user-routines'), HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+
+class MetricsViewTests(SimpleTestCase):
+
+    @override_settings(METRICS_TOKEN='', METRICS_ALLOWED_IPS=[])
+    def test_hidden_without_token_or_allowed_ips(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+    @override_settings(METRICS_TOKEN='', METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_allowed_ip(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3').status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secreto', METRICS_ALLOWED_IPS=[])
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer secreto'})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class AsyncViewOutputTests(TestCase):
+    """
+    Las vistas async devuelven los mismos bytes que las APIView que reemplazan
+    (en test_settings las URLs apuntan a las de DRF)
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+        self.routine = AIGeneratedRoutine.objects.create(
+            user=self.user, name='Piernas – día 1', prompt='p',
+            exercises=[{'name': 'Sentadilla búlgara', 'series': 3, 'reps': 10}]
+        )
+        self.factory = AsyncRequestFactory()
+        self.auth = {'Authorization': f'Bearer {tokens_for_user(self.user).access_token}'}
+
+    def _assert_same(self, drf, response):
+        self.assertEqual(response.status_code, drf.status_code)
+        self.assertEqual(response['Content-Type'], drf['Content-Type'])
+        self.assertEqual(response.content, drf.content)
+        self.assertEqual(response.get('WWW-Authenticate'), drf.get('WWW-Authenticate'))
+
+    def _detail(self, headers):
+        url = reverse('fitness:routine-detail', args=[self.routine.id])
+        drf = APIClient().get(url, headers=headers)
+        view = AsyncRoutineDetailView.as_view()
+        response = async_to_sync(view)(self.factory.get(url, headers=headers), routine_id=self.routine.id)
+        return drf, response
+
+    def test_detail_is_not_ascii_escaped(self):
+        drf, response = self._detail(self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('día'.encode(), response.content)
+        self._assert_same(drf, response)
+
+    def test_auth_failures(self):
+        self._assert_same(*self._detail({}))
+        self._assert_same(*self._detail({'Authorization': 'Bearer no-es-un-token'}))
+
+    def test_invalid_json(self):
+        url = reverse('fitness:generate-routine')
+        drf = APIClient().post(url, '{"prompt": ', content_type='application/json', headers=self.auth)
+        request = self.factory.post(url, '{"prompt": ', content_type='application/json', headers=self.auth)
+        response = async_to_sync(AsyncGenerateAIRoutineView.as_view())(request)
+        self.assertEqual(response.status_code, 400)
+        self._assert_same(drf, response)
+
+
+class TrainingStatsTests(TestCase):
+    """
+    Los acumulados se mantienen por señales (y en save_batch): después de cada
+    cambio tienen que coincidir con un recálculo desde cero
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+
+    def _assert_consistent(self):
+        self.assertEqual(rebuild_user_stats(self.user.id, verify_only=True)['mismatches'], 0)
+
+    def _create(self, name, exercises):
+        return AIGeneratedRoutine.objects.create(user=self.user, name=name, prompt='p', exercises=exercises)
+
+    def test_stats_follow_every_change(self):
+        first = self._create('lunes', [
+            {'name': 'Sentadilla', 'series': 4, 'reps': '8', 'muscle': 'Cuádriceps'},
+            {'name': 'Press de banca', 'series': 3, 'reps': '10', 'muscle': 'Pecho'},
+        ])
+        second = self._create('martes', [{'name': 'Sentadilla', 'series': 3, 'reps': '12', 'muscle': 'cuadriceps'}])
+        self._assert_consistent()
+
+        first.exercises = [{'name': 'Press de banca', 'series': 5, 'reps': '5', 'muscle': 'Pecho'}]
+        first.save()
+        self._assert_consistent()
+
+        second.exercises = [{'name': 'Sentadilla', 'series': 5, 'reps': '5', 'muscle': 'cuadriceps'}]
+        second.save(update_fields=['exercises'])
+        self._assert_consistent()
+
+        # Sin 'exercises' en update_fields el cambio en memoria no se guarda ni se cuenta
+        second.name = 'martes pesado'
+        second.exercises = []
+        second.save(update_fields=['name'])
+        self._assert_consistent()
+
+        first.delete()
+        self._assert_consistent()
+
+        save_batch(self.user.id, [
+            AIGeneratedRoutine(user=self.user, name='miércoles', prompt='p', exercises=[
+                {'name': 'Dominadas', 'series': 4, 'reps': '8-10', 'muscle': 'Espalda'}
+            ]),
+            AIGeneratedRoutine(user=self.user, name='jueves', prompt='p', exercises=[
+                {'name': 'Sentadilla', 'series': 3, 'reps': '10', 'muscle': 'Cuádriceps'}
+            ]),
+        ])
+        self._assert_consistent()
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('fitness:stats'))
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()['stats']
+        self.assertEqual(stats['totals'], {'routines': 3, 'exercises': 3, 'sets': 12, 'reps': 87})
+        self.assertEqual(
+            [(row['muscle'], row['sets']) for row in stats['muscles']],
+            [('cuadriceps', 8), ('espalda', 4)]
+        )
+        self.assertEqual(stats['top_exercises'][0]['exercise'], 'Sentadilla')
+        self.assertEqual(stats['top_exercises'][0]['exercises'], 2)
+        self.assertEqual(len(stats['weeks']), 1)
+
+    def test_rebuild_repairs_drift(self):
+        self._create('lunes', [{'name': 'Sentadilla', 'series': 4, 'reps': '8'}])
+        TrainingStat.objects.filter(user=self.user).update(sets=0)
+        self.assertGreater(rebuild_user_stats(self.user.id)['mismatches'], 0)
+        self._assert_consistent()
+
+    def test_invalid_weeks(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get(reverse('fitness:stats'), {'weeks': 0}).status_code, 400)
+
+
+def _ndjson(*records):
+    return b''.join(
+        record if isinstance(record, bytes) else json.dumps(record).encode('utf-8') + b'\n'
+        for record in records
+    )
+
+
+class ImportRoutinesTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _post(self, body, **headers):
+        return self.client.generic('POST', reverse('fitness:user-routines-import'), body,
+                                   content_type='application/x-ndjson', **headers)
+
+    def test_invalid_lines_are_reported_with_their_number(self):
+        body = _ndjson(
+            {'name': 'lunes', 'exercises': ['Sentadilla']},
+            b'{no es json\n',
+            {'name': '', 'exercises': []},
+            b'\n',
+            {'name': 'martes', 'exercises': [{'name': 'Dominadas', 'series': 4, 'reps': '8'}]},
+            {'name': 'miércoles', 'exercises': [{'series': 3}]},
+        )
+        response = self._post(body)
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['status'], 'partial')
+        self.assertEqual((data['lines'], data['imported'], data['rejected']), (6, 2, 3))
+        self.assertEqual([error['line'] for error in data['errors']], [2, 3, 6])
+        self.assertEqual(
+            sorted(AIGeneratedRoutine.objects.filter(user=self.user).values_list('name', flat=True)),
+            ['lunes', 'martes']
+        )
+
+    def test_gzip_body(self):
+        body = gzip.compress(_ndjson({'name': 'lunes', 'exercises': ['Sentadilla']}))
+        response = self._post(body, HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertTrue(AIGeneratedRoutine.objects.filter(user=self.user, name='lunes').exists())
+
+    def test_corrupt_gzip_body(self):
+        body = gzip.compress(_ndjson({'name': 'lunes', 'exercises': ['Sentadilla']}))[:-12] + b'basura'
+        response = self._post(body, HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'El cuerpo no es un gzip válido')
+
+    def test_empty_body(self):
+        response = self._post(b'')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(AIGeneratedRoutine.objects.exists())
+
+    def test_generated_at_is_preserved(self):
+        response = self._post(_ndjson(
+            {'name': 'viejo', 'exercises': ['Sentadilla'], 'generated_at': '2024-03-05T10:30:00Z'},
+            {'name': 'sin zona', 'exercises': ['Sentadilla'], 'generated_at': '2024-03-06T08:00:00'},
+            {'name': 'nuevo', 'exercises': ['Sentadilla']},
+        ))
+        self.assertEqual(response.status_code, 201)
+        routines = {r.name: r.generated_at for r in AIGeneratedRoutine.objects.filter(user=self.user)}
+        self.assertEqual(routines['viejo'], datetime(2024, 3, 5, 10, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(routines['sin zona'].date().isoformat(), '2024-03-06')
+        self.assertGreater(routines['nuevo'], timezone.now() - timedelta(minutes=1))
+
+    def test_export_import_round_trip(self):
+        source = User.objects.create_user('leo', 'leo@example.com', 'password123')
+        for day, name in enumerate(['lunes', 'martes', 'miércoles'], start=1):
+            routine = AIGeneratedRoutine.objects.create(user=source, name=name, prompt=f'prompt {day}', exercises=[
+                {'name': 'Sentadilla', 'series': day, 'reps': 8, 'muscle': 'Piernas'}
+            ])
+            AIGeneratedRoutine.objects.filter(pk=routine.pk).update(
+                generated_at=timezone.now() - timedelta(days=day)
+            )
+        exporter = APIClient()
+        exporter.force_authenticate(source)
+        export = exporter.get(reverse('fitness:user-routines-export'))
+        body = b''.join(export.streaming_content)
+
+        response = self._post(body)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['imported'], 3)
+
+        def snapshot(user):
+            return list(AIGeneratedRoutine.objects.filter(user=user).order_by('generated_at')
+                        .values_list('name', 'prompt', 'exercises', 'generated_at'))
+        self.assertEqual(snapshot(self.user), snapshot(source))
+
+    def test_command_reads_gzip_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'routines.ndjson.gz')
+            with gzip.open(path, 'wb') as f:
+                f.write(_ndjson(
+                    {'name': 'lunes', 'exercises': ['Sentadilla'], 'user': self.user.id},
+                    {'name': 'martes', 'exercises': ['Sentadilla'], 'user': 999999},
+                    {'name': 'miércoles', 'exercises': ['Sentadilla']},
+                ))
+            out, err = StringIO(), StringIO()
+            call_command('import_routines', path, stdout=out, stderr=err)
+        self.assertIn('1 rutinas importadas, 2 líneas rechazadas', out.getvalue())
+        self.assertIn('línea 2: El usuario 999999 no existe', err.getvalue())
+        self.assertIn('línea 3: user (id) es obligatorio', err.getvalue())
+
+
+class SearchRoutinesTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.legs = AIGeneratedRoutine.objects.create(user=self.user, name='Piernas', prompt='rutina de piernas', exercises=[
+            {'name': 'Sentadilla búlgara', 'series': 4, 'reps': 10, 'muscle': 'Cuádriceps'},
+        ])
+        self.chest = AIGeneratedRoutine.objects.create(user=self.user, name='Empuje', prompt='pecho y hombros', exercises=[
+            {'name': 'Flexiones', 'series': 3, 'reps': 15, 'muscle': 'Pecho'},
+        ])
+
+    def _search(self, q, **params):
+        response = self.client.get(reverse('fitness:search-routines'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [result['routine']['id'] for result in response.json()['results']]
+
+    def test_accents_and_plurals_are_ignored(self):
+        self.assertEqual(self._search('sentadillas BULGARAS'), [self.legs.id])
+        self.assertEqual(self._search('flexión'), [self.chest.id])
+        self.assertEqual(self._search('cuadriceps '), [self.legs.id])
+
+    def test_last_word_matches_as_prefix(self):
+        self.assertEqual(self._search('bulgara sentad'), [self.legs.id])
+        self.assertEqual(self._search('flex'), [self.chest.id])
+        # Con espacio al final la palabra está completa: ya no es prefijo
+        self.assertEqual(self._search('flex '), [])
+        # Solo la última palabra es prefijo
+        self.assertEqual(self._search('sentad bulgara'), [self.legs.id])
+        response = self.client.get(reverse('fitness:search-routines'), {'q': 'sentad bulgara'})
+        self.assertEqual(response.json()['results'][0]['matched'], ['bulgara'])
+
+    def test_routines_with_more_query_words_rank_first(self):
+        both = AIGeneratedRoutine.objects.create(user=self.user, name='Full body', prompt='', exercises=[
+            {'name': 'Sentadilla', 'series': 3, 'reps': 10},
+            {'name': 'Flexiones', 'series': 3, 'reps': 10},
+        ])
+        self.assertEqual(self._search('sentadilla flexiones')[0], both.id)
+
+    def test_index_follows_edits(self):
+        self.legs.exercises = [{'name': 'Peso muerto', 'series': 4, 'reps': 6, 'muscle': 'Isquiotibiales'}]
+        self.legs.save()
+        self.assertEqual(self._search('sentadilla'), [])
+        self.assertEqual(self._search('isquiotibial'), [self.legs.id])
+
+        self.chest.name = 'Calistenia'
+        self.chest.save(update_fields=['name'])
+        self.assertEqual(self._search('calistenia'), [self.chest.id])
+        self.assertEqual(self._search('empuje'), [])
+
+        self.legs.delete()
+        self.assertFalse(RoutineSearchTerm.objects.filter(routine_id=self.legs.id).exists())
+
+    def test_index_follows_bulk_saves(self):
+        created = save_batch(self.user.id, [
+            AIGeneratedRoutine(user=self.user, name='Tracción', prompt='espalda', exercises=[
+                {'name': 'Dominadas', 'series': 4, 'reps': 8, 'muscle': 'Dorsales'}
+            ]),
+        ])
+        self.assertEqual(self._search('dominada'), [created[0].id])
+
+    def test_other_users_routines_are_excluded(self):
+        other = User.objects.create_user('leo', 'leo@example.com', 'password123')
+        AIGeneratedRoutine.objects.create(user=other, name='Piernas de Leo', prompt='', exercises=[
+            {'name': 'Sentadilla', 'series': 5, 'reps': 5}
+        ])
+        self.assertEqual(self._search('sentadilla'), [self.legs.id])
+        response = self.client.get(reverse('fitness:search-routines'), {'q': 'sentadilla'})
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_blank_query(self):
+        response = self.client.get(reverse('fitness:search-routines'), {'q': '   '})
+        self.assertEqual(response.status_code, 400)
+
+
+class SimilarRoutinesTests(TestCase):
+    """
+    Cada test usa un índice nuevo: el del proceso guarda ids de tests anteriores
+    """
+
+    def setUp(self):
+        patcher = mock.patch.object(similarity, '_index', similarity.SimilarityIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.legs = self._create('rutina de piernas con sentadillas', ['Sentadilla', 'Zancadas'])
+        self.legs_again = self._create('piernas y glúteos, sentadilla búlgara', ['Sentadilla búlgara', 'Hip thrust'])
+        self.chest = self._create('pecho y tríceps en el gimnasio', ['Press de banca', 'Fondos'])
+
+    def _create(self, prompt, exercises, user=None):
+        return AIGeneratedRoutine.objects.create(user=user or self.user, name=prompt[:20], prompt=prompt, exercises=[
+            {'name': name, 'series': 3, 'reps': 10} for name in exercises
+        ])
+
+    def _similar(self, **params):
+        response = self.client.get(reverse('fitness:similar-routines'), params)
+        self.assertEqual(response.status_code, 200)
+        return [(result['routine']['id'], result['score']) for result in response.json()['results']]
+
+    def test_ranks_by_query(self):
+        results = self._similar(q='sentadillas para piernas', min_score=0)
+        self.assertEqual([routine_id for routine_id, _ in results][:2], [self.legs.id, self.legs_again.id])
+        scores = [score for _, score in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_routine_id_excludes_itself(self):
+        results = self._similar(routine_id=self.legs.id, min_score=0)
+        ids = [routine_id for routine_id, _ in results]
+        self.assertNotIn(self.legs.id, ids)
+        self.assertEqual(ids[0], self.legs_again.id)
+
+    def test_other_users_routine_is_not_found(self):
+        other = User.objects.create_user('leo', 'leo@example.com', 'password123')
+        theirs = self._create('piernas con sentadillas', ['Sentadilla'], user=other)
+        response = self.client.get(reverse('fitness:similar-routines'), {'routine_id': theirs.id})
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(theirs.id, [routine_id for routine_id, _ in self._similar(q='sentadillas piernas', min_score=0)])
+
+    def test_min_score_filters_results(self):
+        everything = self._similar(q='sentadillas para piernas', min_score=0)
+        threshold = everything[0][1] - 0.0001
+        self.assertEqual(self._similar(q='sentadillas para piernas', min_score=threshold), everything[:1])
+        self.assertEqual(self._similar(q='natación en piscina', min_score=0.5), [])
+
+    def test_sync_user_picks_up_new_and_edited_routines(self):
+        index = similarity.get_similarity_index()
+        self.assertEqual(similarity.sync_user(index, self.user.id), 3)
+        self.assertEqual(similarity.sync_user(index, self.user.id), 0)
+
+        swim = self._create('natación en piscina', ['Crol', 'Espalda'])
+        self.chest.prompt = 'natación y piscina para la espalda'
+        self.chest.save()
+        self.legs.delete()
+        self.assertEqual(similarity.sync_user(index, self.user.id), 3)
+
+        ids = [routine_id for routine_id, _ in self._similar(q='natación piscina', min_score=0)]
+        self.assertEqual(set(ids[:2]), {swim.id, self.chest.id})
+        self.assertNotIn(self.legs.id, ids)
+
+    def test_requires_exactly_one_of_q_or_routine_id(self):
+        url = reverse('fitness:similar-routines')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'q': 'piernas', 'routine_id': self.legs.id}).status_code, 400)
+
+
+class RoutinePaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        self.routines = []
+        for position in range(5):
+            routine = AIGeneratedRoutine.objects.create(user=self.user, name=f'rutina {position}', prompt='p', exercises=[])
+            self.routines.append(routine)
+        # Dos pares con la misma fecha: el desempate es por id
+        moments = [now - timedelta(hours=3), now - timedelta(hours=2), now - timedelta(hours=2), now, now]
+        for routine, moment in zip(self.routines, moments):
+            AIGeneratedRoutine.objects.filter(pk=routine.pk).update(generated_at=moment)
+        other = User.objects.create_user('leo', 'leo@example.com', 'password123')
+        AIGeneratedRoutine.objects.create(user=other, name='ajena', prompt='p', exercises=[])
+
+    def _list(self, **params):
+        return self.client.get(reverse('fitness:user-routines'), params)
+
+    def test_cursor_walks_every_routine_once(self):
+        seen, cursor, pages = [], None, 0
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            data = self._list(**params).json()
+            pages += 1
+            seen.extend(routine['id'] for routine in data['routines'])
+            self.assertEqual(data['has_more'], data['next_cursor'] is not None)
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, [routine.id for routine in reversed(self.routines)])
+
+    def test_invalid_cursor(self):
+        for cursor in ('no-es-un-cursor', encode_cursor(timezone.now(), 1)[:-3] + '###'):
+            response = self._list(cursor=cursor)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['message'], 'Cursor inválido')
+
+    def test_sparse_fieldsets(self):
+        data = self._list(fields='id, name', limit=1).json()
+        self.assertEqual(list(data['routines'][0]), ['id', 'name'])
+        self.assertIsNotNone(data['next_cursor'])
+
+    def test_unknown_fields(self):
+        response = self._list(fields='id,password,user')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', str(response.json()['fields']))
+
+    def test_count_is_opt_in(self):
+        self.assertNotIn('count', self._list(limit=1).json())
+        self.assertEqual(self._list(limit=1, count='true').json()['count'], 5)
+
+
+class ExerciseFilterTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.legs = AIGeneratedRoutine.objects.create(user=self.user, name='piernas', prompt='p', exercises=[
+            {'name': 'Sentadilla búlgara', 'series': 3, 'reps': 10, 'muscle': 'Cuádriceps'},
+            {'name': 'Peso muerto rumano', 'series': 3, 'reps': 8, 'muscle': 'Isquiotibiales'},
+        ])
+        self.full = AIGeneratedRoutine.objects.create(user=self.user, name='full body', prompt='p', exercises=[
+            {'name': 'Sentadilla', 'series': 4, 'reps': 6, 'grupo_muscular': 'Glúteos'},
+            {'name': 'Press militar', 'series': 3, 'reps': 8, 'muscle': 'Hombros'},
+        ])
+        other = User.objects.create_user('leo', 'leo@example.com', 'password123')
+        AIGeneratedRoutine.objects.create(user=other, name='ajena', prompt='p', exercises=[
+            {'name': 'Sentadilla', 'series': 5, 'reps': 5, 'muscle': 'Cuádriceps'},
+        ])
+
+    def _ids(self, **params):
+        response = self.client.get(reverse('fitness:user-routines'), params)
+        self.assertEqual(response.status_code, 200)
+        return {routine['id'] for routine in response.json()['routines']}
+
+    def test_exercise_is_a_prefix(self):
+        self.assertEqual(self._ids(exercise='sentad'), {self.legs.id, self.full.id})
+        self.assertEqual(self._ids(exercise='Sentadilla Búl'), {self.legs.id})
+        self.assertEqual(self._ids(exercise='búlgara'), set())
+
+    def test_muscle_ignores_accents_and_case(self):
+        self.assertEqual(self._ids(muscle='cuadriceps'), {self.legs.id})
+        self.assertEqual(self._ids(muscle='GLÚTEOS'), {self.full.id})
+        self.assertEqual(self._ids(muscle='gluteo'), set())
+
+    def test_exercise_and_muscle_match_the_same_exercise(self):
+        self.assertEqual(self._ids(exercise='sentadilla', muscle='gluteos'), {self.full.id})
+        self.assertEqual(self._ids(exercise='press', muscle='cuadriceps'), set())
+
+    def test_backfill_command(self):
+        # Cambios que no pasan por save(): el índice queda desactualizado
+        RoutineExercise.objects.all().delete()
+        AIGeneratedRoutine.objects.filter(pk=self.full.pk).update(exercises=[
+            {'name': 'Remo con barra', 'series': 4, 'reps': 8, 'muscle': 'Espalda'},
+        ])
+        self.assertEqual(self._ids(muscle='espalda'), set())
+
+        out = StringIO()
+        call_command('backfill_routine_exercises', '--batch-size', '1', stdout=out)
+        self.assertIn('3 rutinas procesadas, 4 ejercicios indexados', out.getvalue())
+        self.assertEqual(self._ids(muscle='espalda'), {self.full.id})
+        self.assertEqual(self._ids(exercise='sentadilla'), {self.legs.id})
+
+        out = StringIO()
+        call_command('backfill_routine_exercises', '--user', str(self.user.id), stdout=out)
+        self.assertIn('2 rutinas procesadas, 3 ejercicios indexados', out.getvalue())
+
+
+class ExportRoutinesTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        self.routines = []
+        for days in (4, 3, 2, 1, 0):
+            routine = AIGeneratedRoutine.objects.create(user=self.user, name=f'hace {days} días', prompt='p', exercises=[
+                {'name': 'Sentadilla', 'series': 3, 'reps': 10}
+            ])
+            AIGeneratedRoutine.objects.filter(pk=routine.pk).update(generated_at=now - timedelta(days=days))
+            self.routines.append(routine)
+        other = User.objects.create_user('leo', 'leo@example.com', 'password123')
+        AIGeneratedRoutine.objects.create(user=other, name='ajena', prompt='p', exercises=[])
+        self.expected = [routine.id for routine in reversed(self.routines)]
+
+    def _export(self, **params):
+        response = self.client.get(reverse('fitness:user-routines-export'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def _ids(self, body):
+        return [json.loads(line)['id'] for line in body.decode('utf-8').splitlines()]
+
+    def test_ndjson_body(self):
+        response, body = self._export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('routines_%d.ndjson"' % self.user.id, response['Content-Disposition'])
+        self.assertTrue(body.endswith(b'\n'))
+        self.assertEqual(self._ids(body), self.expected)
+        first = json.loads(body.splitlines()[0])
+        self.assertEqual(first['exercises'], [{'name': 'Sentadilla', 'series': 3, 'reps': 10}])
+
+    def test_gzip_download(self):
+        response, body = self._export(gzip='true')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.ndjson.gz"', response['Content-Disposition'])
+        self.assertEqual(self._ids(gzip.decompress(body)), self.expected)
+
+    def test_since(self):
+        since = (timezone.now() - timedelta(days=2, hours=1)).isoformat()
+        _, body = self._export(since=since)
+        self.assertEqual(self._ids(body), self.expected[:3])
+        response = self.client.get(reverse('fitness:user-routines-export'), {'since': 'ayer'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batches_do_not_skip_or_repeat_rows(self):
+        routines = AIGeneratedRoutine.objects.filter(user=self.user)
+        # Dos rutinas con la misma fecha en el borde de un lote
+        AIGeneratedRoutine.objects.filter(pk=self.routines[1].pk).update(
+            generated_at=AIGeneratedRoutine.objects.get(pk=self.routines[2].pk).generated_at
+        )
+        for batch_size in (1, 2, 5, 10):
+            chunks = list(ndjson_lines(routines, batch_size))
+            self.assertEqual(len(chunks), math.ceil(5 / batch_size))
+            ids = self._ids(b''.join(chunks))
+            self.assertEqual(sorted(ids), sorted(self.expected))
+            self.assertEqual(len(set(ids)), 5)
+
+    def test_async_variants_match(self):
+        routines = AIGeneratedRoutine.objects.filter(user=self.user)
+
+        async def collect(lines):
+            return [chunk async for chunk in lines]
+
+        sync_body = b''.join(ndjson_lines(routines, 2))
+        async_chunks = async_to_sync(collect)(andjson_lines(routines, 2))
+        self.assertEqual(len(async_chunks), 3)
+        self.assertEqual(b''.join(async_chunks), sync_body)
+        compressed = async_to_sync(collect)(agzip_lines(andjson_lines(routines, 2)))
+        self.assertEqual(gzip.decompress(b''.join(compressed)), sync_body)
+        self.assertEqual(gzip.decompress(b''.join(gzip_lines(ndjson_lines(routines, 2)))), sync_body)
+
+
+def _sse_events(response):
+    body = b''.join(response.streaming_content).decode('utf-8')
+    events = []
+    for block in body.strip().split('\n\n'):
+        event, data = block.split('\n', 1)
+        events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+class RoutineStreamTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _stream(self, events, **data):
+        def stream_exercises(service, prompt, use_cache=True, size=None):
+            self.calls.append((prompt, use_cache, size))
+            yield from events
+        self.calls = []
+        with mock.patch.object(AIFitnessService, 'stream_exercises', stream_exercises):
+            response = self.client.post(reverse('fitness:generate-routine-stream'),
+                                        {'prompt': 'rutina de piernas', **data}, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            return _sse_events(response)
+
+    def test_tokens_exercises_then_saved_routine(self):
+        exercise = {'name': 'Sentadilla', 'series': 4, 'reps': 8}
+        events = self._stream([
+            ('token', '[{"name": "Sentadilla",'),
+            ('token', ' "series": 4, "reps": 8}]'),
+            ('exercise', exercise),
+            ('done', {'status': 'success', 'exercises': [exercise]}),
+        ], routine_name='Piernas', size=3, fresh=True)
+
+        self.assertEqual([event for event, _ in events], ['token', 'token', 'exercise', 'routine'])
+        self.assertEqual(self.calls, [('rutina de piernas', False, 3)])
+        self.assertEqual(events[2][1], exercise)
+        routine = AIGeneratedRoutine.objects.get(user=self.user)
+        self.assertEqual((routine.name, routine.prompt, routine.exercises), ('Piernas', 'rutina de piernas', [exercise]))
+        self.assertEqual(events[3][1]['routine']['id'], routine.id)
+        self.assertFalse(events[3][1]['cached'])
+
+    def test_model_failure_sends_an_error_event(self):
+        events = self._stream([
+            ('token', '[{"name": "Sent'),
+            ('done', {'status': 'error', 'message': 'Modelo no disponible', 'error_code': 503}),
+        ])
+        self.assertEqual([event for event, _ in events], ['token', 'error'])
+        self.assertEqual(events[1][1]['error_code'], 503)
+        self.assertFalse(AIGeneratedRoutine.objects.exists())
+
+    def test_save_failure_sends_an_error_event(self):
+        with mock.patch.object(AIGeneratedRoutine.objects, 'create', side_effect=DatabaseError('sin conexión')):
+            events = self._stream([('done', {'status': 'success', 'exercises': [{'name': 'Sentadilla'}]})])
+        self.assertEqual(events, [('error', {'status': 'error', 'message': 'Error al guardar la rutina: sin conexión'})])
+
+
+class BatchPersistenceTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _post(self, results, **data):
+        with mock.patch('fitness.views.generate_batch', return_value=results) as generate:
+            response = self.client.post(reverse('fitness:generate-routine-batch'), data, format='json')
+        return response, generate
+
+    def _ok(self, name):
+        return {'status': 'success', 'exercises': [{'name': name, 'series': 3, 'reps': 10}]}
+
+    def test_partial_success_keeps_the_good_routines(self):
+        response, generate = self._post(
+            [self._ok('Sentadilla'), {'status': 'error', 'message': 'Modelo no disponible', 'error_code': 503},
+             self._ok('Dominadas')],
+            prompts=['rutina de piernas', 'rutina de pecho', 'rutina de espalda'], size=4
+        )
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['status'], 'partial')
+        self.assertEqual(data['message'], '2 de 3 rutinas generadas y guardadas')
+        self.assertEqual(data['errors'], [{
+            'index': 1, 'prompt': 'rutina de pecho', 'message': 'Modelo no disponible', 'error_code': 503
+        }])
+        generate.assert_called_once_with(
+            ['rutina de piernas', 'rutina de pecho', 'rutina de espalda'], use_cache=True, size=4
+        )
+        saved = AIGeneratedRoutine.objects.filter(user=self.user).order_by('id')
+        self.assertEqual([routine['id'] for routine in data['routines']], [routine.id for routine in saved])
+        self.assertEqual([routine.prompt for routine in saved], ['rutina de piernas', 'rutina de espalda'])
+        self.assertEqual([routine.name for routine in saved],
+                         [f'Routine_{self.user.id}_1', f'Routine_{self.user.id}_2'])
+
+    def test_all_failed(self):
+        unavailable = {'status': 'error', 'message': 'Modelo no disponible', 'error_code': 503}
+        failed = {'status': 'error', 'message': 'Respuesta inválida'}
+        prompts = ['rutina de piernas', 'rutina de pecho']
+
+        response, _ = self._post([unavailable, unavailable], prompts=prompts)
+        self.assertEqual(response.status_code, 503)
+        response, _ = self._post([unavailable, failed], prompts=prompts)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()['status'], 'error')
+        self.assertEqual(len(response.json()['errors']), 2)
+        self.assertFalse(AIGeneratedRoutine.objects.exists())
+
+    def test_name_prefix(self):
+        response, generate = self._post(
+            [self._ok('Sentadilla'), self._ok('Press de banca')],
+            plan=[{'day': 'Lunes', 'focus': 'piernas'}, {'day': 'Jueves', 'focus': 'pecho'}],
+            goal='Ganar fuerza.', name_prefix='Plan fuerza', fresh=True
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([routine['name'] for routine in response.json()['routines']],
+                         ['Plan fuerza - Lunes', 'Plan fuerza - Jueves'])
+        self.assertEqual(generate.call_args.args[0][0], 'Ganar fuerza. Rutina para el Lunes: piernas')
+        self.assertFalse(generate.call_args.kwargs['use_cache'])
+
+        response, _ = self._post([self._ok('Sentadilla')], prompts=['rutina de piernas'], name_prefix='Extra')
+        self.assertEqual(response.json()['routines'][0]['name'], 'Extra - 1')
+
+    def test_ids_are_recovered_when_the_insert_does_not_return_them(self):
+        # Como en MySQL: bulk_create no deja los ids en las instancias
+        bulk_create = AIGeneratedRoutine.objects.bulk_create
+
+        def without_ids(objs, *args, **kwargs):
+            created = bulk_create(objs, *args, **kwargs)
+            for routine in created:
+                routine.pk = None
+            return created
+
+        with mock.patch.object(AIGeneratedRoutine.objects, 'bulk_create', side_effect=without_ids):
+            response, _ = self._post(
+                [self._ok('Sentadilla'), self._ok('Dominadas'), self._ok('Press de banca')],
+                prompts=['rutina de piernas', 'rutina de espalda', 'rutina de pecho'], name_prefix='Igual'
+            )
+        self.assertEqual(response.status_code, 201)
+        saved = {routine.id: routine.prompt for routine in AIGeneratedRoutine.objects.filter(user=self.user)}
+        returned = {routine['id']: routine['prompt'] for routine in response.json()['routines']}
+        self.assertEqual(returned, saved)
+        self.assertEqual(RoutineExercise.objects.filter(user=self.user).count(), 3)
+
+
+@override_settings(COMPRESSION_ENCODINGS=['zstd', 'br', 'gzip'], COMPRESSION_MIN_SIZE=200)
+class CompressionMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.body = json.dumps({'routines': [{'name': f'Sentadilla {n}', 'series': 3} for n in range(40)]}).encode()
+
+    def _process(self, response, accept_encoding):
+        middleware = CompressionMiddleware(lambda request: response)
+        return middleware(self.factory.get('/', HTTP_ACCEPT_ENCODING=accept_encoding))
+
+    def _json(self, body=None, etag=None):
+        response = HttpResponse(body if body is not None else self.body, content_type='application/json')
+        if etag:
+            response['ETag'] = etag
+        return response
+
+    def test_negotiate(self):
+        preference = ['zstd', 'br', 'gzip']
+        self.assertEqual(negotiate('gzip, br', preference), 'br')
+        self.assertEqual(negotiate('gzip;q=1.0, br;q=0.5', preference), 'gzip')
+        self.assertEqual(negotiate('*', preference), 'zstd')
+        self.assertEqual(negotiate('*;q=0.2, gzip;q=0', preference), 'zstd')
+        self.assertEqual(negotiate('gzip;q=0', preference), None)
+        self.assertEqual(negotiate('identity', preference), None)
+        self.assertEqual(negotiate('', preference), None)
+        self.assertEqual(negotiate('gzip;q=abc, br', preference), 'br')
+
+    def test_gzip_response(self):
+        response = self._process(self._json(), 'gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_q_zero_is_not_compressed(self):
+        response = self._process(self._json(), 'gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.content, self.body)
+
+    def test_small_and_binary_responses_are_left_alone(self):
+        response = self._process(self._json(b'{"status": "success"}'), 'gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self._process(HttpResponse(self.body, content_type='image/png'), 'gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_etag_becomes_weak(self):
+        response = self._process(self._json(etag='"abc123"'), 'gzip')
+        self.assertEqual(response['ETag'], 'W/"abc123"')
+        response = self._process(self._json(etag='W/"abc123"'), 'gzip')
+        self.assertEqual(response['ETag'], 'W/"abc123"')
+        response = self._process(self._json(etag='"abc123"'), '')
+        self.assertEqual(response['ETag'], '"abc123"')
+
+    def test_sse_chunks_are_flushed(self):
+        events = [format_sse('token', {'text': 'x' * n}).encode() for n in range(3)]
+        response = self._process(StreamingHttpResponse(iter(events), content_type='text/event-stream'), 'gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        decompressor = zlib.decompressobj(31)
+        chunks = iter(response.streaming_content)
+        # Cada evento se puede descomprimir apenas llega, sin esperar al final
+        for event in events:
+            self.assertEqual(decompressor.decompress(next(chunks)), event)
+        for chunk in chunks:
+            decompressor.decompress(chunk)
+        self.assertTrue(decompressor.eof)
+
+    def test_async_streaming(self):
+        async def lines():
+            for n in range(3):
+                yield f'{{"n": {n}}}\n'.encode()
+
+        response = self._process(StreamingHttpResponse(lines(), content_type='application/x-ndjson'), 'gzip')
+        self.assertTrue(response.is_async)
+
+        async def collect():
+            return b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(gzip.decompress(async_to_sync(collect)()), b'{"n": 0}\n{"n": 1}\n{"n": 2}\n')
+
+    def test_export_through_the_middleware_stack(self):
+        user = User.objects.create_user('ana', 'ana@example.com', 'password123')
+        AIGeneratedRoutine.objects.create(user=user, name='lunes', prompt='p', exercises=[{'name': 'Sentadilla'}])
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(reverse('fitness:user-routines-export'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        line = json.loads(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(line['name'], 'lunes')
+
+    @skipUnless(brotli is not None, 'brotli no está instalado')
+    def test_brotli(self):
+        response = self._process(self._json(), 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.body)
+
+    @skipUnless(zstandard is not None, 'zstandard no está instalado')
+    def test_zstd(self):
+        response = self._process(self._json(), 'gzip, br, zstd')
+        self.assertEqual(response['Content-Encoding'], 'zstd')
+        self.assertEqual(zstandard.ZstdDecompressor().decompress(response.content), self.body)
+
+
+class PromptShapingTests(SimpleTestCase):
+
+    def setUp(self):
+        # Valores por defecto, sin depender de AI_TOKENS_* del entorno
+        patcher = mock.patch.object(prompting, 'token_budget', TokenBudget(80, 150, 400, 5000))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_budget_is_clamped(self):
+        budget = TokenBudget(per_exercise=80, overhead=150, minimum=400, maximum=5000)
+        self.assertEqual(budget.for_exercises(1), 400)
+        self.assertEqual(budget.for_exercises(4), 470)
+        self.assertEqual(budget.for_exercises(10), 950)
+        self.assertEqual(budget.for_exercises(60), 4950)
+        self.assertEqual(budget.for_exercises(100), 5000)
+
+    def test_estimated_exercises(self):
+        with mock.patch.object(prompting, 'DEFAULT_EXERCISES_PER_DAY', 6):
+            self.assertEqual(prompting.estimate_exercises('rutina de piernas'), 6)
+            self.assertEqual(prompting.estimate_exercises('rutina de 3 ejercicios para piernas'), 3)
+            self.assertEqual(prompting.estimate_exercises('cuatro ejercicios por día, 3 días'), 12)
+            self.assertEqual(prompting.estimate_exercises('rutina semanal de fuerza'), 30)
+            self.assertEqual(prompting.estimate_exercises('rutina de 10 días con 8 ejercicios'), 60)
+            self.assertEqual(prompting.estimate_exercises('rutina de piernas', size=4), 4)
+            self.assertEqual(prompting.estimate_exercises('rutina de piernas', size=200), 60)
+
+    def test_size_sets_max_tokens(self):
+        self.assertEqual(shape_request('rutina de piernas', size=1)['max_tokens'], 400)
+        self.assertEqual(shape_request('rutina de piernas', size=10)['max_tokens'], 950)
+        self.assertEqual(shape_request('rutina de piernas', size=60)['max_tokens'], 4950)
+        shape = shape_request('rutina de 3 ejercicios')
+        self.assertEqual((shape['expected_exercises'], shape['max_tokens']), (3, 400))
+
+    def test_json_system_framing(self):
+        shape = shape_request('  rutina   de\n piernas  ', size=5)
+        self.assertEqual(shape['messages'], [
+            {'role': 'system', 'content': prompting.SYSTEM_PROMPT},
+            {'role': 'user', 'content': 'rutina de piernas'},
+        ])
+        example = prompting.SYSTEM_PROMPT[prompting.SYSTEM_PROMPT.index('{'):prompting.SYSTEM_PROMPT.rindex('}') + 1]
+        self.assertEqual(parse_exercises(example)[0]['series'], 4)
+
+    def test_disabled_shaping_sends_the_prompt_as_is(self):
+        shape = shape_request('  rutina de piernas ', size=5, enabled=False)
+        self.assertEqual(shape['messages'], [{'role': 'user', 'content': '  rutina de piernas '}])
+        self.assertEqual(shape['max_tokens'], 5000)
+        self.assertEqual(shape['system'], '')
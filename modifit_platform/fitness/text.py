@@ -0,0 +1,43 @@
+import re
+import unicodedata
+from typing import List
+
+STOPWORDS = frozenset((
+    "a", "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los", "me", "mi", "mis",
+    "para", "por", "que", "quiero", "se", "sin", "su", "un", "una", "unos", "unas", "y", "o",
+    "the", "and", "for", "with", "of", "to", "my", "in",
+))
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def fold_text(text: str) -> str:
+    """
+    Minúsculas y sin acentos, para comparar y buscar texto en español
+    ("Sentadilla Búlgara" -> "sentadilla bulgara")
+    """
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def singular(word: str) -> str:
+    """
+    Plural español simple: flexiones -> flexion, sentadillas -> sentadilla.
+    No es un stemmer; alcanza con aplicarlo igual al indexar y al buscar
+    """
+    if len(word) > 5 and word.endswith("es") and word[-3] in "nrldjz":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Palabras sin acentos, sin stopwords y en singular, en orden de aparición
+    """
+    return [
+        singular(word)
+        for word in _WORD.findall(fold_text(text))
+        if len(word) > 1 and word not in STOPWORDS
+    ]
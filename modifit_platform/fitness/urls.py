@@ -1,11 +1,54 @@
+from django.conf import settings
 from django.urls import path
-from .views import HomeView, GenerateAIRoutineView, ListUserRoutinesView, RoutineDetailView
+from .views import (
+    HomeView,
+    GenerateAIRoutineView,
+    GenerateBatchRoutinesView,
+    GenerateAIRoutineStreamView,
+    ListUserRoutinesView,
+    ExportUserRoutinesView,
+    ImportUserRoutinesView,
+    RoutineDetailView,
+    SearchRoutinesView,
+    SimilarRoutinesView,
+    TrainingStatsView,
+    GenerationJobDetailView,
+    AICacheStatsView,
+)
+from .async_views import (
+    AsyncGenerateAIRoutineView,
+    AsyncGenerateBatchRoutinesView,
+    AsyncListUserRoutinesView,
+    AsyncRoutineDetailView,
+)
 
 app_name = 'fitness'
 
+# Bajo ASGI (FITNESS_ASYNC_VIEWS) la generación (simple y batch), el listado y el detalle
+# no bloquean el event loop mientras esperan al modelo o a la base
+if settings.FITNESS_ASYNC_VIEWS:
+    generate_view = AsyncGenerateAIRoutineView.as_view()
+    batch_view = AsyncGenerateBatchRoutinesView.as_view()
+    list_view = AsyncListUserRoutinesView.as_view()
+    detail_view = AsyncRoutineDetailView.as_view()
+else:
+    generate_view = GenerateAIRoutineView.as_view()
+    batch_view = GenerateBatchRoutinesView.as_view()
+    list_view = ListUserRoutinesView.as_view()
+    detail_view = RoutineDetailView.as_view()
+
 urlpatterns = [
     path('home/', HomeView.as_view(), name='home'),
-    path('generate-routine/', GenerateAIRoutineView.as_view(), name='generate-routine'),
-    path('user-routines/', ListUserRoutinesView.as_view(), name='user-routines'),
-    path('routine/<int:routine_id>/', RoutineDetailView.as_view(), name='routine-detail'),
+    path('generate-routine/', generate_view, name='generate-routine'),
+    path('generate-routine/batch/', batch_view, name='generate-routine-batch'),
+    path('generate-routine/stream/', GenerateAIRoutineStreamView.as_view(), name='generate-routine-stream'),
+    path('user-routines/', list_view, name='user-routines'),
+    path('user-routines/export/', ExportUserRoutinesView.as_view(), name='user-routines-export'),
+    path('user-routines/import/', ImportUserRoutinesView.as_view(), name='user-routines-import'),
+    path('routine/<int:routine_id>/', detail_view, name='routine-detail'),
+    path('search/', SearchRoutinesView.as_view(), name='search-routines'),
+    path('similar/', SimilarRoutinesView.as_view(), name='similar-routines'),
+    path('stats/', TrainingStatsView.as_view(), name='stats'),
+    path('generation-jobs/<int:job_id>/', GenerationJobDetailView.as_view(), name='generation-job-detail'),
+    path('ai-cache/stats/', AICacheStatsView.as_view(), name='ai-cache-stats'),
 ]
@@ -1,10 +1,87 @@
+import gzip
+import zlib
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
-from .models import AIGeneratedRoutine
-from .serializers import AIGeneratedRoutineSerializer, GenerateRoutineRequestSerializer
-from .ai_service import AIFitnessService
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from .models import AIGeneratedRoutine, RoutineExercise, RoutineGenerationJob
+from .serializers import (
+    AIGeneratedRoutineSerializer,
+    GenerateRoutineRequestSerializer,
+    GenerateBatchRequestSerializer,
+    ListRoutinesQuerySerializer,
+    ExportRoutinesQuerySerializer,
+    SearchRoutinesQuerySerializer,
+    TrainingStatsQuerySerializer,
+    SimilarRoutinesQuerySerializer,
+    RoutineGenerationJobSerializer,
+)
+from .ai_service import AIFitnessService, generation_cache, generation_flights, async_generation_flights
+from .parsing import parse_stats
+from .prompting import usage_stats
+from .model_pool import get_model_pool
+from .jobs import job_pool
+from .batch import generate_batch, persist_batch_results
+from .fallback import (
+    deadline_executor,
+    deadline_seconds,
+    fallback_payload,
+    fallback_reason,
+    fallback_stats,
+    finish_in_background,
+    generate_fallback,
+    race_model,
+)
+from .renderers import EventStreamRenderer, NDJSONRenderer, format_sse
+from .export import agzip_lines, andjson_lines, gzip_lines, ndjson_lines
+from .importer import import_routines
+from .similarity import get_similarity_index, sync_user, vectorize
+from .search_index import search_routines
+from .pagination import InvalidCursor, keyset_page
+from .text import fold_text
+from .stats import user_stats_summary
+from .conditional import routine_list_validators, routine_validators
+from modifit_platform.db_router import read_from_replica
+from modifit_platform.timing import phase
+
+
+def default_routine_name(user):
+    """
+    Nombre por defecto de una rutina nueva: Routine_<user_id>_<n>
+    """
+    return f"Routine_{user.id}_{AIGeneratedRoutine.objects.filter(user=user).count() + 1}"
+
+
+def filter_by_exercises(routines, user, params):
+    """
+    Filtra rutinas por ejercicio y/o músculo usando la tabla indexada RoutineExercise
+    """
+    exercise = fold_text(params.get('exercise', ''))
+    muscle = fold_text(params.get('muscle', ''))
+    if not exercise and not muscle:
+        return routines
+
+    rows = RoutineExercise.objects.filter(user=user)
+    if exercise:
+        rows = rows.filter(name_normalized__startswith=exercise)
+    if muscle:
+        rows = rows.filter(muscle=muscle)
+    return routines.filter(id__in=rows.values('routine_id'))
+
+
+def ai_error_status(ai_result):
+    """
+    503 cuando el modelo no estaba disponible (circuit breaker abierto o sin
+    conexiones libres), 500 en otro caso
+    """
+    if ai_result.get('error_code') == 503:
+        return status.HTTP_503_SERVICE_UNAVAILABLE
+    return status.HTTP_500_INTERNAL_SERVER_ERROR
 
 
 class HomeView(APIView):
@@ -27,6 +104,9 @@ class GenerateAIRoutineView(APIView):
     """
     POST /api/fitness/generate-routine/
     Genera una rutina de ejercicios usando el modelo de IA
+    Con async_mode=true encola la generación y responde 202 con el id del trabajo
+    Con deadline_ms (o AI_DEADLINE_MS) espera al modelo a lo sumo ese tiempo; si
+    no llega o falla responde una rutina generada localmente (fallback=true)
     Requiere autenticación JWT
     """
     permission_classes = [IsAuthenticated]
@@ -35,37 +115,67 @@ class GenerateAIRoutineView(APIView):
         # Validar los datos de entrada
         serializer = GenerateRoutineRequestSerializer(data=request.data)
 
-        if not serializer.is_valid():
+        with phase("validate"):
+            valid = serializer.is_valid()
+        if not valid:
             return Response(
                 serializer.errors,
                 status=status.HTTP_400_BAD_REQUEST
             )
 
         prompt = serializer.validated_data['prompt']
-        routine_name = serializer.validated_data.get(
-            'routine_name',
-            f"Routine_{request.user.id}_{AIGeneratedRoutine.objects.filter(user=request.user).count() + 1}"
-        )
+        routine_name = serializer.validated_data.get('routine_name') or default_routine_name(request.user)
+
+        if serializer.validated_data['async_mode']:
+            job = RoutineGenerationJob.objects.create(
+                user=request.user,
+                prompt=prompt,
+                routine_name=routine_name,
+                use_cache=not serializer.validated_data['fresh'],
+                size=serializer.validated_data.get('size')
+            )
+            job_pool.notify()
+            return Response(
+                {
+                    'status': 'queued',
+                    'message': 'Generación encolada',
+                    'job': RoutineGenerationJobSerializer(job).data,
+                    'status_url': reverse('fitness:generation-job-detail', args=[job.id])
+                },
+                status=status.HTTP_202_ACCEPTED
+            )
 
         # Llamar al servicio de IA
         ai_service = AIFitnessService()
-        ai_result = ai_service.generate_exercises(prompt)
+        use_cache = not serializer.validated_data['fresh']
+        size = serializer.validated_data.get('size')
+        deadline = deadline_seconds(serializer.validated_data.get('deadline_ms'))
+        if deadline is not None:
+            ai_result, pending = race_model(ai_service, prompt, use_cache, size, deadline)
+            if ai_result is None or ai_result['status'] != 'success':
+                return self._fallback_response(
+                    request.user, prompt, routine_name, size, fallback_reason(ai_result, pending), pending,
+                    serializer.validated_data['replace_fallback']
+                )
+        else:
+            ai_result = ai_service.generate_exercises(prompt, use_cache=use_cache, size=size)
 
         # Verificar si la generación fue exitosa
         if ai_result['status'] != 'success':
             return Response(
                 ai_result,
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                status=ai_error_status(ai_result)
             )
 
         # Guardar la rutina en la base de datos
         try:
-            routine = AIGeneratedRoutine.objects.create(
-                user=request.user,
-                name=routine_name,
-                prompt=prompt,
-                exercises=ai_result['exercises']
-            )
+            with phase("save"):
+                routine = AIGeneratedRoutine.objects.create(
+                    user=request.user,
+                    name=routine_name,
+                    prompt=prompt,
+                    exercises=ai_result['exercises']
+                )
 
             serializer = AIGeneratedRoutineSerializer(routine)
             return Response(
@@ -74,7 +184,9 @@ class GenerateAIRoutineView(APIView):
                     'message': 'Rutina generada y guardada exitosamente',
                     'routine': serializer.data,
                     'routines': [serializer.data],
-                    'raw_response': ai_result.get('raw_response', '')
+                    'raw_response': ai_result.get('raw_response', ''),
+                    'cached': ai_result.get('cached', False),
+                    'fallback': False
                 },
                 status=status.HTTP_201_CREATED
             )
@@ -87,26 +199,202 @@ class GenerateAIRoutineView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @staticmethod
+    def _fallback_response(user, prompt, routine_name, size, reason, pending, replace):
+        try:
+            with phase("fallback"):
+                result = generate_fallback(prompt, size)
+            with phase("save"):
+                routine = AIGeneratedRoutine.objects.create(
+                    user=user,
+                    name=routine_name,
+                    prompt=prompt,
+                    exercises=result['exercises'],
+                    fallback=True
+                )
+        except Exception as e:
+            return Response(
+                {
+                    'status': 'error',
+                    'message': f'Error al generar la rutina local: {str(e)}'
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        fallback_stats.record('served')
+        fallback_stats.record(reason)
+        replacement = None
+        if pending is not None:
+            replacement = finish_in_background(pending, routine.id if replace else None)
+        if replacement == 'replaced':
+            routine.refresh_from_db()
+        return Response(
+            fallback_payload(AIGeneratedRoutineSerializer(routine).data, reason, replacement),
+            status=status.HTTP_201_CREATED
+        )
+
+
+class GenerateBatchRoutinesView(APIView):
+    """
+    POST /api/fitness/generate-routine/batch/
+    Genera varias rutinas (por ejemplo un plan semanal) en una sola solicitud.
+    Las llamadas al modelo se hacen en paralelo (AI_BATCH_CONCURRENCY) y las
+    rutinas se guardan con un único INSERT; si fallan algunas se devuelven
+    las que salieron bien junto con los errores
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = GenerateBatchRequestSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        items = serializer.validated_data['items']
+        results = generate_batch(
+            [item['prompt'] for item in items],
+            use_cache=not serializer.validated_data['fresh'],
+            size=serializer.validated_data.get('size')
+        )
+
+        try:
+            data, http_status = persist_batch_results(
+                request.user,
+                items,
+                results,
+                name_prefix=serializer.validated_data.get('name_prefix')
+            )
+        except Exception as e:
+            return Response(
+                {
+                    'status': 'error',
+                    'message': f'Error al guardar las rutinas: {str(e)}'
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        return Response(data, status=http_status)
+
+
+class GenerateAIRoutineStreamView(APIView):
+    """
+    POST /api/fitness/generate-routine/stream/
+    Variante en streaming (Server-Sent Events) de generate-routine.
+    Emite eventos 'token' con el texto del modelo, 'exercise' por cada
+    ejercicio completo, 'routine' con la rutina guardada y 'error' si falla
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def post(self, request):
+        serializer = GenerateRoutineRequestSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        prompt = serializer.validated_data['prompt']
+        routine_name = serializer.validated_data.get('routine_name') or default_routine_name(request.user)
+        use_cache = not serializer.validated_data['fresh']
+        size = serializer.validated_data.get('size')
+
+        response = StreamingHttpResponse(
+            self._events(request.user, prompt, routine_name, use_cache, size),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _events(self, user, prompt, routine_name, use_cache, size):
+        ai_service = AIFitnessService()
+        for event, data in ai_service.stream_exercises(prompt, use_cache=use_cache, size=size):
+            if event != 'done':
+                yield format_sse(event, data)
+                continue
+
+            if data['status'] != 'success':
+                yield format_sse('error', data)
+                return
+
+            # Guardar la rutina cuando el stream terminó
+            try:
+                routine = AIGeneratedRoutine.objects.create(
+                    user=user,
+                    name=routine_name,
+                    prompt=prompt,
+                    exercises=data['exercises']
+                )
+            except Exception as e:
+                yield format_sse('error', {
+                    'status': 'error',
+                    'message': f'Error al guardar la rutina: {str(e)}'
+                })
+                return
+
+            yield format_sse('routine', {
+                'status': 'success',
+                'message': 'Rutina generada y guardada exitosamente',
+                'routine': AIGeneratedRoutineSerializer(routine).data,
+                'cached': data.get('cached', False)
+            })
+
 
 class ListUserRoutinesView(APIView):
     """
     GET /api/fitness/user-routines/
-    Lista todas las rutinas generadas por IA del usuario autenticado
+    Lista las rutinas generadas por IA del usuario autenticado, paginadas por cursor
+    Soporta ETag/If-None-Match y Last-Modified/If-Modified-Since (304)
+
+    Parámetros:
+        cursor: valor de next_cursor de la página anterior
+        limit: tamaño de página (1-100, por defecto 20)
+        fields: campos a incluir, separados por coma (ej. id,name,generated_at)
+        count: si es true incluye el total exacto de rutinas
+        exercise: solo rutinas con un ejercicio cuyo nombre empiece así (ej. sentadilla)
+        muscle: solo rutinas que trabajen ese músculo (ej. isquiotibiales)
     """
     permission_classes = [IsAuthenticated]
 
+    @read_from_replica
     def get(self, request):
+        query = ListRoutinesQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(
+                query.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        params = query.validated_data
+
         try:
-            routines = AIGeneratedRoutine.objects.filter(user=request.user).order_by('-generated_at')
-            serializer = AIGeneratedRoutineSerializer(routines, many=True)
+            routines = AIGeneratedRoutine.objects.filter(user=request.user)
 
+            validators = routine_list_validators(routines, request.META.get('QUERY_STRING', ''))
+            not_modified = validators.not_modified(request)
+            if not_modified is not None:
+                return not_modified
+
+            routines = filter_by_exercises(routines, request.user, params)
+            total = routines.count() if params['count'] else None
+
+            fields = params.get('fields')
+            if fields:
+                # Los campos no pedidos (exercises, prompt) no se leen de la base
+                routines = routines.only(*set(fields) | {'id', 'generated_at'})
+
+            page, next_cursor = keyset_page(routines, params.get('cursor'), params['limit'])
+            serializer = AIGeneratedRoutineSerializer(page, many=True, fields=fields)
+        except InvalidCursor as e:
             return Response(
                 {
-                    'status': 'success',
-                    'count': routines.count(),
-                    'routines': serializer.data
+                    'status': 'error',
+                    'message': str(e)
                 },
-                status=status.HTTP_200_OK
+                status=status.HTTP_400_BAD_REQUEST
             )
         except Exception as e:
             return Response(
@@ -117,26 +405,296 @@ class ListUserRoutinesView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        data = {
+            'status': 'success',
+            'routines': serializer.data,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        }
+        if total is not None:
+            data['count'] = total
+        return validators.apply(Response(data, status=status.HTTP_200_OK))
+
+
+class ExportUserRoutinesView(APIView):
+    """
+    GET /api/fitness/user-routines/export/
+    Descarga todas las rutinas del usuario como NDJSON (una rutina por línea),
+    en streaming y leyendo la base por lotes: la memoria no crece con la
+    cantidad de rutinas
+
+    Parámetros:
+        since: solo rutinas generadas desde esta fecha (ISO 8601)
+        gzip: si es true se descarga comprimido como .ndjson.gz; si no, la
+              respuesta se comprime según Accept-Encoding
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, NDJSONRenderer]
+
+    def get(self, request):
+        query = ExportRoutinesQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(
+                query.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        routines = AIGeneratedRoutine.objects.filter(user=request.user)
+        if query.validated_data.get('since'):
+            routines = routines.filter(generated_at__gte=query.validated_data['since'])
+
+        # Bajo ASGI el contenido tiene que ser un iterador async: uno síncrono
+        # se consumiría entero antes de empezar a enviar
+        if settings.FITNESS_ASYNC_VIEWS:
+            lines, compress = andjson_lines(routines), agzip_lines
+        else:
+            lines, compress = ndjson_lines(routines), gzip_lines
+
+        filename = f"routines_{request.user.id}.ndjson"
+        if query.validated_data['gzip']:
+            response = StreamingHttpResponse(compress(lines), content_type='application/gzip')
+            filename += '.gz'
+        else:
+            response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+class ImportUserRoutinesView(APIView):
+    """
+    POST /api/fitness/user-routines/import/
+    Importa rutinas del usuario desde un cuerpo NDJSON (una rutina por línea:
+    name, exercises y opcionalmente prompt y generated_at). Acepta el cuerpo
+    comprimido con Content-Encoding: gzip.
+
+    El cuerpo se lee línea por línea y se inserta por lotes (IMPORT_BATCH_SIZE);
+    las líneas inválidas se reportan en `errors` sin cortar el import
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        lines = request.stream
+        if lines is None:
+            return Response(
+                {
+                    'status': 'error',
+                    'message': 'El cuerpo está vacío'
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        compressed = request.headers.get('Content-Encoding', '').lower() == 'gzip'
+        if compressed:
+            lines = gzip.GzipFile(fileobj=lines)
+
+        try:
+            report = import_routines(lines, user=request.user)
+        except (OSError, EOFError, zlib.error) as e:
+            return Response(
+                {
+                    'status': 'error',
+                    'message': 'El cuerpo no es un gzip válido' if compressed else f'No se pudo leer el cuerpo: {str(e)}'
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            return Response(
+                {
+                    'status': 'error',
+                    'message': f'Error al importar las rutinas: {str(e)}'
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        if not report['imported']:
+            return Response(
+                {
+                    'status': 'error',
+                    'message': 'No se importó ninguna rutina',
+                    **report
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            {
+                'status': 'partial' if report['rejected'] else 'success',
+                'message': f"{report['imported']} rutinas importadas, {report['rejected']} líneas rechazadas",
+                **report
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+
+class SearchRoutinesView(APIView):
+    """
+    GET /api/fitness/search/
+    Busca en el nombre, el prompt y los ejercicios (nombre, músculo,
+    descripción) de las rutinas del usuario, sin distinguir acentos ni
+    plurales. Usa el índice invertido RoutineSearchTerm
+
+    Parámetros:
+        q: palabras a buscar; la última también como prefijo (ej. "bulgara sentad")
+        limit: cantidad máxima de resultados (1-100, por defecto 20)
+        fields: campos de cada rutina, separados por coma (ej. id,name,generated_at)
+    """
+    permission_classes = [IsAuthenticated]
+
+    @read_from_replica
+    def get(self, request):
+        query = SearchRoutinesQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(
+                query.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        params = query.validated_data
+
+        try:
+            matches, total = search_routines(request.user, params['q'], params['limit'])
+            routines = AIGeneratedRoutine.objects.filter(user=request.user)
+            fields = params.get('fields')
+            if fields:
+                routines = routines.only(*set(fields) | {'id'})
+            routines = routines.in_bulk([match['routine_id'] for match in matches])
+            results = [
+                {
+                    'score': match['score'],
+                    'matched': match['matched'],
+                    'routine': AIGeneratedRoutineSerializer(routines[match['routine_id']], fields=fields).data
+                }
+                for match in matches
+                if match['routine_id'] in routines
+            ]
+        except Exception as e:
+            return Response(
+                {
+                    'status': 'error',
+                    'message': f'Error al buscar rutinas: {str(e)}'
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return Response(
+            {
+                'status': 'success',
+                'results': results,
+                'count': total
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class SimilarRoutinesView(APIView):
+    """
+    GET /api/fitness/similar/
+    Rutinas del usuario parecidas a un texto o a otra rutina (similitud
+    coseno TF-IDF sobre prompt y ejercicios). Sirve para mostrar rutinas
+    existentes antes de generar una nueva
+
+    Parámetros:
+        q: texto a comparar (por ejemplo el prompt que se va a generar)
+        routine_id: en lugar de q, rutinas parecidas a esta
+        limit: cantidad máxima de resultados (1-50, por defecto 5)
+        min_score: similitud mínima (0-1, por defecto 0.1)
+    """
+    permission_classes = [IsAuthenticated]
+
+    @read_from_replica
+    def get(self, request):
+        query = SimilarRoutinesQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(
+                query.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        params = query.validated_data
+
+        try:
+            index = get_similarity_index()
+            sync_user(index, request.user.id)
+
+            exclude = ()
+            if 'routine_id' in params:
+                vector = None
+                if params['routine_id'] in index.user_versions(request.user.id):
+                    vector = index.vector_of(params['routine_id'])
+                if vector is None:
+                    return Response(
+                        {
+                            'status': 'error',
+                            'message': 'Rutina no encontrada'
+                        },
+                        status=status.HTTP_404_NOT_FOUND
+                    )
+                exclude = (params['routine_id'],)
+            else:
+                vector = vectorize(params['q'], dim=index.dim)
+
+            matches = [
+                (routine_id, score)
+                for routine_id, score in index.search(vector, request.user.id, params['limit'], exclude)
+                if score >= params['min_score']
+            ]
+            routines = AIGeneratedRoutine.objects.in_bulk([routine_id for routine_id, _ in matches])
+            results = [
+                {
+                    'score': round(score, 4),
+                    'routine': AIGeneratedRoutineSerializer(routines[routine_id]).data
+                }
+                for routine_id, score in matches
+                if routine_id in routines
+            ]
+        except Exception as e:
+            return Response(
+                {
+                    'status': 'error',
+                    'message': f'Error al buscar rutinas parecidas: {str(e)}'
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return Response(
+            {
+                'status': 'success',
+                'results': results
+            },
+            status=status.HTTP_200_OK
+        )
+
 
 class RoutineDetailView(APIView):
     """
     GET /api/fitness/routine/<id>/
     Obtiene una rutina específica del usuario
+    Soporta ETag/If-None-Match y Last-Modified/If-Modified-Since (304)
     """
     permission_classes = [IsAuthenticated]
 
+    @read_from_replica
     def get(self, request, routine_id):
         try:
+            # Validación condicional con una consulta liviana, sin leer el JSON
+            updated_at = AIGeneratedRoutine.objects.filter(
+                id=routine_id,
+                user=request.user
+            ).values_list('updated_at', flat=True).first()
+            if updated_at is None:
+                raise AIGeneratedRoutine.DoesNotExist
+            not_modified = routine_validators(routine_id, updated_at).not_modified(request)
+            if not_modified is not None:
+                return not_modified
+
             routine = AIGeneratedRoutine.objects.get(id=routine_id, user=request.user)
             serializer = AIGeneratedRoutineSerializer(routine)
 
-            return Response(
+            response = Response(
                 {
                     'status': 'success',
                     'routine': serializer.data
                 },
                 status=status.HTTP_200_OK
             )
+            return routine_validators(routine.id, routine.updated_at).apply(response)
         except AIGeneratedRoutine.DoesNotExist:
             return Response(
                 {
@@ -153,3 +711,85 @@ class RoutineDetailView(APIView):
                 },
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class TrainingStatsView(APIView):
+    """
+    GET /api/fitness/stats/
+    Estadísticas de entrenamiento del usuario: rutinas generadas, series y
+    repeticiones por grupo muscular y ejercicios más frecuentes, por semana
+
+    Parámetros:
+        weeks: cantidad de semanas recientes a detallar (1-104, por defecto 12)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = TrainingStatsQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(
+                query.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(
+            {
+                'status': 'success',
+                'stats': user_stats_summary(request.user, weeks=query.validated_data['weeks'])
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class GenerationJobDetailView(APIView):
+    """
+    GET /api/fitness/generation-jobs/<id>/
+    Estado de un trabajo de generación: queued/running/done/failed
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        try:
+            job = RoutineGenerationJob.objects.select_related('routine').get(id=job_id, user=request.user)
+        except RoutineGenerationJob.DoesNotExist:
+            return Response(
+                {
+                    'status': 'error',
+                    'message': 'Trabajo no encontrado'
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(
+            {
+                'status': 'success',
+                'job': RoutineGenerationJobSerializer(job).data
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class AICacheStatsView(APIView):
+    """
+    GET /api/fitness/ai-cache/stats/
+    Contadores de la caché de generaciones, del agrupamiento de solicitudes,
+    del parser, del consumo de tokens, de las rutinas locales y la cola del
+    modo deadline, y de latencia y errores por backend del modelo (solo administradores)
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(
+            {
+                'status': 'success',
+                'cache': generation_cache.stats(),
+                'single_flight': generation_flights.stats(),
+                'async_single_flight': async_generation_flights.stats(),
+                'parser': parse_stats.stats(),
+                'usage': usage_stats.stats(),
+                'fallback': fallback_stats.stats(),
+                'deadline_pool': deadline_executor.stats(),
+                'model_backends': get_model_pool().stats()
+            },
+            status=status.HTTP_200_OK
+        )
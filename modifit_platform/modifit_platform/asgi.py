@@ -12,5 +12,15 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "modifit_platform.settings")
+# Bajo ASGI se sirven las vistas async de login/registro y de rutinas
+os.environ.setdefault("AUTH_ASYNC_VIEWS", "true")
+os.environ.setdefault("FITNESS_ASYNC_VIEWS", "true")
 
 application = get_asgi_application()
+
+# Workers de la cola de generación de este proceso: arrancan con el servidor
+# y no con el primer request. AI_JOB_WORKERS=0 los desactiva (la cola queda
+# para manage.py process_generation_jobs)
+from fitness.jobs import job_pool  # noqa: E402
+
+job_pool.start()
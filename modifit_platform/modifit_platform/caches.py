@@ -0,0 +1,43 @@
+"""
+Qué alias de caché sirven para compartir estado entre workers
+
+settings.CACHES sale de CACHE_URL (redis:// o memcached://). Sin CACHE_URL la
+caché `default` es LocMemCache, que es de cada proceso: lo que otro worker
+escribe ahí no se ve. Las funciones que necesitan ver lo mismo en todos los
+workers preguntan is_shared() y, si no, se comportan como si no hubiera caché;
+`manage.py check` lo avisa con local_cache_warning()
+"""
+from typing import List, Optional
+
+from django.core import checks
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+# Backends cuyo contenido no ve ningún otro proceso
+LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def is_shared(alias: Optional[str]) -> bool:
+    """
+    True si el alias existe y apunta a un backend compartido entre procesos
+    """
+    if not alias:
+        return False
+    try:
+        return not isinstance(caches[alias], LOCAL_BACKENDS)
+    except InvalidCacheBackendError:
+        return False
+
+
+def local_cache_warning(alias: Optional[str], feature: str, check_id: str) -> List[checks.CheckMessage]:
+    """
+    Aviso para `manage.py check` cuando `feature` usa una caché local al proceso
+    """
+    if is_shared(alias):
+        return []
+    return [checks.Warning(
+        f"{feature} usa la caché '{alias}', que no se comparte entre workers.",
+        hint="Configurar CACHE_URL con Redis o Memcached.",
+        id=check_id,
+    )]
@@ -0,0 +1,216 @@
+"""
+Compresión de respuestas negociada por Accept-Encoding
+
+Soporta gzip siempre y brotli (paquete `brotli`) o zstd (paquete
+`zstandard`) si están instalados. Solo comprime tipos de contenido de
+texto por encima de un tamaño mínimo; las respuestas en streaming (SSE)
+se comprimen fragmento a fragmento, vaciando el compresor en cada uno
+"""
+import re
+import zlib
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from .timing import phase
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript")
+_ACCEPT_PART = re.compile(r"^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$")
+
+
+class GzipCodec:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def stream(self):
+        return _FlushingStream(zlib.compressobj(self.level, zlib.DEFLATED, 31), zlib.Z_SYNC_FLUSH)
+
+
+class BrotliCodec:
+    name = "br"
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self.level)
+
+    def stream(self):
+        return _BrotliStream(brotli.Compressor(quality=self.level))
+
+
+class ZstdCodec:
+    name = "zstd"
+
+    def __init__(self, level: int):
+        self.level = level
+        self._compressor = zstandard.ZstdCompressor(level=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def stream(self):
+        return _FlushingStream(
+            zstandard.ZstdCompressor(level=self.level).compressobj(),
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK,
+            final_mode=zstandard.COMPRESSOBJ_FLUSH_FINISH
+        )
+
+
+class _FlushingStream:
+    """
+    Compresor incremental que vacía su buffer en cada fragmento para que
+    los eventos SSE lleguen sin esperar a llenar un bloque
+    """
+
+    def __init__(self, compressobj, flush_mode, final_mode=None):
+        self.compressobj = compressobj
+        self.flush_mode = flush_mode
+        self.final_mode = final_mode
+
+    def chunk(self, data: bytes) -> bytes:
+        return self.compressobj.compress(data) + self.compressobj.flush(self.flush_mode)
+
+    def finish(self) -> bytes:
+        if self.final_mode is None:
+            return self.compressobj.flush()
+        return self.compressobj.flush(self.final_mode)
+
+
+class _BrotliStream:
+    def __init__(self, compressor):
+        self.compressor = compressor
+
+    def chunk(self, data: bytes) -> bytes:
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+
+def available_codecs(levels: Optional[Dict[str, int]] = None) -> Dict[str, object]:
+    """
+    Codecs disponibles en este entorno, con el nivel configurado para cada uno
+    """
+    levels = levels or {}
+    codecs = {"gzip": GzipCodec(levels.get("gzip", 6))}
+    if brotli is not None:
+        codecs["br"] = BrotliCodec(levels.get("br", 4))
+    if zstandard is not None:
+        codecs["zstd"] = ZstdCodec(levels.get("zstd", 3))
+    return codecs
+
+
+def negotiate(accept_encoding: str, preference: List[str]) -> Optional[str]:
+    """
+    Elige la codificación con mayor q en Accept-Encoding; a igual q gana la
+    que aparece primero en `preference`. Retorna None si no hay ninguna aceptable
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        match = _ACCEPT_PART.match(part)
+        if not match:
+            continue
+        try:
+            weights[match.group(1).lower()] = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+
+    best = None
+    best_weight = 0.0
+    for name in preference:
+        weight = weights.get(name, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = name, weight
+    return best
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Comprime las respuestas con gzip, brotli o zstd según Accept-Encoding.
+
+    Configuración (settings):
+        COMPRESSION_ENCODINGS: orden de preferencia (por defecto zstd, br, gzip)
+        COMPRESSION_LEVELS: nivel por codificación
+        COMPRESSION_MIN_SIZE: bytes mínimos para comprimir una respuesta no streaming
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.codecs = available_codecs(getattr(settings, "COMPRESSION_LEVELS", None))
+        self.preference = [
+            name for name in getattr(settings, "COMPRESSION_ENCODINGS", ("zstd", "br", "gzip"))
+            if name in self.codecs
+        ]
+        self.min_size = getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding") or response.status_code in (204, 304):
+            return response
+        if not response.get("Content-Type", "").startswith(COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""), self.preference)
+        if encoding is None:
+            return response
+        codec = self.codecs[encoding]
+
+        with phase("compress"):
+            if response.streaming:
+                if response.is_async:
+                    response.streaming_content = self._compress_async(codec, response.streaming_content)
+                else:
+                    response.streaming_content = self._compress_sync(codec, response.streaming_content)
+                del response["Content-Length"]
+            else:
+                compressed = codec.compress(response.content)
+                if len(compressed) >= len(response.content):
+                    return response
+                response.content = compressed
+                response["Content-Length"] = str(len(compressed))
+
+        # Como con GZipMiddleware, el ETag pasa a débil: los bytes cambiaron
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def _compress_sync(codec, content):
+        stream = codec.stream()
+        for chunk in content:
+            data = stream.chunk(chunk)
+            if data:
+                yield data
+        yield stream.finish()
+
+    @staticmethod
+    async def _compress_async(codec, content):
+        stream = codec.stream()
+        async for chunk in content:
+            data = stream.chunk(chunk)
+            if data:
+                yield data
+        yield stream.finish()
@@ -0,0 +1,216 @@
+"""
+Lecturas en réplicas con read-your-writes
+
+Las vistas de solo lectura (listado, detalle y perfil) abren un scope con `replica_reads(user_id)` o el decorador
+`read_from_replica`: dentro del scope PrimaryReplicaRouter manda las lecturas
+a una réplica sana; fuera del scope todo va a `default`.
+
+Después de que un usuario escribe (genera o edita una rutina, cambia su
+perfil) queda fijado al primario durante DATABASE_REPLICA_PIN_SECONDS, así
+lee lo que acaba de escribir aunque la réplica venga atrasada. La marca vive
+en DATABASE_PIN_CACHE_ALIAS, que tiene que ser una caché compartida: si no,
+la escritura en un worker no fija al usuario en los demás. Con una caché
+local al proceso no se usan réplicas y todo se lee del primario.
+
+La consulta del usuario del JWT (authe.authentication) nunca va a una
+réplica: una desactivación tiene que verse en el request siguiente
+"""
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .caches import is_shared, local_cache_warning
+
+_read_alias: ContextVar[Optional[str]] = ContextVar("read_alias", default=None)
+
+
+def _replicas() -> List[str]:
+    return list(getattr(settings, "DATABASE_REPLICAS", ()))
+
+
+def _pin_alias() -> str:
+    return getattr(settings, "DATABASE_PIN_CACHE_ALIAS", "default")
+
+
+def _cache():
+    return caches[_pin_alias()]
+
+
+def _read_replicas() -> List[str]:
+    """
+    Réplicas habilitadas para leer: ninguna si la marca de read-your-writes
+    no se comparte entre workers
+    """
+    replicas = _replicas()
+    if not replicas or not is_shared(_pin_alias()):
+        return []
+    return replicas
+
+
+def check_pin_cache(app_configs, **kwargs):
+    if not _replicas():
+        return []
+    return local_cache_warning(
+        _pin_alias(),
+        "La marca de read-your-writes (DATABASE_PIN_CACHE_ALIAS)",
+        "modifit.W001",
+    )
+
+
+def _pin_key(user_id) -> str:
+    return f"db:pin:{user_id}"
+
+
+def pin_primary(user_id) -> None:
+    """
+    Fija las lecturas del usuario al primario por DATABASE_REPLICA_PIN_SECONDS
+    """
+    if user_id is None or not _read_replicas():
+        return
+    _cache().set(_pin_key(user_id), 1, getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 5))
+
+
+def is_pinned(user_id) -> bool:
+    return user_id is not None and _cache().get(_pin_key(user_id)) is not None
+
+
+async def ais_pinned(user_id) -> bool:
+    return user_id is not None and await _cache().aget(_pin_key(user_id)) is not None
+
+
+class ReplicaHealth:
+    """
+    Estado de cada réplica en este proceso. Se revisa a lo sumo una vez cada
+    `interval` segundos abriendo (o validando) la conexión persistente; una
+    réplica caída queda fuera hasta el próximo chequeo
+    """
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self._checked: Dict[str, Tuple[float, bool]] = {}
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+
+    def is_healthy(self, alias: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(alias)
+        if checked is not None and now - checked[0] < self.interval:
+            return checked[1]
+        healthy = self._check(alias)
+        with self._lock:
+            self._checked[alias] = (now, healthy)
+        return healthy
+
+    @staticmethod
+    def _check(alias: str) -> bool:
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+            if connection.is_usable():
+                return True
+            connection.close()
+        except DatabaseError:
+            pass
+        return False
+
+    def pick(self, aliases: List[str]) -> Optional[str]:
+        """
+        Réplica sana en round-robin, o None si no hay ninguna
+        """
+        if not aliases:
+            return None
+        start = next(self._next)
+        for offset in range(len(aliases)):
+            alias = aliases[(start + offset) % len(aliases)]
+            if self.is_healthy(alias):
+                return alias
+        return None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._checked.clear()
+
+
+replica_health = ReplicaHealth(getattr(settings, "DATABASE_REPLICA_HEALTH_INTERVAL", 5.0))
+
+
+@contextmanager
+def replica_reads(user_id=None):
+    """
+    Manda a una réplica las lecturas del bloque, salvo que el usuario esté
+    fijado al primario o no haya réplicas sanas. La réplica se elige una vez
+    por scope para que todo el request lea de la misma
+    """
+    replicas = _read_replicas()
+    alias = None if not replicas or is_pinned(user_id) else replica_health.pick(replicas)
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+@asynccontextmanager
+async def areplica_reads(user_id=None):
+    replicas = _read_replicas()
+    alias = None
+    if replicas and not await ais_pinned(user_id):
+        # El chequeo puede abrir una conexión: corre en el hilo del ORM async
+        alias = await sync_to_async(replica_health.pick)(replicas)
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def read_from_replica(view_method):
+    """
+    Decorador para métodos de vista (sync o async): abre replica_reads con
+    el usuario del request
+    """
+    if iscoroutinefunction(view_method):
+        @wraps(view_method)
+        async def async_wrapper(self, request, *args, **kwargs):
+            async with areplica_reads(getattr(request.user, "pk", None)):
+                return await view_method(self, request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        with replica_reads(getattr(request.user, "pk", None)):
+            return view_method(self, request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    """
+    Escrituras siempre a `default`; lecturas a la réplica del scope actual.
+    Dentro de una transacción del primario se lee del primario
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
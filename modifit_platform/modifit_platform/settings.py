@@ -51,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "modifit_platform.timing.ServerTimingMiddleware",
+    "modifit_platform.compression.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -92,9 +94,57 @@ DATABASES = {
         'PASSWORD': os.getenv("PASSWORD"),
         'HOST': os.getenv("HOST"),
         'PORT': os.getenv("PORT"),
+        # Conexión persistente por worker, validada antes de reusarla
+        'CONN_MAX_AGE': int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Réplicas de lectura: DB_REPLICA_HOSTS="host1,host2:3307" (mismo usuario y base
+# que default). Ver modifit_platform.db_router
+DATABASE_REPLICAS = []
+for _index, _host in enumerate(filter(None, (h.strip() for h in os.getenv("DB_REPLICA_HOSTS", "").split(","))), start=1):
+    _host, _, _port = _host.partition(":")
+    DATABASES[f"replica_{_index}"] = dict(
+        DATABASES['default'],
+        HOST=_host,
+        PORT=_port or DATABASES['default']['PORT'],
+        TEST={'MIRROR': 'default'},
+    )
+    DATABASE_REPLICAS.append(f"replica_{_index}")
+
+DATABASE_ROUTERS = ["modifit_platform.db_router.PrimaryReplicaRouter"]
+# Segundos que un usuario lee del primario después de escribir (read-your-writes)
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv("DB_REPLICA_PIN_SECONDS", "5"))
+DATABASE_REPLICA_HEALTH_INTERVAL = float(os.getenv("DB_REPLICA_HEALTH_INTERVAL", "5"))
+# Tiene que ser compartida (CACHE_URL); si es local no se lee de las réplicas
+DATABASE_PIN_CACHE_ALIAS = os.getenv("DB_PIN_CACHE_ALIAS", "default")
+
+
+# Caché: CACHE_URL=redis://host:6379/0 o memcached://host1:11211,host2:11211
+# (requiere pymemcache). Sin CACHE_URL se usa LocMemCache, una por proceso: sirve
+# para desarrollo, pero lo que necesita verse en todos los workers (caché de
+# generaciones, versión de usuario, fijado al primario) queda desactivado.
+# Ver modifit_platform.caches
+CACHE_URL = os.getenv("CACHE_URL", "").strip()
+if CACHE_URL.startswith(("redis://", "rediss://", "unix://")):
+    _cache_backend = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CACHE_URL,
+    }
+elif CACHE_URL.startswith("memcached://"):
+    _cache_backend = {
+        "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+        "LOCATION": [host.strip() for host in CACHE_URL[len("memcached://"):].split(",") if host.strip()],
+    }
+elif CACHE_URL:
+    raise ValueError(f"CACHE_URL no soportada (se espera redis:// o memcached://): {CACHE_URL}")
+else:
+    _cache_backend = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+CACHES = {
+    "default": dict(_cache_backend, KEY_PREFIX=os.getenv("CACHE_KEY_PREFIX", "modifit")),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -143,7 +193,7 @@ AUTH_USER_MODEL = "authe.User"
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authe.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -192,3 +242,37 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
+
+# Caché de usuarios autenticados por JWT (authe.authentication.CachedJWTAuthentication)
+AUTH_USER_CACHE_ALIAS = os.getenv("AUTH_USER_CACHE_ALIAS", "default")
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", "300"))
+AUTH_JWT_USER_CLAIMS = os.getenv("AUTH_JWT_USER_CLAIMS", "true").lower() in ("1", "true", "yes")
+
+
+# Login/registro async bajo ASGI (asgi.py lo activa por defecto)
+AUTH_ASYNC_VIEWS = os.getenv("AUTH_ASYNC_VIEWS", "false").lower() in ("1", "true", "yes")
+# Pool acotado para el hashing de contraseñas; pasado AUTH_HASH_MAX_PENDING se responde 503
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "0")) or None
+AUTH_HASH_MAX_PENDING = int(os.getenv("AUTH_HASH_MAX_PENDING", "0")) or None
+
+# Generación, listado y detalle de rutinas async bajo ASGI (asgi.py lo activa por defecto)
+FITNESS_ASYNC_VIEWS = os.getenv("FITNESS_ASYNC_VIEWS", "false").lower() in ("1", "true", "yes")
+
+# Tiempos por fase (modifit_platform.timing): cabecera Server-Timing y /metrics
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "true").lower() in ("1", "true", "yes")
+# Sin METRICS_TOKEN /metrics solo responde a estas IPs (p. ej. "10.0.0.5,127.0.0.1");
+# sin ninguno de los dos responde 404
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv("METRICS_ALLOWED_IPS", "").split(",") if ip.strip()]
+
+# Compresión de respuestas (modifit_platform.compression): brotli y zstd usan los
+# paquetes `brotli` y `zstandard` de requirements.txt; si faltan se ofrece solo gzip
+COMPRESSION_ENCODINGS = [
+    encoding.strip() for encoding in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",") if encoding.strip()
+]
+COMPRESSION_LEVELS = {
+    "gzip": int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+    "br": int(os.getenv("COMPRESSION_BROTLI_LEVEL", "4")),
+    "zstd": int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3")),
+}
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
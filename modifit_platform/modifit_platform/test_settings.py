@@ -0,0 +1,49 @@
+"""
+Settings para los tests: dos bases SQLite locales, `default` como primario
+y `replica` como réplica de lectura (ver modifit_platform.db_router)
+
+Uso (desde modifit_platform/):
+    python manage.py test fitness.tests --settings=modifit_platform.test_settings
+"""
+import os
+import tempfile
+
+from modifit_platform.settings import *  # noqa: F401,F403
+from modifit_platform.settings import SIMPLE_JWT
+
+SECRET_KEY = "test-only-secret-key-not-for-production-use"
+SIMPLE_JWT = dict(SIMPLE_JWT, SIGNING_KEY=SECRET_KEY)
+
+DEBUG = False
+ALLOWED_HOSTS = ["testserver", "127.0.0.1", "localhost"]
+SECURE_SSL_REDIRECT = False
+CSRF_COOKIE_SECURE = False
+SESSION_COOKIE_SECURE = False
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.path.join(tempfile.gettempdir(), "modifit_test_primary.sqlite3"),
+    },
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.path.join(tempfile.gettempdir(), "modifit_test_replica.sqlite3"),
+    },
+}
+DATABASE_REPLICAS = ["replica"]
+# La marca de read-your-writes tiene que ser compartida para que se use la réplica
+DATABASE_PIN_CACHE_ALIAS = "shared"
+
+MIGRATION_MODULES = {
+    app: None for app in ("admin", "auth", "contenttypes", "sessions", "authe", "fitness")
+}
+
+# `default` es local al proceso, como en desarrollo. `shared` y `shared_b` son
+# dos instancias sobre el mismo directorio: simulan dos workers que comparten
+# una caché (Redis/Memcached en producción)
+_SHARED_CACHE_DIR = os.path.join(tempfile.gettempdir(), "modifit_test_cache")
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": _SHARED_CACHE_DIR},
+    "shared_b": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": _SHARED_CACHE_DIR},
+}
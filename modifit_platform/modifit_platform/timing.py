@@ -0,0 +1,220 @@
+"""
+Tiempos por fase de cada request: cabecera Server-Timing e histogramas
+en formato de texto de Prometheus (GET /metrics)
+
+Las fases se miden con `phase("nombre")` desde cualquier capa; las consultas
+SQL se suman solas a la fase "db" con un execute_wrapper en cada conexión.
+Los histogramas son por proceso: cada worker expone los suyos
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_timer: ContextVar[Optional["RequestTimer"]] = ContextVar("request_timer", default=None)
+
+
+class RequestTimer:
+    """
+    Acumula la duración y la cantidad de veces de cada fase de un request
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        # El lock solo importa cuando el request reparte trabajo en hilos (batch)
+        with self._lock:
+            entry = self.phases.get(name)
+            if entry is None:
+                self.phases[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def header(self) -> str:
+        parts = []
+        for name, (seconds, count) in self.phases.items():
+            parts.append(f'{name};dur={seconds * 1000:.1f};desc="{count}x"')
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Mide un bloque y lo suma a la fase `name` del request en curso.
+    Fuera de un request (jobs, comandos) no hace nada
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - started)
+
+
+def _time_query(execute, sql, params, many, context):
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.add("db", time.perf_counter() - started)
+
+
+def _install_query_timer(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(_install_query_timer)
+# Conexiones abiertas antes de cargar este módulo (por ejemplo el chequeo de
+# migraciones de runserver)
+for _connection in connections.all(initialized_only=True):
+    _install_query_timer(None, _connection)
+
+
+class Histogram:
+    """
+    Histograma de Prometheus con buckets fijos, por combinación de labels
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            base = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{base},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {total}")
+            lines.append(f"{self.name}_count{{{base}}} {count}")
+        return "\n".join(lines)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_duration = Histogram(
+    "modifit_request_duration_seconds",
+    "Duración total de los requests por ruta",
+    ("route", "method"),
+)
+phase_duration = Histogram(
+    "modifit_phase_duration_seconds",
+    "Duración de cada fase (validate, cache, model, parse, db, ...) por ruta",
+    ("route", "phase"),
+)
+
+
+def _route(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None and match.view_name else "unmatched"
+
+
+class ServerTimingMiddleware:
+    """
+    Abre un RequestTimer por request, agrega la cabecera Server-Timing y
+    registra los tiempos en los histogramas. Funciona bajo WSGI y ASGI
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header_enabled = getattr(settings, "SERVER_TIMING_HEADER", True)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timer = RequestTimer()
+        token = _current_timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self._finish(request, response, timer)
+
+    async def __acall__(self, request):
+        timer = RequestTimer()
+        token = _current_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self._finish(request, response, timer)
+
+    def _finish(self, request, response, timer: RequestTimer):
+        route = _route(request)
+        request_duration.observe((route, request.method), timer.elapsed())
+        for name, (seconds, _) in list(timer.phases.items()):
+            phase_duration.observe((route, name), seconds)
+        if self.header_enabled:
+            response["Server-Timing"] = timer.header()
+        return response
+
+
+def metrics_view(request):
+    """
+    GET /metrics
+    Histogramas en formato de texto de Prometheus. Con METRICS_TOKEN se exige
+    Authorization: Bearer <token>; sin token solo responde a las IPs de
+    METRICS_ALLOWED_IPS. Si no hay ninguno de los dos responde 404: las
+    latencias y el tráfico por ruta no son públicos
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return HttpResponse("No autorizado\n", status=401, content_type="text/plain")
+    elif request.META.get("REMOTE_ADDR") not in getattr(settings, "METRICS_ALLOWED_IPS", ()):
+        raise Http404()
+    body = "\n".join([request_duration.render(), phase_duration.render()]) + "\n"
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -16,9 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from .timing import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/auth/", include('authe.urls')),
     path("api/fitness/", include('fitness.urls')),
+    path("metrics", metrics_view, name="metrics"),
 ]
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "modifit_platform.settings")
 
 application = get_wsgi_application()
+
+# Workers de la cola de generación de este proceso: arrancan con el servidor
+# y no con el primer request. AI_JOB_WORKERS=0 los desactiva (la cola queda
+# para manage.py process_generation_jobs)
+from fitness.jobs import job_pool  # noqa: E402
+
+job_pool.start()